@@ -1,5 +1,44 @@
 if has("python3")
-    py3 from bdeformatvimadapter import formatBde
+    py3 from bdeformatvimadapter import formatBde, formatBdeAsync
+    py3 from bdeformatvimadapter import pollAsyncFormat, forgetBuffer
+    py3 from bdeformatvimadapter import precomputeStructure, printStats
+    py3 from bdeformatvimadapter import updateComponentIndex
+
+    function! BDEFormatPoll(timer)
+        py3 pollAsyncFormat()
+    endfunction
 
     command! BDEFormat :py3 formatBde()
+    command! BDEFormatAsync :py3 formatBdeAsync()
+    command! BDEFormatStats :py3 printStats()
+
+    augroup BDEFormat
+        autocmd!
+        autocmd BufWipeout *.h,*.cpp py3 forgetBuffer()
+
+        " Prepare the structure used by the snippets ahead of time, unless
+        " disabled with 'let g:bdeformat_precompute = 0'
+        autocmd BufReadPost,CursorHold *.h,*.cpp py3 precomputeStructure()
+
+        " Keep the index of the classes under 'g:bdeformat_source_roots' up to
+        " date
+        autocmd BufReadPost,BufWritePost *.h,*.cpp py3 updateComponentIndex()
+    augroup END
+
+    if exists("*listener_add")
+        py3 from bdeformatvimadapter import trackChanges, recordChanges
+        py3 from bdeformatvimadapter import formatChangedRows, clearChangedRows
+
+        function! BDEFormatListener(bufnr, start, end, added, changes)
+            py3 recordChanges()
+        endfunction
+
+        " Formatting on save is enabled with 'let g:bdeformat_on_save = 1'
+        augroup BDEFormatOnSave
+            autocmd!
+            autocmd BufReadPost,BufNewFile *.h,*.cpp py3 trackChanges()
+            autocmd BufWritePre *.h,*.cpp py3 formatChangedRows()
+            autocmd BufWritePost *.h,*.cpp py3 clearChangedRows()
+        augroup END
+    endif
 endif
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""
+bdeformatbatch.py: BDE formatter for whole files and source trees
+
+This module can be executed on the command line to format the DATA sections
+of every C++ file in the specified files and directories, either rewriting the
+files, or, with '--check', just reporting the files that need formatting.
+
+With '--manifest', a record of the files last verified to be clean is kept in
+the specified file.  Each entry holds the size, modification time and hash of
+the file as well as the version of the formatter that verified it, and files
+whose size and modification time haven't changed since are skipped without
+being opened, so repeated runs over a large tree only read the files that
+were touched.
+
+Files of at least 'STREAMING_THRESHOLD' bytes, such as large generated
+headers, are streamed instead of being read into memory: only the DATA section
+being formatted is buffered, and the result is written to a temporary file
+that replaces the original if anything changed.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import bdeformatcache
+import bdeformatutil
+import sourcefile
+
+STREAMING_THRESHOLD = 16 * 1024 * 1024
+    # Files of at least this many bytes are formatted by 'formatFileStreaming'
+    # so that memory use doesn't grow with their size
+
+CHUNK_SIZE = 1024 * 1024
+    # Number of bytes read at a time when hashing a file
+
+class _HashingWriter(object):
+    """
+    A binary stream computing the hash of the data written to it, and passing
+    the data on to an optional underlying stream.
+    """
+
+    def __init__(self, stream=None):
+        self.d_stream = stream
+        self.d_hash = hashlib.sha1()
+
+    def write(self, data):
+        self.d_hash.update(data)
+        if self.d_stream is not None:
+            self.d_stream.write(data)
+
+    def close(self):
+        if self.d_stream is not None:
+            self.d_stream.close()
+
+    def hexdigest(self):
+        return self.d_hash.hexdigest()
+
+def hashFile(path):
+    """
+    Return the hash of the content of the specified 'path', read 'CHUNK_SIZE'
+    bytes at a time.
+    """
+    ret = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            ret.update(chunk)
+
+    return ret.hexdigest()
+
+class Manifest(object):
+    """
+    A persistent record of the files last verified to be correctly formatted,
+    mapping each path to a '[size, mtimeNs, hash, formatVersion]' entry.
+    """
+
+    def __init__(self, fileName=None):
+        """
+        Load the manifest from the optionally specified 'fileName' if it
+        exists.  If 'fileName' is not specified, the manifest is not
+        persisted.
+        """
+        self.d_fileName = fileName
+        self.d_entries = {}
+        self.d_modified = False
+        if fileName and os.path.exists(fileName):
+            try:
+                with open(fileName) as f:
+                    self.d_entries = json.load(f)
+            except ValueError:
+                # Corrupt manifest.  Start over
+                self.d_entries = {}
+
+    def isClean(self, path, st):
+        """
+        Return 'True' if the specified 'path', with the specified 'os.stat'
+        result 'st', is unchanged since it was last verified to be clean by
+        this version of the formatter.
+        """
+        entry = self.d_entries.get(path)
+        return entry is not None and \
+               entry[0] == st.st_size and \
+               entry[1] == sourcefile.mtimeNs(st) and \
+               entry[3] == bdeformatutil.FORMAT_VERSION
+
+    def cleanHash(self, path):
+        """
+        Return the hash of the content of the specified 'path' when it was
+        last verified to be clean by this version of the formatter, or 'None'
+        if it never was.
+        """
+        entry = self.d_entries.get(path)
+        if entry is None or entry[3] != bdeformatutil.FORMAT_VERSION:
+            return None
+
+        return entry[2]
+
+    def setClean(self, path, st, contentHash):
+        """
+        Record that the specified 'path', with the specified 'os.stat' result
+        'st' and the specified 'contentHash', is clean.
+        """
+        mtime = sourcefile.mtimeNs(st)
+        if time.time() * 1e9 - mtime < sourcefile.RACY_INTERVAL_NS:
+            # Don't trust the modification time; compare the hash next time
+            mtime = None
+
+        self.d_entries[path] = [st.st_size,
+                                mtime,
+                                contentHash,
+                                bdeformatutil.FORMAT_VERSION]
+        self.d_modified = True
+
+    def remove(self, path):
+        """
+        Forget about the specified 'path'.
+        """
+        if self.d_entries.pop(path, None) is not None:
+            self.d_modified = True
+
+    def save(self):
+        """
+        Write this manifest to its file, if it has one and was modified.
+        """
+        if not self.d_fileName or not self.d_modified:
+            return
+
+        tmpName = self.d_fileName + ".tmp"
+        with open(tmpName, "w") as f:
+            json.dump(self.d_entries, f)
+
+        os.rename(tmpName, self.d_fileName)
+        self.d_modified = False
+
+def formatFile(path, check, manifest, cache=None):
+    """
+    Format the DATA sections of the specified 'path' using the optionally
+    specified 'cache', and rewrite the file unless the specified 'check' is
+    'True'.  Use and update the specified 'manifest' to skip the file if it's
+    known to be clean.  Return 'True' if the file was not correctly formatted,
+    and 'False' otherwise.
+    """
+    st = os.stat(path)
+    if st.st_size >= STREAMING_THRESHOLD:
+        return formatFileStreaming(path, check, manifest, cache)
+
+    if manifest.isClean(path, st):
+        return False
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    contentHash = hashlib.sha1(data).hexdigest()
+    if contentHash == manifest.cleanHash(path):
+        # Only the modification time changed
+        manifest.setClean(path, st, contentHash)
+        return False
+
+    text = sourcefile.decodeSource(data)
+    fixed = "\n".join(bdeformatutil.formatBdeLines(text.split("\n"), cache))
+    if fixed == text:
+        manifest.setClean(path, st, contentHash)
+        return False
+
+    if check:
+        manifest.remove(path)
+        return True
+
+    fixedData = sourcefile.encodeSource(fixed)
+    with open(path, "wb") as f:
+        f.write(fixedData)
+
+    manifest.setClean(path,
+                      os.stat(path),
+                      hashlib.sha1(fixedData).hexdigest())
+    return True
+
+def formatFileStreaming(path, check, manifest, cache=None):
+    """
+    Format the DATA sections of the specified 'path' as 'formatFile' does,
+    but without holding the content of the file in memory: the lines are
+    streamed through 'bdeformatutil.formatBdeLines', which only buffers the
+    section being formatted, into a temporary file in the same directory that
+    replaces 'path' if anything changed.  Return 'True' if the file was not
+    correctly formatted, and 'False' otherwise.
+    """
+    st = os.stat(path)
+    if manifest.isClean(path, st):
+        return False
+
+    contentHash = hashFile(path)
+    if contentHash == manifest.cleanHash(path):
+        # Only the modification time changed
+        manifest.setClean(path, st, contentHash)
+        return False
+
+    tmpName = None
+    try:
+        if check:
+            out = _HashingWriter()
+        else:
+            fd, tmpName = tempfile.mkstemp(
+                                      dir=os.path.dirname(path),
+                                      prefix=os.path.basename(path) + ".",
+                                      suffix=".tmp")
+            out = _HashingWriter(os.fdopen(fd, "wb"))
+
+        try:
+            with open(path, "rb") as f:
+                lines = sourcefile.readLines(f)
+                sourcefile.writeLines(
+                                  bdeformatutil.formatBdeLines(lines, cache),
+                                  out)
+        finally:
+            out.close()
+
+        fixedHash = out.hexdigest()
+        if fixedHash == contentHash:
+            manifest.setClean(path, st, contentHash)
+            return False
+
+        if check:
+            manifest.remove(path)
+            return True
+
+        shutil.copymode(path, tmpName)
+        os.rename(tmpName, path)
+        tmpName = None
+    finally:
+        if tmpName is not None:
+            os.remove(tmpName)
+
+    manifest.setClean(path, os.stat(path), fixedHash)
+    return True
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                   description="Format the DATA sections of C++ source files")
+    parser.add_argument("paths",
+                        nargs="+",
+                        help="files, or directories to search for files")
+    parser.add_argument("--check",
+                        action="store_true",
+                        help="report unformatted files instead of fixing them")
+    parser.add_argument("--manifest",
+                        help="file recording the files verified to be clean")
+    parser.add_argument("--cache-dir",
+                        help="directory of a persistent cache of formatted "
+                             "blocks (default: $%s)" %
+                                                  bdeformatcache.CACHE_DIR_ENV)
+    args = parser.parse_args(argv)
+
+    manifest = Manifest(args.manifest)
+    cache = bdeformatcache.openCache(args.cache_dir)
+
+    ret = 0
+    try:
+        for path in sourcefile.findSourceFiles(args.paths):
+            try:
+                if formatFile(path, args.check, manifest, cache):
+                    print(("Needs formatting: " if args.check else
+                           "Formatted: ") + path)
+                    if args.check:
+                        ret = 1
+            except (IOError, OSError) as e:
+                print("%s: %s" % (path, e))
+                ret = 1
+    finally:
+        manifest.save()
+        if cache:
+            cache.close()
+
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import bdeformatbatch
+from testsources import FORMATTED_DATA, SOURCE
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.manifestName = os.path.join(self.dir, "manifest.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content, mtime=None):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name)) as f:
+            return f.read()
+
+    def test_formatFile(self):
+        F = bdeformatbatch.formatFile
+        A = self.assertEqual
+        manifest = bdeformatbatch.Manifest(self.manifestName)
+
+        path = self.write("a.h", SOURCE)
+        A(F(path, True, manifest), True)
+        A(self.read("a.h"), SOURCE)
+
+        A(F(path, False, manifest), True)
+        A(self.read("a.h"), FORMATTED_DATA)
+
+        A(F(path, True, manifest), False)
+
+    def test_formatFileStreaming(self):
+        F = bdeformatbatch.formatFileStreaming
+        A = self.assertEqual
+        manifest = bdeformatbatch.Manifest(self.manifestName)
+
+        path = self.write("a.h", SOURCE)
+        os.chmod(path, 0o640)
+        A(F(path, True, manifest), True)
+        A(self.read("a.h"), SOURCE)
+
+        A(F(path, False, manifest), True)
+        A(self.read("a.h"), FORMATTED_DATA)
+        A(os.stat(path).st_mode & 0o777, 0o640)
+        A(sorted(os.listdir(self.dir)), ["a.h"])
+
+        A(F(path, True, manifest), False)
+
+        # The result is the same as when formatting in memory, and unchanged
+        # files aren't replaced
+        content = (SOURCE + FORMATTED_DATA) * 50 + "class Bar {\n    // DATA"
+        streamed = self.write("b.h", content)
+        inMemory = self.write("c.h", content)
+        A(F(streamed, False, manifest), True)
+        A(bdeformatbatch.formatFile(inMemory, False, manifest), True)
+        A(self.read("b.h"), self.read("c.h"))
+
+        inode = os.stat(streamed).st_ino
+        A(F(streamed, False, bdeformatbatch.Manifest()), False)
+        A(os.stat(streamed).st_ino, inode)
+
+    def test_streamingThreshold(self):
+        saved = bdeformatbatch.STREAMING_THRESHOLD
+        bdeformatbatch.STREAMING_THRESHOLD = 0
+        try:
+            self.write("a.h", SOURCE)
+            self.assertEqual(bdeformatbatch.main([self.dir]), 0)
+            self.assertEqual(self.read("a.h"), FORMATTED_DATA)
+            self.assertEqual(sorted(os.listdir(self.dir)), ["a.h"])
+        finally:
+            bdeformatbatch.STREAMING_THRESHOLD = saved
+
+    def test_manifest(self):
+        A = self.assertEqual
+        main = bdeformatbatch.main
+
+        # Use an old modification time so that the files aren't 'racy'
+        mtime = 1000000000
+        self.write("clean.h", FORMATTED_DATA, mtime)
+        self.write("dirty.h", SOURCE, mtime)
+
+        args = ["--check", "--manifest", self.manifestName, self.dir]
+        A(main(args), 1)
+        self.assertTrue(os.path.exists(self.manifestName))
+
+        # Make 'clean.h' dirty without changing its size or modification
+        # time.  It's skipped without being read.
+        dirtied = FORMATTED_DATA.replace("int    d_a;", "int d_a;   ")
+        A(len(dirtied), len(FORMATTED_DATA))
+        self.write("clean.h", dirtied, mtime)
+        A(main(["--check", "--manifest", self.manifestName,
+                os.path.join(self.dir, "clean.h")]), 0)
+
+        # Touching it makes it get checked again.  Since its content is the
+        # same as when it was last verified, it's still clean.
+        self.write("clean.h", FORMATTED_DATA, mtime + 1)
+        A(main(args[:-1] + [os.path.join(self.dir, "clean.h")]), 0)
+
+        # Fix the dirty file.  Afterwards, everything is clean.
+        A(main(["--manifest", self.manifestName, self.dir]), 0)
+        A(self.read("dirty.h"), FORMATTED_DATA)
+        A(main(args), 0)
+
+        # A different version of the formatter checks everything again
+        manifest = bdeformatbatch.Manifest(self.manifestName)
+        self.assertEqual(len(manifest.d_entries), 2)
+        for entry in manifest.d_entries.values():
+            entry[3] -= 1
+        manifest.d_modified = True
+        manifest.save()
+
+        self.write("clean.h", dirtied, mtime + 1)
+        A(main(args), 1)
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+"""
+bdeformatbench.py: Throughput benchmark of the formatter on a synthetic corpus
+
+This module defines a seeded generator of BDE-style C++ components, whose
+headers have classes with banners, unformatted DATA sections with trailing
+comments, and function declarations with long parameter lists and nested
+template types, and whose implementation files have constructors with large
+initializer lists and long function calls.  The sizes of these constructs are
+drawn from configurable '(low, mode, high)' triangular distributions, so the
+same seed and sizes always generate the same corpus.
+
+It can be executed on the command line to measure, on such a corpus, the
+blocks and lines formatted per second by:
+
+    formatBde    'bdeformatutil.formatBde' on every block of the corpus
+    file         'bdeformatfile.formatBde', the path of the file command line
+                 tool, on every block of the corpus written to disk
+    wholeFile    'bdeformatutil.formatBdeLines' on every file of the corpus
+
+and write the results as JSON:
+
+    bdeformatbench.py [--seed <n>] [--components <n>] [--repeat <n>]
+                      [--size <name>=<low>,<mode>,<high>]...
+                      [--benchmarks <names>] [--output <file>]
+
+No cache is used, so that every block is laid out.
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+import bdeformatcache
+import bdeformatfile
+import bdeformatutil
+import linesource
+
+RESULTS_VERSION = 1
+    # Version of the layout of the JSON results
+
+DEFAULT_SIZES = {
+    "classes":      (1, 2, 4),
+    "members":      (2, 6, 30),
+    "functions":    (2, 5, 12),
+    "parameters":   (0, 3, 12),
+    "initializers": (2, 8, 40),
+    "commentWords": (0, 6, 30),
+    "templateDepth": (0, 0, 3),
+}
+    # Default '(low, mode, high)' triangular distributions of the sizes of the
+    # constructs of the generated components: classes per component, DATA
+    # members, functions and parameters per class, entries per initializer
+    # list, words per trailing comment and nesting depth of template types
+
+BENCHMARKS = ("formatBde", "file", "wholeFile")
+    # Names of the benchmarks, in the order they are run
+
+CorpusFile = collections.namedtuple("CorpusFile", ["name",
+                                                   "lines",
+                                                   "blocks",
+                                                   "dataSections"])
+    # A generated file.  'blocks' is the list of '(row, col)' positions of
+    # the blocks to format in the 'lines', ordered by row, and 'dataSections'
+    # is the number of DATA sections the 'lines' contain
+
+_WORDS = ("value", "count", "name", "buffer", "handle", "offset", "length",
+          "timeout", "session", "request", "queue", "state", "limit", "index",
+          "manager", "factory", "config", "entry", "cache", "result")
+
+_TYPES = ("int", "bool", "double", "unsigned int", "bsl::string",
+          "bsls::Types::Int64", "bdlt::Datetime", "bsls::TimeInterval",
+          "bslmt::Mutex", "const char *", "void *")
+
+_TEMPLATES = ("bsl::vector<%s>", "bsl::shared_ptr<%s>",
+              "bslma::ManagedPtr<%s>", "bsl::map<bsl::string, %s>",
+              "bsl::pair<int, %s>")
+
+def _size(rng, sizes, name):
+    """
+    Return a size drawn with the specified 'rng' from the distribution of
+    the specified 'name' in the specified 'sizes'.
+    """
+    low, mode, high = sizes[name]
+    return int(round(rng.triangular(low, high, mode)))
+
+def _identifier(rng, words=2):
+    """
+    Return a camel case identifier of at most the optionally specified
+    'words' drawn with the specified 'rng'.
+    """
+    parts = [rng.choice(_WORDS) for i in range(rng.randint(1, words))]
+    return parts[0] + "".join(part.capitalize() for part in parts[1:])
+
+def _typeName(rng, sizes):
+    """
+    Return a type name, possibly nesting templates, drawn with the specified
+    'rng' from the specified 'sizes'.
+    """
+    typeName = rng.choice(_TYPES)
+    for i in range(_size(rng, sizes, "templateDepth")):
+        typeName = rng.choice(_TEMPLATES) % typeName
+
+    return typeName
+
+def _comment(rng, sizes, minWords=0):
+    """
+    Return the words of a comment drawn with the specified 'rng' from the
+    specified 'sizes', with at least the optionally specified 'minWords'.
+    """
+    numWords = max(_size(rng, sizes, "commentWords"), minWords)
+    return " ".join(rng.choice(_WORDS) for i in range(numWords))
+
+def _classBanner(className, rule):
+    """
+    Return the lines of the banner of the specified 'className' underlined
+    with the specified 'rule' character.
+    """
+    title = "// class " + className
+    indent = " " * ((79 - len(title)) // 2)
+    line = indent + "// " + rule * (len(title) - 3)
+    return [line, indent + title, line, ""]
+
+def _declaration(typeName, name):
+    """
+    Return the declaration of the specified 'name' of the specified
+    'typeName', with the '*' of pointer types next to the name.
+    """
+    return typeName + ("" if typeName.endswith("*") else " ") + name
+
+def _parameters(rng, sizes):
+    """
+    Return the list of '(type, name)' parameters of a function drawn with the
+    specified 'rng' from the specified 'sizes'.
+    """
+    return [(_typeName(rng, sizes), _identifier(rng) + str(i))
+            for i in range(_size(rng, sizes, "parameters"))]
+
+def _writeClassHeader(rng, sizes, className, lines, blocks):
+    """
+    Append the definition of the specified 'className' to the specified
+    'lines' of a header, and the positions of its blocks to the specified
+    'blocks', drawing its contents with the specified 'rng' from the
+    specified 'sizes'.  Return the list of '(type, name)' of its members.
+    """
+    lines += _classBanner(className, "=")
+    lines += ["class %s {" % className, "  private:", "    // DATA"]
+
+    members = []
+    blocks.append((len(lines), 4))
+    for i in range(_size(rng, sizes, "members")):
+        typeName = _typeName(rng, sizes)
+        name = "d_%s%d%s" % (_identifier(rng),
+                             i,
+                             "_p" if typeName.endswith("*") else "")
+        members.append((typeName, name))
+
+        comment = _comment(rng, sizes)
+        lines.append("    %s%s%s;%s" % (typeName,
+                                        " " * rng.randint(1, 6),
+                                        name,
+                                        "  // " + comment if comment else ""))
+        if rng.random() < 0.2:
+            lines.append("        // " + _comment(rng, sizes, 1))
+
+        if rng.random() < 0.3:
+            lines.append("")
+
+    lines += ["", "  public:", "    // MANIPULATORS"]
+    for i in range(_size(rng, sizes, "functions")):
+        args = ", ".join(_declaration(typeName, name)
+                         for typeName, name in _parameters(rng, sizes))
+        line = "    %s %s(" % (_typeName(rng, sizes), _identifier(rng))
+        if args:
+            # Declarations without parameters have nothing to format
+            blocks.append((len(lines), len(line)))
+
+        lines.append(line + args + ");")
+        lines.append("        // " + _comment(rng, sizes, 1))
+        lines.append("")
+
+    lines += ["};", ""]
+    return members
+
+def _writeClassSource(rng, sizes, className, members, lines, blocks):
+    """
+    Append the definitions of a constructor and of a function of the
+    specified 'className' having the specified 'members' to the specified
+    'lines' of an implementation file, and the positions of their blocks to
+    the specified 'blocks', drawing their contents with the specified 'rng'
+    from the specified 'sizes'.
+    """
+    lines += _classBanner(className, "-")
+
+    line = "%s::%s(" % (className, className)
+    blocks.append((len(lines), len(line)))
+    lines.append(line + "const %s& original, bslma::Allocator "
+                        "*basicAllocator)" % className)
+
+    separator = ": "
+    initialized = members[:_size(rng, sizes, "initializers")]
+    for typeName, name in initialized:
+        lines.append("%s%s(original.%s, basicAllocator)" % (separator,
+                                                             name,
+                                                             name))
+        separator = ", "
+
+    lines += ["{", "}", ""]
+
+    args = [rng.choice(("original.", "")) + name
+            for typeName, name in members]
+    lines += ["void %s::%s()" % (className, _identifier(rng)), "{"]
+    line = "    d_%s_p->%s(" % (_identifier(rng), _identifier(rng))
+    blocks.append((len(lines), len(line)))
+    lines += [line + ", ".join(args) + ");", "}", ""]
+
+def generateComponent(rng, sizes, name):
+    """
+    Return the '(header, source)' 'CorpusFile's of the component with the
+    specified 'name', drawing its contents with the specified 'rng' from the
+    specified 'sizes'.
+    """
+    header = ["// %s.h" % name, ""]
+    source = ["// %s.cpp" % name, "", '#include <%s.h>' % name, ""]
+    headerBlocks = []
+    sourceBlocks = []
+
+    numClasses = _size(rng, sizes, "classes")
+    for i in range(numClasses):
+        identifier = _identifier(rng)
+        className = "%s%s%s%d" % (name.capitalize(),
+                                  identifier[0].upper(),
+                                  identifier[1:],
+                                  i)
+        members = _writeClassHeader(rng,
+                                    sizes,
+                                    className,
+                                    header,
+                                    headerBlocks)
+        _writeClassSource(rng,
+                          sizes,
+                          className,
+                          members,
+                          source,
+                          sourceBlocks)
+
+    return (CorpusFile(name + ".h", header, headerBlocks, numClasses),
+            CorpusFile(name + ".cpp", source, sourceBlocks, 0))
+
+def generateCorpus(seed=0, numComponents=20, sizes=None):
+    """
+    Return the list of 'CorpusFile's of the optionally specified
+    'numComponents' components generated from the optionally specified
+    'seed' with the optionally specified 'sizes', which override the
+    'DEFAULT_SIZES'.
+    """
+    allSizes = dict(DEFAULT_SIZES)
+    allSizes.update(sizes or {})
+
+    rng = random.Random(seed)
+    ret = []
+    for i in range(numComponents):
+        ret += generateComponent(rng, allSizes, "bench%d" % i)
+
+    return ret
+
+def writeCorpus(corpus, directory):
+    """
+    Write the files of the specified 'corpus' to the specified 'directory'
+    and return the list of their paths.
+    """
+    ret = []
+    for corpusFile in corpus:
+        path = os.path.join(directory, corpusFile.name)
+        with open(path, "w") as f:
+            f.write("\n".join(corpusFile.lines) + "\n")
+
+        ret.append(path)
+
+    return ret
+
+def _result(seconds, blocks, lines, failures):
+    """
+    Return the JSON result of a benchmark that took the specified 'seconds'
+    to format the specified number of 'blocks' and 'lines', of which the
+    specified number of 'failures' blocks couldn't be formatted.
+    """
+    return {"seconds": seconds,
+            "blocks": blocks,
+            "lines": lines,
+            "failures": failures,
+            "blocksPerSecond": blocks / seconds if seconds else None,
+            "linesPerSecond": lines / seconds if seconds else None}
+
+def benchmarkFormatBde(corpus, repeat=3):
+    """
+    Return the result of formatting every block of the specified 'corpus'
+    with 'bdeformatutil.formatBde', taking the best time of the optionally
+    specified 'repeat' runs.  The lines counted are the rows of the blocks.
+    """
+    sources = [(linesource.ListLineSource(corpusFile.lines), corpusFile.blocks)
+               for corpusFile in corpus]
+
+    counts = {}
+    def run():
+        blocks = lines = failures = 0
+        for lineSource, positions in sources:
+            for row, col in positions:
+                try:
+                    (start, end), fixed = bdeformatutil.formatBde(lineSource,
+                                                                  row,
+                                                                  col)
+                except ValueError:
+                    failures += 1
+                    continue
+
+                blocks += 1
+                lines += end - start + 1
+
+        counts.update(blocks=blocks, lines=lines, failures=failures)
+
+    seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+    return _result(seconds,
+                   counts["blocks"],
+                   counts["lines"],
+                   counts["failures"])
+
+def benchmarkFile(corpus, repeat=3):
+    """
+    Return the result of formatting every block of the specified 'corpus',
+    written to a temporary directory, with 'bdeformatfile.formatBde', taking
+    the best time of the optionally specified 'repeat' runs.  The blocks of
+    each file are formatted from the last one up, so that their rows stay
+    valid.  The lines counted are the lines of the files.
+    """
+    directory = tempfile.mkdtemp()
+    cacheDir = os.environ.pop(bdeformatcache.CACHE_DIR_ENV, None)
+    try:
+        times = []
+        for i in range(repeat):
+            paths = writeCorpus(corpus, directory)
+
+            failures = 0
+            start = timeit.default_timer()
+            for path, corpusFile in zip(paths, corpus):
+                for row, col in reversed(corpusFile.blocks):
+                    if bdeformatfile.formatBde(path, row, col) != 0:
+                        failures += 1
+
+            times.append(timeit.default_timer() - start)
+    finally:
+        if cacheDir is not None:
+            os.environ[bdeformatcache.CACHE_DIR_ENV] = cacheDir
+
+        shutil.rmtree(directory)
+
+    blocks = sum(len(corpusFile.blocks) for corpusFile in corpus)
+    lines = sum(len(corpusFile.lines) for corpusFile in corpus)
+    return _result(min(times), blocks - failures, lines, failures)
+
+def benchmarkWholeFile(corpus, repeat=3):
+    """
+    Return the result of formatting the DATA sections of every file of the
+    specified 'corpus' with 'bdeformatutil.formatBdeLines', taking the best
+    time of the optionally specified 'repeat' runs.  The blocks counted are
+    the DATA sections.
+    """
+    def run():
+        for corpusFile in corpus:
+            for line in bdeformatutil.formatBdeLines(corpusFile.lines):
+                pass
+
+    seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+    return _result(seconds,
+                   sum(corpusFile.dataSections for corpusFile in corpus),
+                   sum(len(corpusFile.lines) for corpusFile in corpus),
+                   0)
+
+def runBenchmarks(corpus, benchmarks=BENCHMARKS, repeat=3):
+    """
+    Return a map from the name of each of the optionally specified
+    'benchmarks' to its result on the specified 'corpus', taking the best
+    time of the optionally specified 'repeat' runs.
+    """
+    functions = {"formatBde": benchmarkFormatBde,
+                 "file": benchmarkFile,
+                 "wholeFile": benchmarkWholeFile}
+
+    return {name: functions[name](corpus, repeat) for name in benchmarks}
+
+def parseSize(value):
+    """
+    Return the '(name, (low, mode, high))' tuple of the specified 'value' of
+    the form 'name=low,mode,high'.  Throw a 'ValueError' if 'value' isn't of
+    this form or the name isn't one of the 'DEFAULT_SIZES'.
+    """
+    name, _, bounds = value.partition("=")
+    if name not in DEFAULT_SIZES:
+        raise ValueError("unknown size: %s" % name)
+
+    low, mode, high = [int(bound) for bound in bounds.split(",")]
+    if not 0 <= low <= mode <= high:
+        raise ValueError("invalid distribution: %s" % bounds)
+
+    return (name, (low, mode, high))
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                  description="Measure the throughput of the formatter on a "
+                              "synthetic corpus")
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="seed of the corpus (default: 0)")
+    parser.add_argument("--components",
+                        type=int,
+                        default=20,
+                        help="number of components, each made of a header "
+                             "and an implementation file (default: 20)")
+    parser.add_argument("--size",
+                        action="append",
+                        default=[],
+                        metavar="NAME=LOW,MODE,HIGH",
+                        help="distribution of one of the sizes: %s" %
+                                              ", ".join(sorted(DEFAULT_SIZES)))
+    parser.add_argument("--benchmarks",
+                        default=",".join(BENCHMARKS),
+                        help="comma separated benchmarks to run "
+                             "(default: %s)" % ",".join(BENCHMARKS))
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=3,
+                        help="number of runs of each benchmark, of which the "
+                             "fastest is reported (default: 3)")
+    parser.add_argument("--output",
+                        help="file to write the results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = dict(parseSize(size) for size in args.size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    benchmarks = [name for name in args.benchmarks.split(",") if name]
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: %s" % name)
+
+    corpus = generateCorpus(args.seed, args.components, sizes)
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "sizes": dict(DEFAULT_SIZES, **sizes),
+        "corpus": {
+            "files": len(corpus),
+            "lines": sum(len(corpusFile.lines) for corpusFile in corpus),
+            "blocks": sum(len(corpusFile.blocks) for corpusFile in corpus),
+        },
+        "benchmarks": runBenchmarks(corpus, benchmarks, args.repeat),
+    }
+
+    text = json.dumps(results, indent=4, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import bdeformatbench
+import bdeformatutil
+import linesource
+from sectiontype import SectionType
+
+SMALL_SIZES = {"classes": (1, 1, 2), "members": (1, 3, 5)}
+
+class TestDriver(unittest.TestCase):
+
+    def test_generateCorpus(self):
+        F = bdeformatbench.generateCorpus
+
+        corpus = F(1, 3, SMALL_SIZES)
+        self.assertEqual(corpus, F(1, 3, SMALL_SIZES))
+        self.assertNotEqual(corpus, F(2, 3, SMALL_SIZES))
+        self.assertEqual([f.name for f in corpus],
+                         ["bench0.h", "bench0.cpp",
+                          "bench1.h", "bench1.cpp",
+                          "bench2.h", "bench2.cpp"])
+
+        for corpusFile in corpus:
+            numData = sum(1 for line in corpusFile.lines
+                          if SectionType.check(line) == SectionType.DATA)
+            self.assertEqual(numData, corpusFile.dataSections)
+            self.assertEqual(corpusFile.blocks, sorted(corpusFile.blocks))
+
+            # Every block can be formatted
+            lineSource = linesource.ListLineSource(corpusFile.lines)
+            for row, col in corpusFile.blocks:
+                bdeformatutil.formatBde(lineSource, row, col)
+
+        # Sizes can be overridden
+        header = F(1, 1, {"classes": (3, 3, 3)})[0]
+        self.assertEqual(header.dataSections, 3)
+
+    def test_parseSize(self):
+        F = bdeformatbench.parseSize
+        self.assertEqual(F("members=1,2,3"), ("members", (1, 2, 3)))
+        self.assertRaises(ValueError, F, "unknown=1,2,3")
+        self.assertRaises(ValueError, F, "members=3,2,1")
+        self.assertRaises(ValueError, F, "members=1,2")
+
+    def test_runBenchmarks(self):
+        corpus = bdeformatbench.generateCorpus(0, 2, SMALL_SIZES)
+        results = bdeformatbench.runBenchmarks(corpus, repeat=1)
+
+        self.assertEqual(sorted(results), sorted(bdeformatbench.BENCHMARKS))
+        numBlocks = sum(len(f.blocks) for f in corpus)
+        for name in ("formatBde", "file"):
+            self.assertEqual(results[name]["blocks"], numBlocks)
+            self.assertEqual(results[name]["failures"], 0)
+
+        self.assertEqual(results["wholeFile"]["blocks"],
+                         sum(f.dataSections for f in corpus))
+        self.assertEqual(results["wholeFile"]["lines"],
+                         sum(len(f.lines) for f in corpus))
+        for result in results.values():
+            self.assertTrue(result["blocksPerSecond"] > 0)
+            self.assertTrue(result["linesPerSecond"] > 0)
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        try:
+            output = os.path.join(directory, "results.json")
+            subprocess.check_call([sys.executable,
+                                   "bdeformatbench.py",
+                                   "--components",
+                                   "1",
+                                   "--repeat",
+                                   "1",
+                                   "--size",
+                                   "members=1,2,3",
+                                   "--benchmarks",
+                                   "formatBde,wholeFile",
+                                   "--output",
+                                   output])
+            with open(output) as f:
+                results = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(results["version"], bdeformatbench.RESULTS_VERSION)
+        self.assertEqual(results["sizes"]["members"], [1, 2, 3])
+        self.assertEqual(results["corpus"]["files"], 2)
+        self.assertEqual(sorted(results["benchmarks"]),
+                         ["formatBde", "wholeFile"])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,382 @@
+"""
+bdeformatcache.py: Persistent cache of BDE formatting results
+
+This module defines a 'FormatCache' that stores the results of the formatting
+functions in 'bdeformatutil' in a SQLite database, so that blocks that have
+already been formatted with the same parameters, on any previous run, don't
+need to be laid out again.  Results are keyed by a hash of the formatter
+version, the function used, and all of its arguments (including the text of
+the block), and the least recently used results are evicted once the total
+size of the cached results exceeds a configurable limit.  Each result is
+committed as soon as it is stored, so that several processes can share the
+same cache, and failures to access the database only make the cache miss.
+
+The cache is opt-in: 'openCache' returns 'None' unless a cache directory is
+specified, either explicitly or through the 'BDEFORMAT_CACHE_DIR' environment
+variable, or if the database in that directory can't be opened.
+
+A 'MemoryCache' with the same interface can be used by long running processes
+to keep recent results in memory, optionally in front of a 'FormatCache'.
+"""
+
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import bdeformatutil
+
+CACHE_DIR_ENV = "BDEFORMAT_CACHE_DIR"
+    # Environment variable that, if set, names the directory of the cache used
+    # by the command line tools
+
+CACHE_FILE_NAME = "bdeformat.sqlite"
+    # Name of the database file within a cache directory
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+    # Default limit on the total size, in bytes, of the cached results
+
+DEFAULT_BUSY_TIMEOUT = 1.0
+    # Default number of seconds to wait for another process to release the
+    # database before giving up on an access to the cache
+
+STORAGE_VERSION = 2
+    # Version of the encoding of the cached results, which is part of their
+    # keys so that results stored in an older encoding are never read
+
+def _encode(s):
+    """
+    Return the specified 's' as bytes, encoding it as UTF-8 if needed.
+    """
+    return s if isinstance(s, bytes) else s.encode("utf-8")
+
+def _decode(b):
+    """
+    Return the specified bytes 'b' as a native string.
+    """
+    b = bytes(b)
+    return b if isinstance(b, str) else b.decode("utf-8")
+
+class FormatCache(object):
+    """
+    A size-capped, least-recently-used cache of formatting results stored in a
+    SQLite database.  The cache is safe to use from multiple threads, and the
+    database can be shared by several processes.  Results that can't be read
+    or stored because the database is locked for too long or broken are
+    treated as missing.
+    """
+
+    def __init__(self,
+                 cacheDir,
+                 maxSize=DEFAULT_MAX_SIZE,
+                 busyTimeout=DEFAULT_BUSY_TIMEOUT):
+        """
+        Open (creating if necessary) the cache in the specified 'cacheDir',
+        evicting the least recently used results once their total size exceeds
+        the optionally specified 'maxSize' bytes, and waiting at most the
+        optionally specified 'busyTimeout' seconds for other processes to
+        release the database.  Raise 'sqlite3.Error' if the database can't be
+        opened.
+        """
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+        self.d_maxSize = maxSize
+        self.d_lock = threading.Lock()
+        self.d_pendingUses = {}
+        self.d_lastUse = 0
+        self.d_db = sqlite3.connect(os.path.join(cacheDir, CACHE_FILE_NAME),
+                                    timeout=busyTimeout,
+                                    check_same_thread=False)
+        self.d_db.execute("CREATE TABLE IF NOT EXISTS results ("
+                          "key TEXT PRIMARY KEY, "
+                          "lines BLOB NOT NULL, "
+                          "size INTEGER NOT NULL, "
+                          "used REAL NOT NULL)")
+        self.d_db.execute("CREATE INDEX IF NOT EXISTS resultsUsed "
+                          "ON results(used)")
+        self.d_db.commit()
+
+        self.d_size = self._totalSize()
+            # Total size of the cached results, as of the last time it was
+            # read from the database plus the size of the results stored by
+            # this process since
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def key(func, args):
+        """
+        Return the cache key of the result of calling the specified 'func'
+        with the specified 'args'.
+        """
+        h = hashlib.sha1()
+        h.update(_encode("%d\0%d\0%s" % (STORAGE_VERSION,
+                                         bdeformatutil.FORMAT_VERSION,
+                                         func.__name__)))
+        for arg in args:
+            h.update(b"\0")
+            h.update(_encode(str(arg)))
+
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Return the list of lines cached under the specified 'key', or 'None'
+        if there is no such entry.
+        """
+        with self.d_lock:
+            try:
+                row = self.d_db.execute("SELECT lines FROM results "
+                                        "WHERE key = ?",
+                                        (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+
+            if row is None:
+                return None
+
+            # Defer updating the use time, so that hits don't cost a write
+            self.d_pendingUses[key] = self._now()
+
+        # Each line is preceded by a separator, so that an empty list is
+        # distinguished from a list of one empty line
+        return _decode(row[0]).split("\0")[1:]
+
+    def put(self, key, lines):
+        """
+        Cache the specified list of 'lines' under the specified 'key',
+        evicting the least recently used entries if the cache grows beyond its
+        maximum size, and commit the change.  The result is dropped if the
+        database can't be written.
+        """
+        data = _encode("".join("\0" + line for line in lines))
+        with self.d_lock:
+            try:
+                old = self.d_db.execute("SELECT size FROM results "
+                                        "WHERE key = ?",
+                                        (key,)).fetchone()
+                self.d_db.execute("INSERT OR REPLACE INTO results "
+                                  "VALUES (?, ?, ?, ?)",
+                                  (key, sqlite3.Binary(data), len(data),
+                                   self._now()))
+                self.d_size += len(data) - (old[0] if old else 0)
+
+                if self.d_size > self.d_maxSize:
+                    self._evict()
+
+                # Commit right away, so that other processes aren't locked
+                # out of the database until this one flushes
+                self.d_db.commit()
+            except sqlite3.Error:
+                self._rollback()
+
+    def call(self, func, *args):
+        """
+        Return the result of calling the specified 'func' with the specified
+        'args', using the cached result if there is one, and caching it
+        otherwise.  Results of 'None' are not cached.
+        """
+        key = FormatCache.key(func, args)
+        ret = self.get(key)
+        if ret is None:
+            ret = func(*args)
+            if ret is not None:
+                self.put(key, ret)
+
+        return ret
+
+    def flush(self):
+        """
+        Write any pending changes to the database.  The changes are dropped if
+        the database can't be written.
+        """
+        with self.d_lock:
+            try:
+                self._writeUses()
+                self.d_db.commit()
+            except sqlite3.Error:
+                self._rollback()
+
+    def close(self):
+        """
+        Flush and close this cache.
+        """
+        self.flush()
+        self.d_db.close()
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the total size of the
+        cache is below its maximum size.  The behavior is undefined unless
+        'd_lock' is held.
+        """
+        # Other processes may have stored or evicted results since the size
+        # was last read
+        self.d_size = self._totalSize()
+        if self.d_size <= self.d_maxSize:
+            return
+
+        self._writeUses()
+
+        # Leave some headroom, so that we don't evict on every 'put'
+        target = self.d_maxSize * 9 // 10
+        evicted = []
+        for key, size in self.d_db.execute(
+                             "SELECT key, size FROM results ORDER BY used"):
+            if self.d_size <= target:
+                break
+
+            evicted.append((key,))
+            self.d_size -= size
+
+        self.d_db.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def _now(self):
+        """
+        Return the current time, making sure that it's later than the last
+        time returned, so that uses within the clock's resolution are still
+        ordered.  The behavior is undefined unless 'd_lock' is held.
+        """
+        self.d_lastUse = max(time.time(), self.d_lastUse + 1e-6)
+        return self.d_lastUse
+
+    def _rollback(self):
+        """
+        Abandon the current transaction, if any, after a failure to access the
+        database.  The behavior is undefined unless 'd_lock' is held.
+        """
+        try:
+            self.d_db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _totalSize(self):
+        """
+        Return the total size of the results in the database.
+        """
+        row = self.d_db.execute("SELECT SUM(size) FROM results").fetchone()
+        return row[0] or 0
+
+    def _writeUses(self):
+        """
+        Write the use times of the entries retrieved since the last call to
+        the database.  The behavior is undefined unless 'd_lock' is held.
+        """
+        self.d_db.executemany("UPDATE results SET used = ? WHERE key = ?",
+                              [(used, key) for key, used in
+                                                  self.d_pendingUses.items()])
+        self.d_pendingUses = {}
+
+class MemoryCache(object):
+    """
+    A least-recently-used cache of formatting results held in memory, with the
+    same interface as 'FormatCache', optionally in front of another cache.
+    The cache is safe to use from multiple threads.
+    """
+
+    def __init__(self, maxEntries=4096, backingCache=None):
+        """
+        Create a cache holding at most the optionally specified 'maxEntries'
+        results, looking up results that aren't held in the optionally
+        specified 'backingCache' and storing new results there as well.
+        """
+        self.d_maxEntries = maxEntries
+        self.d_backingCache = backingCache
+        self.d_entries = collections.OrderedDict()
+        self.d_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, key):
+        """
+        Return the list of lines cached under the specified 'key', or 'None'
+        if there is no such entry.
+        """
+        with self.d_lock:
+            ret = self.d_entries.pop(key, None)
+            if ret is not None:
+                self.d_entries[key] = ret
+                return list(ret)
+
+        if self.d_backingCache:
+            ret = self.d_backingCache.get(key)
+            if ret is not None:
+                self._insert(key, ret)
+
+        return ret
+
+    def put(self, key, lines):
+        """
+        Cache the specified list of 'lines' under the specified 'key'.
+        """
+        self._insert(key, lines)
+        if self.d_backingCache:
+            self.d_backingCache.put(key, lines)
+
+    def call(self, func, *args):
+        """
+        Return the result of calling the specified 'func' with the specified
+        'args', using the cached result if there is one, and caching it
+        otherwise.  Results of 'None' are not cached.
+        """
+        key = FormatCache.key(func, args)
+        ret = self.get(key)
+        if ret is None:
+            ret = func(*args)
+            if ret is not None:
+                self.put(key, ret)
+
+        return ret
+
+    def flush(self):
+        """
+        Flush the backing cache, if any.
+        """
+        if self.d_backingCache:
+            self.d_backingCache.flush()
+
+    def close(self):
+        """
+        Close the backing cache, if any.
+        """
+        if self.d_backingCache:
+            self.d_backingCache.close()
+
+    def _insert(self, key, lines):
+        """
+        Hold a copy of the specified 'lines' under the specified 'key',
+        evicting the least recently used entry if there are too many.
+        """
+        with self.d_lock:
+            self.d_entries.pop(key, None)
+            self.d_entries[key] = list(lines)
+            if len(self.d_entries) > self.d_maxEntries:
+                self.d_entries.popitem(last=False)
+
+def openCache(cacheDir=None, maxSize=DEFAULT_MAX_SIZE):
+    """
+    Return a 'FormatCache' in the specified 'cacheDir', or in the directory
+    named by the 'BDEFORMAT_CACHE_DIR' environment variable if 'cacheDir' is
+    not specified, limited to the optionally specified 'maxSize' bytes.
+    Return 'None' if neither names a directory, or if the database there
+    can't be opened, so that formatting goes on without a cache.
+    """
+    cacheDir = cacheDir or os.environ.get(CACHE_DIR_ENV)
+    if not cacheDir:
+        return None
+
+    try:
+        return FormatCache(cacheDir, maxSize)
+    except sqlite3.Error:
+        return None
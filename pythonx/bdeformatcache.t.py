@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import bdeformatcache
+import bdeformatutil
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def test_call(self):
+        calls = []
+        def fix(text, width):
+            calls.append(text)
+            return None if text == "bad" else [text, "", "w%d" % width]
+
+        A = self.assertEqual
+
+        with bdeformatcache.FormatCache(self.cacheDir) as cache:
+            A(cache.call(fix, "a", 79), ["a", "", "w79"])
+            A(cache.call(fix, "a", 79), ["a", "", "w79"])
+            A(calls, ["a"])
+
+            A(cache.call(fix, "a", 80), ["a", "", "w80"])
+            A(calls, ["a", "a"])
+
+            A(cache.call(fix, "bad", 79), None)
+            A(cache.call(fix, "bad", 79), None)
+            A(calls, ["a", "a", "bad", "bad"])
+
+            # Empty results, and results of one empty line, are distinct
+            cache.put("empty", [])
+            cache.put("blank", [""])
+
+        # Results persist across instances
+        with bdeformatcache.FormatCache(self.cacheDir) as cache:
+            A(cache.call(fix, "a", 79), ["a", "", "w79"])
+            A(calls, ["a", "a", "bad", "bad"])
+            A(cache.get("empty"), [])
+            A(cache.get("blank"), [""])
+
+    def test_key(self):
+        K = bdeformatcache.FormatCache.key
+        F = bdeformatutil.fixBdeData
+
+        self.assertEqual(K(F, ("a", 79, 40)), K(F, ("a", 79, 40)))
+        self.assertNotEqual(K(F, ("a", 79, 40)), K(F, ("a", 79, 30)))
+        self.assertNotEqual(K(F, ("a", 79, 40)),
+                            K(bdeformatutil.fixBdeBlock, ("a", 79, 40)))
+
+        version = bdeformatutil.FORMAT_VERSION
+        try:
+            oldKey = K(F, ("a", 79, 40))
+            bdeformatutil.FORMAT_VERSION += 1
+            self.assertNotEqual(K(F, ("a", 79, 40)), oldKey)
+        finally:
+            bdeformatutil.FORMAT_VERSION = version
+
+    def test_eviction(self):
+        A = self.assertEqual
+
+        # Each entry is 11 bytes, so the cache holds at most 4 of them
+        with bdeformatcache.FormatCache(self.cacheDir, 44) as cache:
+            for key in "abcd":
+                cache.put(key, [key * 10])
+
+            # Use 'a' so that it becomes the most recently used
+            A(cache.get("a"), ["a" * 10])
+
+            # Adding 'e' evicts down to 90% of the limit, i.e. 'b' and 'c'
+            cache.put("e", ["e" * 10])
+            A(cache.get("a"), ["a" * 10])
+            A(cache.get("b"), None)
+            A(cache.get("c"), None)
+            A(cache.get("d"), ["d" * 10])
+            A(cache.get("e"), ["e" * 10])
+
+    def test_sharedDatabase(self):
+        A = self.assertEqual
+
+        # Results are visible to other processes as soon as they are stored,
+        # and don't lock them out
+        with bdeformatcache.FormatCache(self.cacheDir, 44) as first:
+            for key in "abcd":
+                first.put(key, [key * 10])
+
+            with bdeformatcache.FormatCache(self.cacheDir, 44) as second:
+                A(second.get("a"), ["a" * 10])
+                second.put("e", ["e" * 10])
+                A(first.get("e"), ["e" * 10])
+                A(first.get("b"), None)
+                A(first.get("c"), None)
+
+                # The entries evicted by 'second' aren't counted by 'first'
+                first.put("f", ["f" * 10])
+                for key in "adef":
+                    A(second.get(key), [key * 10])
+
+        # A locked or broken database makes the cache miss instead of failing
+        dbPath = os.path.join(self.cacheDir, bdeformatcache.CACHE_FILE_NAME)
+        with bdeformatcache.FormatCache(self.cacheDir,
+                                        busyTimeout=0.1) as cache:
+            db = sqlite3.connect(dbPath)
+            db.execute("BEGIN EXCLUSIVE")
+            A(cache.get("e"), None)
+            cache.put("x", ["x"])
+            A(cache.call(lambda text: [text], "g"), ["g"])
+            cache.flush()
+
+            A(bdeformatcache.openCache(self.cacheDir), None)
+
+            db.rollback()
+            db.close()
+            A(cache.get("e"), ["e" * 10])
+            A(cache.get("x"), None)
+
+    def test_formatBde(self):
+        lines = ["    // DATA",
+                 "    int d_a; // a",
+                 "    double d_b;",
+                 "",
+                 "    // CREATORS"]
+
+        with bdeformatcache.FormatCache(self.cacheDir) as cache:
+            expected = bdeformatutil.formatBde(lambda r: lines[r], 1, 0)
+            self.assertEqual(
+                 bdeformatutil.formatBde(lambda r: lines[r], 1, 0, cache),
+                 expected)
+            self.assertEqual(
+                 bdeformatutil.formatBde(lambda r: lines[r], 2, 0, cache),
+                 expected)
+
+    def test_openCache(self):
+        env = os.environ.pop(bdeformatcache.CACHE_DIR_ENV, None)
+        try:
+            self.assertEqual(bdeformatcache.openCache(), None)
+
+            os.environ[bdeformatcache.CACHE_DIR_ENV] = self.cacheDir
+            cache = bdeformatcache.openCache()
+            self.assertTrue(cache is not None)
+            cache.close()
+            self.assertTrue(os.path.exists(
+                      os.path.join(self.cacheDir,
+                                   bdeformatcache.CACHE_FILE_NAME)))
+        finally:
+            os.environ.pop(bdeformatcache.CACHE_DIR_ENV, None)
+            if env is not None:
+                os.environ[bdeformatcache.CACHE_DIR_ENV] = env
+
+if __name__ == "__main__":
+    unittest.main();
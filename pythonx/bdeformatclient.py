@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+bdeformatclient.py: Thin client for the BDE formatter daemon
+
+This module can be executed on the command line with the same arguments as
+'bdeformatfile.py' to format the code around a position in a file, but sends
+the request to a running 'bdeformatdaemon.py', which avoids loading the
+formatter on every invocation.  If no daemon is running, the request is
+handled in this process instead.
+
+The daemon's socket is named by the 'BDEFORMAT_SOCKET' environment variable,
+or is 'bdeformat-<uid>.sock' in the temporary directory by default.
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+
+SOCKET_ENV = "BDEFORMAT_SOCKET"
+    # Environment variable that, if set, names the daemon's socket
+
+def defaultSocketPath():
+    """
+    Return the path of the socket of the daemon.
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), "bdeformat-%d.sock" % uid)
+
+def sendRequest(request, socketPath=None):
+    """
+    Send the specified 'request' dictionary to the daemon listening on the
+    optionally specified 'socketPath' (by default 'defaultSocketPath()') and
+    return its response.  Throw a 'socket.error' if the daemon couldn't be
+    reached.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath or defaultSocketPath())
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+
+        response = b""
+        while not response.endswith(b"\n"):
+            data = sock.recv(65536)
+            if not data:
+                raise socket.error("Connection closed by daemon")
+            response += data
+    finally:
+        sock.close()
+
+    return json.loads(response.decode("utf-8"))
+
+def submit(request, socketPath=None):
+    """
+    Return the response to the specified 'request' dictionary from the daemon
+    listening on the optionally specified 'socketPath', or, if there's no
+    daemon, from handling it in this process.
+    """
+    try:
+        return sendRequest(request, socketPath)
+    except socket.error:
+        import bdeformatcache
+        import bdeformatdaemon
+        cache = bdeformatcache.openCache()
+        try:
+            return bdeformatdaemon.Server(cache).handle(request)
+        finally:
+            if cache:
+                cache.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: <fileName> <0-based row number> <0-based column number>")
+        sys.exit(1)
+
+    response = submit({"op": "format",
+                       "path": os.path.abspath(sys.argv[1]),
+                       "row": int(sys.argv[2]),
+                       "col": int(sys.argv[3])})
+    if not response["ok"]:
+        print(response["error"])
+        sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""
+bdeformatdaemon.py: Long running BDE formatter serving JSON requests
+
+This module can be executed on the command line to start a daemon that loads
+the formatter once and serves formatting requests, either on a Unix domain
+socket (by default, see 'bdeformatclient.defaultSocketPath') or, with
+'--stdio', on its standard input and output.  Requests are handled
+concurrently, and formatted blocks are cached in memory for the lifetime of
+the daemon (and persistently, if a cache directory is configured as described
+in 'bdeformatcache', in which case the cache is flushed every
+'FLUSH_INTERVAL' seconds while requests are served).
+
+Each request and response is a JSON object on a single line.  A request has an
+'op' and either the 'path' of a file, which is formatted in place, or the
+'lines' of the source to format, as well as the following parameters:
+
+    op           parameters  result
+    -----------  ----------  --------------------------------------------
+    format       row, col    'edits' formatting the block around the
+                             0-based 'row' and 'col', like 'formatBde'
+    formatRange  start, end  'edits' formatting the DATA sections that
+                             intersect the inclusive 0-based rows
+    formatFile               'edits' formatting all the DATA sections
+    check                    'clean', which is 'true' if no DATA section
+                             needs formatting
+    shutdown                 stops the daemon
+
+Each edit in 'edits' is an object with 'start', 'end' and 'lines', meaning
+that the inclusive range of rows from 'start' to 'end' of the source is to be
+replaced with 'lines'.  Edits are ordered by row and don't overlap.  If the
+request has a 'timeout', formatting fails once it has taken that many
+seconds.  If the request has an 'id', it's returned in the response.  A
+response has an 'ok' field, which is 'false' if the request failed, in which
+case 'error' describes the problem.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import bdeformatcache
+import bdeformatclient
+import bdeformatutil
+import cancellation
+import linesource
+import sourcefile
+
+FLUSH_INTERVAL = 5.0
+    # Minimum number of seconds between two flushes of the cache, which write
+    # the pending changes, such as the use times of the results retrieved,
+    # to the persistent cache
+
+class Server(object):
+    """
+    The handler of formatting requests shared by all the connections of a
+    daemon.
+    """
+
+    def __init__(self, cache=None):
+        """
+        Create a server caching the formatted blocks in memory and in the
+        optionally specified 'cache'.
+        """
+        self.d_cache = bdeformatcache.MemoryCache(backingCache=cache)
+        self.d_pathLocks = {}
+        self.d_lock = threading.Lock()
+        self.d_shutdownCallback = None
+        self.d_lastFlush = time.time()
+
+    def setShutdownCallback(self, callback):
+        """
+        Call the specified 'callback' when a 'shutdown' request is received.
+        """
+        self.d_shutdownCallback = callback
+
+    def handle(self, request):
+        """
+        Return the response dictionary to the specified 'request' dictionary.
+        """
+        response = {"ok": True}
+        if "id" in request:
+            response["id"] = request["id"]
+
+        try:
+            op = request.get("op")
+            if op == "shutdown":
+                if self.d_shutdownCallback:
+                    self.d_shutdownCallback()
+                return response
+
+            if op not in ("format", "formatRange", "formatFile", "check"):
+                raise ValueError("Unknown op: %s" % op)
+
+            path = request.get("path")
+            if path:
+                with self._pathLock(path):
+                    self._handleFile(op, request, path, response)
+            elif "lines" in request:
+                self._handleLines(op, request, request["lines"], response)
+            else:
+                raise ValueError("Request needs 'path' or 'lines'")
+        except (ValueError, KeyError, TypeError, IOError, OSError) as e:
+            response = {"ok": False, "error": str(e)}
+        except Exception as e:
+            # A bug in the formatter mustn't take down the daemon, or leave
+            # the client waiting for a response
+            response = {"ok": False, "error": "Internal error: %r" % e}
+
+        if "id" in request:
+            response["id"] = request["id"]
+
+        self._flushIfDue()
+        return response
+
+    def _flushIfDue(self):
+        """
+        Flush the cache if it wasn't flushed in the last 'FLUSH_INTERVAL'
+        seconds.
+        """
+        now = time.time()
+        with self.d_lock:
+            if now - self.d_lastFlush < FLUSH_INTERVAL:
+                return
+
+            self.d_lastFlush = now
+
+        self.d_cache.flush()
+
+    def edits(self, op, request, lines):
+        """
+        Return the list of '((start, end), lines)' edits that the specified
+        'op' with the parameters in the specified 'request' makes to the
+        specified 'lines'.
+        """
+        deadline = None
+        if request.get("timeout") is not None:
+            deadline = cancellation.Deadline(float(request["timeout"]))
+
+        if op == "format":
+            lineSource = linesource.ListLineSource(lines)
+            (start, end), fixed = bdeformatutil.formatBde(lineSource,
+                                                          request["row"],
+                                                          request["col"],
+                                                          self.d_cache,
+                                                          deadline)
+
+            # Blocks can contain multiline elements
+            fixed = "\n".join(fixed).split("\n")
+            return [((start, end), fixed)] if fixed != lines[start:end + 1] \
+                                           else []
+        elif op == "formatRange":
+            start, end = int(request["start"]), int(request["end"])
+            if start < 0 or end < start:
+                raise ValueError("Bad range: %d to %d" % (start, end))
+
+            # Rows past the end of the source can't intersect any section
+            end = min(end, len(lines) - 1)
+            if start > end:
+                return []
+
+            return bdeformatutil.formatBdeRanges(lines,
+                                                 [(start, end)],
+                                                 self.d_cache,
+                                                 deadline)
+        else:
+            return bdeformatutil.formatBdeRanges(lines,
+                                                 [(0, len(lines) - 1)],
+                                                 self.d_cache,
+                                                 deadline)
+
+    def _handleLines(self, op, request, lines, response):
+        """
+        Handle the specified 'op' with the parameters in the specified
+        'request' on the specified 'lines', and add the result to the
+        specified 'response'.
+        """
+        edits = self.edits(op, request, lines)
+        if op == "check":
+            response["clean"] = not edits
+        else:
+            response["edits"] = [{"start": start, "end": end, "lines": fixed}
+                                 for (start, end), fixed in edits]
+
+    def _handleFile(self, op, request, path, response):
+        """
+        Handle the specified 'op' with the parameters in the specified
+        'request' on the file with the specified 'path', rewriting it unless
+        the 'op' is 'check', and add the result to the specified 'response'.
+        """
+        with open(path, "rb") as f:
+            text = sourcefile.decodeSource(f.read())
+
+        lines = text.split("\n")
+        self._handleLines(op, request, lines, response)
+        if op == "check" or not response["edits"]:
+            return
+
+        for edit in reversed(response["edits"]):
+            lines[edit["start"]:edit["end"] + 1] = edit["lines"]
+
+        with open(path, "wb") as f:
+            f.write(sourcefile.encodeSource("\n".join(lines)))
+
+    def _pathLock(self, path):
+        """
+        Return the lock serializing the requests on the specified 'path'.
+        """
+        with self.d_lock:
+            return self.d_pathLocks.setdefault(os.path.abspath(path),
+                                               threading.Lock())
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of the requests of a socket connection.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            response = handleLine(self.server.bdeServer, line)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class _SocketServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def parseRequest(line):
+    """
+    Return the request dictionary in the specified JSON 'line'.  Throw a
+    'ValueError' if 'line' doesn't hold a JSON object.
+    """
+    if not isinstance(line, str):
+        line = line.decode("utf-8")
+
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError("Bad request: %s" % e)
+
+    if not isinstance(request, dict):
+        raise ValueError("Bad request: not an object")
+
+    return request
+
+def handleLine(server, line):
+    """
+    Return the response of the specified 'server' to the JSON request in the
+    specified 'line'.
+    """
+    try:
+        request = parseRequest(line)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
+    return server.handle(request)
+
+def serveSocket(server, socketPath):
+    """
+    Serve the requests to the specified 'server' on a Unix domain socket at the
+    specified 'socketPath' until a 'shutdown' request is received.
+    """
+    if os.path.exists(socketPath):
+        os.unlink(socketPath)
+
+    socketServer = _SocketServer(socketPath, _RequestHandler)
+    socketServer.bdeServer = server
+
+    # 'shutdown' waits for 'serve_forever' to return, so it can't be called
+    # from the thread handling the request
+    server.setShutdownCallback(
+                lambda: threading.Thread(target=socketServer.shutdown).start())
+    try:
+        socketServer.serve_forever()
+    finally:
+        socketServer.server_close()
+        os.unlink(socketPath)
+
+def serveStdio(server, inFile, outFile):
+    """
+    Serve the requests to the specified 'server' read from the specified
+    'inFile', writing the responses to the specified 'outFile', until the end
+    of 'inFile' or a 'shutdown' request.  Each request is handled on its own
+    thread, so responses can be written out of order, except for 'shutdown',
+    which is handled once all the earlier requests have been, and stops the
+    reading of requests.
+    """
+    writeLock = threading.Lock()
+
+    def write(response):
+        response = json.dumps(response) + "\n"
+        with writeLock:
+            outFile.write(response)
+            outFile.flush()
+
+    def serve(request):
+        write(server.handle(request))
+
+    shutdown = None
+    threads = []
+    for line in iter(inFile.readline, ""):
+        if not line.strip():
+            continue
+
+        try:
+            request = parseRequest(line)
+        except ValueError as e:
+            write({"ok": False, "error": str(e)})
+            continue
+
+        if request.get("op") == "shutdown":
+            shutdown = request
+            break
+
+        thread = threading.Thread(target=serve, args=(request,))
+        thread.start()
+        threads.append(thread)
+        threads = [t for t in threads if t.is_alive()]
+
+    for thread in threads:
+        thread.join()
+
+    if shutdown is not None:
+        serve(shutdown)
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                                 description="Serve BDE formatting requests")
+    parser.add_argument("--socket",
+                        help="path of the Unix domain socket to listen on "
+                             "(default: %s)" %
+                                         bdeformatclient.defaultSocketPath())
+    parser.add_argument("--stdio",
+                        action="store_true",
+                        help="serve requests on stdin and stdout instead of a "
+                             "socket")
+    parser.add_argument("--cache-dir",
+                        help="directory of a persistent cache of formatted "
+                             "blocks (default: $%s)" %
+                                                  bdeformatcache.CACHE_DIR_ENV)
+    args = parser.parse_args(argv)
+
+    cache = bdeformatcache.openCache(args.cache_dir)
+    server = Server(cache)
+    try:
+        if args.stdio:
+            serveStdio(server, sys.stdin, sys.stdout)
+        else:
+            serveSocket(server,
+                        args.socket or bdeformatclient.defaultSocketPath())
+    finally:
+        if cache:
+            cache.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
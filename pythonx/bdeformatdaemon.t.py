@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import bdeformatcache
+import bdeformatclient
+import bdeformatdaemon
+from testsources import DATA_END, DATA_START, LINES, SOURCE
+from testsources import FORMATTED_CTOR_LINES, FORMATTED_DATA_LINES
+
+DATA_EDIT = {"start": DATA_START,
+             "end": DATA_END,
+             "lines": FORMATTED_DATA_LINES}
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_handleLines(self):
+        server = bdeformatdaemon.Server()
+        A = self.assertEqual
+        H = lambda **kw: server.handle(dict(lines=LINES, **kw))
+
+        A(H(op="format", row=3, col=4),
+          {"ok": True, "edits": [DATA_EDIT]})
+        A(H(op="format", row=6, col=20, id=7),
+          {"ok": True, "id": 7, "edits": [
+            {"start": 6, "end": 6, "lines": FORMATTED_CTOR_LINES}]})
+        A(H(op="formatRange", start=0, end=1),
+          {"ok": True, "edits": [DATA_EDIT]})
+        A(H(op="formatRange", start=5, end=7),
+          {"ok": True, "edits": []})
+        A(H(op="formatFile"),
+          {"ok": True, "edits": [DATA_EDIT]})
+        A(H(op="check"),
+          {"ok": True, "clean": False})
+
+        ret = H(op="format", row=0, col=0, id="x")
+        A(ret["ok"], False)
+        A(ret["id"], "x")
+
+        # Ranges past the end are clamped, and invalid ones rejected
+        A(H(op="formatRange", start=3, end=99),
+          {"ok": True, "edits": [DATA_EDIT]})
+        A(H(op="formatRange", start=50, end=99, id=1),
+          {"ok": True, "id": 1, "edits": []})
+        A(H(op="formatRange", start=5, end=1)["ok"], False)
+        A(H(op="formatRange", start=-1, end=1)["ok"], False)
+        A(H(op="formatRange", start="x", end=1)["ok"], False)
+
+        A(H(op="bogus")["ok"], False)
+        A(server.handle({"op": "check"})["ok"], False)
+        A(H(op="format")["ok"], False)
+
+        # Timeouts
+        A(H(op="formatFile", timeout=60),
+          {"ok": True, "edits": [DATA_EDIT]})
+        A(H(op="formatFile", timeout=0),
+          {"ok": False, "error": "Formatting took too long"})
+        A(H(op="format", row=6, col=20, timeout=0),
+          {"ok": False, "error": "Formatting took too long"})
+
+    def test_internalError(self):
+        server = bdeformatdaemon.Server()
+        def edits(op, request, lines):
+            raise IndexError("bug")
+        server.edits = edits
+
+        ret = server.handle({"op": "formatFile", "lines": LINES, "id": 3})
+        self.assertEqual(ret["ok"], False)
+        self.assertEqual(ret["id"], 3)
+        self.assertTrue("bug" in ret["error"])
+
+    def test_flush(self):
+        flushes = []
+        class Cache(object):
+            def get(self, key):
+                return None
+            def put(self, key, lines):
+                pass
+            def flush(self):
+                flushes.append(True)
+
+        server = bdeformatdaemon.Server(Cache())
+        request = {"op": "formatFile", "lines": LINES}
+        server.handle(request)
+        self.assertEqual(flushes, [])
+
+        saved = bdeformatdaemon.FLUSH_INTERVAL
+        bdeformatdaemon.FLUSH_INTERVAL = 0
+        try:
+            server.handle(request)
+            self.assertEqual(flushes, [True])
+        finally:
+            bdeformatdaemon.FLUSH_INTERVAL = saved
+
+        # Other processes see the results while the daemon is running, and
+        # can store their own
+        cache = bdeformatcache.FormatCache(self.dir)
+        bdeformatdaemon.Server(cache).handle(request)
+        db = sqlite3.connect(os.path.join(self.dir,
+                                          bdeformatcache.CACHE_FILE_NAME))
+        self.assertTrue(
+                db.execute("SELECT COUNT(*) FROM results").fetchone()[0] > 0)
+        db.close()
+
+        with bdeformatcache.FormatCache(self.dir, busyTimeout=0.1) as other:
+            other.put("x", ["y"])
+
+        self.assertEqual(cache.get("x"), ["y"])
+        cache.close()
+
+    def test_handleFile(self):
+        server = bdeformatdaemon.Server()
+        path = os.path.join(self.dir, "foo.h")
+        with open(path, "w") as f:
+            f.write(SOURCE)
+
+        ret = server.handle({"op": "check", "path": path})
+        self.assertEqual(ret, {"ok": True, "clean": False})
+
+        ret = server.handle({"op": "formatFile", "path": path})
+        self.assertEqual(ret, {"ok": True, "edits": [DATA_EDIT]})
+
+        ret = server.handle({"op": "check", "path": path})
+        self.assertEqual(ret, {"ok": True, "clean": True})
+
+        ret = server.handle({"op": "check",
+                             "path": os.path.join(self.dir, "missing.h")})
+        self.assertEqual(ret["ok"], False)
+
+    def test_socket(self):
+        socketPath = os.path.join(self.dir, "sock")
+        server = bdeformatdaemon.Server()
+        thread = threading.Thread(target=bdeformatdaemon.serveSocket,
+                                  args=(server, socketPath))
+        thread.start()
+
+        try:
+            for i in range(100):
+                if os.path.exists(socketPath):
+                    break
+                time.sleep(0.01)
+
+            ret = bdeformatclient.sendRequest(
+                            {"op": "formatFile", "lines": LINES}, socketPath)
+            self.assertEqual(ret, {"ok": True, "edits": [DATA_EDIT]})
+        finally:
+            bdeformatclient.sendRequest({"op": "shutdown"}, socketPath)
+            thread.join()
+
+        self.assertFalse(os.path.exists(socketPath))
+
+        # Without a daemon, requests are handled by the client
+        ret = bdeformatclient.submit({"op": "formatFile", "lines": LINES},
+                                     socketPath)
+        self.assertEqual(ret, {"ok": True, "edits": [DATA_EDIT]})
+
+    def test_stdio(self):
+        requests = [{"id": i, "op": "formatFile", "lines": LINES}
+                    for i in range(10)]
+        process = subprocess.Popen([sys.executable,
+                                    "bdeformatdaemon.py",
+                                    "--stdio"],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        out, _ = process.communicate("\n".join(json.dumps(r)
+                                               for r in requests) +
+                                     "\nnot json\n")
+
+        self.assertEqual(process.returncode, 0)
+        responses = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(len(responses), 11)
+        self.assertEqual(
+              sorted([r for r in responses if "id" in r],
+                     key=lambda r: r["id"]),
+              [{"ok": True, "id": i, "edits": [DATA_EDIT]}
+                                                         for i in range(10)])
+        self.assertEqual(len([r for r in responses if not r["ok"]]), 1)
+
+    def test_stdioShutdown(self):
+        # Requests before 'shutdown' are answered first, and requests after it
+        # aren't read
+        requests = [{"id": 1, "op": "formatFile", "lines": LINES},
+                    {"id": 2, "op": "shutdown"},
+                    {"id": 3, "op": "formatFile", "lines": LINES}]
+        process = subprocess.Popen([sys.executable,
+                                    "bdeformatdaemon.py",
+                                    "--stdio"],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        out, _ = process.communicate("\n".join(json.dumps(r)
+                                               for r in requests) + "\n")
+
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual([json.loads(line) for line in out.splitlines()],
+                         [{"ok": True, "id": 1, "edits": [DATA_EDIT]},
+                          {"ok": True, "id": 2}])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -5,14 +5,18 @@ bdeformatfile.py: BDE formatter that modifies a specific section of a file
 This module can be executed on the command line to modify a particular section
 of a file and format it according to the BDE standard.  If the formatting
 fails for any reason, an error code is returned and the original file is
-unmodified.
+unmodified.  If the 'BDEFORMAT_CACHE_DIR' environment variable is set, the
+formatted blocks are cached in that directory (see 'bdeformatcache').
 """
 
 import mmap
 import os
 import sys
 
+import bdeformatcache
 import bdeformatutil
+import linesource
+import sourcefile
 
 def formatBde(fileName, row, col):
     """
@@ -23,37 +27,41 @@ def formatBde(fileName, row, col):
 
     with open(fileName, "r+b") as f:
         m = mmap.mmap(f.fileno(), 0)
-        linePositions = []
-        def lineSource(r):
+        linePositions = [0]
+        def rowPosition(r):
             while len(linePositions) <= r:
-                linePositions.append(m.tell())
+                m.seek(linePositions[-1])
                 m.readline()
+                linePositions.append(m.tell())
+
+            return linePositions[r]
 
-            pos = m.tell()
-            m.seek(linePositions[r])
-            ret = m.readline()[:-1]
-            m.seek(pos)
+        def fetchRange(start, end):
+            text = sourcefile.decodeSource(
+                                        m[rowPosition(start):rowPosition(end)])
+            return text.split("\n")[:end - start]
 
-            return ret
+        lineSource = linesource.PrefetchingLineSource(fetchRange)
 
+        cache = bdeformatcache.openCache()
         try:
-            startEnd, lines = bdeformatutil.formatBde(lineSource, row, col)
+            startEnd, lines = bdeformatutil.formatBde(lineSource,
+                                                      row,
+                                                      col,
+                                                      cache)
         except ValueError as e:
-            print e
+            print(e)
             return 1
-
-        # Make sure we have the position of the line after the end line
-        start, end = startEnd
-        while end + 1 >= len(linePositions):
-            m.seek(linePositions[-1])
-            m.readline()
-            linePositions.append(m.tell())
+        finally:
+            if cache:
+                cache.close()
 
         # Update the file
+        start, end = startEnd
         fixed = "\n".join(lines)
         fixedLen = len(fixed) + 1 # Add a newline at the end
-        startPos = linePositions[start]
-        endPos = linePositions[end + 1]
+        startPos = rowPosition(start)
+        endPos = rowPosition(end + 1)
         replaceLen = endPos - startPos
         moveDest = endPos + fixedLen - replaceLen
         moveSrc = endPos
@@ -69,8 +77,8 @@ def formatBde(fileName, row, col):
             m.resize(m.size() + fixedLen - replaceLen)
 
         m.seek(startPos)
-        m.write(fixed)
-        m.write("\n")
+        m.write(sourcefile.encodeSource(fixed))
+        m.write(b"\n")
         m.flush()
         m.close()
 
@@ -81,7 +89,7 @@ def formatBde(fileName, row, col):
 
 if __name__ == "__main__":
     if len(sys.argv) != 4:
-        print "Usage: <fileName> <0-based row number> <0-based column number>"
+        print("Usage: <fileName> <0-based row number> <0-based column number>")
         sys.exit(1)
 
     ret = formatBde(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+bdeformatfilter.py: BDE formatter that filters stdin to stdout
+
+This module can be executed on the command line to read C++ source from
+standard input and write it to standard output with either the block around a
+row and column, the DATA sections intersecting a range of rows, or all DATA
+sections formatted according to the BDE standard:
+
+    bdeformatfilter.py                        # all DATA sections
+    bdeformatfilter.py <row> <column>         # like 'bdeformatfile.py'
+    bdeformatfilter.py --range <start> <end>  # inclusive, 0-based rows
+
+The input is processed as a stream: only the rows that could be part of the
+block being formatted are buffered, so the filter can sit in a pipeline
+without temporary files.  If the formatting fails, the input is written
+unmodified, and an error code is returned.
+"""
+
+import collections
+import sys
+
+import bdeformatcache
+import bdeformatutil
+import linesource
+import sourcefile
+
+def formatLinesAt(lines, row, col, cache=None):
+    """
+    Generate the specified iterable of 'lines' with the block around the
+    specified 'col' of the specified 'row' formatted as 'formatBde' would,
+    using the optionally specified 'cache'.  Only the rows within
+    'MAX_SECTION_ROWS' of 'row' are buffered.  If the block can't be
+    formatted, the 'lines' are generated unmodified and a 'ValueError' is
+    raised after the last one.
+    """
+    lines = iter(lines)
+    windowStart = max(row - bdeformatutil.MAX_SECTION_ROWS, 0)
+    windowEnd = row + bdeformatutil.MAX_SECTION_ROWS
+
+    # Pass through the rows before the window
+    window = collections.deque()
+    for line in lines:
+        if len(window) == windowStart:
+            window.append(line)
+            break
+
+        yield line
+        windowStart -= 1
+        windowEnd -= 1
+        row -= 1
+
+    # Buffer the window
+    for line in lines:
+        window.append(line)
+        if len(window) > windowEnd:
+            break
+
+    window = list(window)
+    lineSource = linesource.ListLineSource(window)
+
+    error = None
+    try:
+        (start, end), fixed = bdeformatutil.formatBde(lineSource,
+                                                      row,
+                                                      col,
+                                                      cache)
+        window[start:end + 1] = "\n".join(fixed).split("\n")
+    except ValueError as e:
+        error = e
+
+    for line in window:
+        yield line
+
+    for line in lines:
+        yield line
+
+    if error:
+        raise error
+
+def main(argv):
+    usage = "Usage: [<0-based row> <0-based column> | " \
+            "--range <0-based start row> <0-based end row>]"
+
+    try:
+        if not argv:
+            mode = "file"
+        elif len(argv) == 2:
+            mode = "at"
+            row, col = int(argv[0]), int(argv[1])
+        elif len(argv) == 3 and argv[0] == "--range":
+            mode = "range"
+            start, end = int(argv[1]), int(argv[2])
+        else:
+            raise ValueError(usage)
+    except ValueError:
+        sys.stderr.write(usage + "\n")
+        return 1
+
+    inStream = getattr(sys.stdin, "buffer", sys.stdin)
+    outStream = getattr(sys.stdout, "buffer", sys.stdout)
+
+    cache = bdeformatcache.openCache()
+    try:
+        lines = sourcefile.readLines(inStream)
+        if mode == "at":
+            lines = formatLinesAt(lines, row, col, cache)
+        elif mode == "range":
+            lines = bdeformatutil.formatBdeLines(lines, cache, [(start, end)])
+        else:
+            lines = bdeformatutil.formatBdeLines(lines, cache)
+
+        sourcefile.writeLines(lines, outStream)
+    except ValueError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    finally:
+        outStream.flush()
+        if cache:
+            cache.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
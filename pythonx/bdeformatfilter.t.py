@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import subprocess
+import sys
+import unittest
+
+import bdeformatfilter
+import bdeformatutil
+from testsources import CTOR_ROW, FORMATTED_CTOR, FORMATTED_DATA, SOURCE
+
+class TestDriver(unittest.TestCase):
+
+    def test_formatLinesAt(self):
+        F = lambda s, r, c: "\n".join(
+                  bdeformatfilter.formatLinesAt(iter(s.split("\n")), r, c))
+        A = self.assertEqual
+
+        A(F(SOURCE, 2, 4), FORMATTED_DATA)
+        A(F(SOURCE, CTOR_ROW, 10), FORMATTED_CTOR)
+
+        # Failures generate the lines, then raise
+        lines = []
+        try:
+            for line in bdeformatfilter.formatLinesAt(SOURCE.split("\n"),
+                                                      0,
+                                                      0):
+                lines.append(line)
+            self.fail("No exception")
+        except ValueError:
+            pass
+        A("\n".join(lines), SOURCE)
+
+    def test_formatLinesAtBuffering(self):
+        # Rows far enough from the block are passed through without being
+        # buffered
+        maxRows = bdeformatutil.MAX_SECTION_ROWS
+        padding = 3 * maxRows
+        source = [""] * padding + SOURCE.split("\n") + [""] * padding
+
+        numRead = [0]
+        def lines():
+            for line in source:
+                numRead[0] += 1
+                yield line
+
+        gen = bdeformatfilter.formatLinesAt(lines(),
+                                              padding + CTOR_ROW,
+                                              10)
+        for i in range(padding - maxRows):
+            next(gen)
+            self.assertEqual(numRead[0], i + 1)
+
+        ret = list(gen)
+        self.assertEqual(numRead[0], len(source))
+        self.assertEqual("\n".join(ret[maxRows:-padding]),
+                         FORMATTED_CTOR)
+
+    def test_main(self):
+        def T(args, inS, outS, ret=0):
+            process = subprocess.Popen(
+                                 [sys.executable, "bdeformatfilter.py"] + args,
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE)
+            out, _ = process.communicate(inS.encode("ascii"))
+            self.assertEqual(out.decode("ascii"), outS)
+            self.assertEqual(process.returncode, ret)
+
+        T([], SOURCE, FORMATTED_DATA)
+        T([str(CTOR_ROW), "10"], SOURCE, FORMATTED_CTOR)
+        T(["--range", "5", "8"], SOURCE, SOURCE)
+        T(["--range", "0", "1"], SOURCE, FORMATTED_DATA)
+        T(["0", "0"], SOURCE, SOURCE, 1)
+        T(["0"], SOURCE, "", 1)
+
+if __name__ == "__main__":
+    unittest.main();
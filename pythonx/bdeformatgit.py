@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+bdeformatgit.py: BDE formatter for the lines changed in a git repository
+
+This module can be executed on the command line, for example from a
+pre-commit hook, to format only the DATA sections touched by the changes
+staged in a git repository relative to a base revision.  The changed rows are
+determined from 'git diff -U0', and the staged content of every changed file
+is read through a single long-lived 'git cat-file --batch' process.
+
+The formatted sections are written to the working tree, so they can be
+reviewed and staged, and a non-zero code is returned if any section needed
+formatting.  With '--check', the sections are only reported.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+import bdeformatcache
+import bdeformatutil
+import sourcefile
+
+PATH_ESCAPES = {"a": "\a", "b": "\b", "t": "\t", "n": "\n", "v": "\v",
+                "f": "\f", "r": "\r"}
+    # Map from the letter of the escape sequences git uses in quoted paths to
+    # the character they stand for
+
+def unquotePath(name):
+    """
+    Return the path in the specified 'name' of a file in a '---' or '+++'
+    line of a diff.  Git quotes the names having special characters like C
+    strings, and follows the names having spaces with a tab.  Non-ASCII
+    characters are only unquoted when 'core.quotePath' is 'false', which
+    leaves them unescaped.
+    """
+    if not name.startswith('"'):
+        return name[:-1] if name.endswith("\t") else name
+
+    def unescape(match):
+        escaped = match.group(1)
+        if len(escaped) == 3:
+            return chr(int(escaped, 8))
+
+        return PATH_ESCAPES.get(escaped, escaped)
+
+    return re.sub(r'\\([0-7]{3}|.)', unescape, name[1:name.rindex('"')])
+
+def parseDiff(diff):
+    """
+    Parse the specified 'diff', which is the output of 'git diff -U0', and
+    return a dictionary mapping the path of each file in the new version to a
+    list of '(start, end)' tuples of the 0-based inclusive ranges of its rows
+    that were changed.  Deletions are represented by the rows on both sides of
+    where the lines were removed.  Paths are unquoted with 'unquotePath'.
+    """
+
+    if not hasattr(parseDiff, "hunkPattern"):
+        parseDiff.hunkPattern = re.compile(
+                                    r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+    ret = {}
+    ranges = None
+    for line in diff.split("\n"):
+        if line.startswith("+++ "):
+            path = unquotePath(line[4:])
+            if path.startswith("b/"):
+                ranges = ret.setdefault(path[2:], [])
+            else:
+                # Deleted file
+                ranges = None
+            continue
+
+        match = parseDiff.hunkPattern.match(line)
+        if not match or ranges is None:
+            continue
+
+        start = int(match.group(1))
+        count = int(match.group(2)) if match.group(2) is not None else 1
+        if count == 0:
+            # Lines were deleted after line 'start'
+            ranges.append((max(start - 1, 0), start))
+        else:
+            ranges.append((start - 1, start + count - 2))
+
+    return ret
+
+class GitCatFile(object):
+    """
+    A long-lived 'git cat-file --batch' process used to read the content of
+    many objects without starting a process for each.
+    """
+
+    def __init__(self, repoDir):
+        """
+        Start a 'git cat-file --batch' process in the specified 'repoDir'.
+        """
+        self.d_process = subprocess.Popen(["git", "cat-file", "--batch"],
+                                          cwd=repoDir,
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, objectName):
+        """
+        Return the content, as bytes, of the object with the specified
+        'objectName', for example ':path' for the staged content of 'path', or
+        'None' if there is no such object.
+        """
+        self.d_process.stdin.write(objectName.encode("utf-8") + b"\n")
+        self.d_process.stdin.flush()
+
+        header = self.d_process.stdout.readline().split()
+        if len(header) != 3:
+            # '<objectName> missing'
+            return None
+
+        size = int(header[2])
+        content = self.d_process.stdout.read(size)
+        self.d_process.stdout.read(1) # Trailing newline
+        return content
+
+    def close(self):
+        """
+        Stop the 'git cat-file' process.
+        """
+        self.d_process.stdin.close()
+        self.d_process.wait()
+
+def git(repoDir, args):
+    """
+    Run git with the specified 'args' in the specified 'repoDir' and return
+    its output as a string.  Throw a 'subprocess.CalledProcessError' if it
+    fails.
+    """
+    out = subprocess.check_output(["git"] + args, cwd=repoDir)
+    return out if isinstance(out, str) else out.decode("utf-8")
+
+def applyEdits(lines, edits):
+    """
+    Return a copy of the specified 'lines' with the specified 'edits', as
+    returned by 'bdeformatutil.formatBdeRanges', applied.
+    """
+    ret = list(lines)
+    for (start, end), fixed in reversed(edits):
+        ret[start:end + 1] = fixed
+
+    return ret
+
+def formatStaged(repoDir, base, check, cache=None):
+    """
+    Format the DATA sections touched by the changes staged in the git
+    repository at the specified 'repoDir' relative to the specified 'base'
+    revision, using the optionally specified 'cache'.  Write the formatted
+    files to the working tree unless the specified 'check' is 'True'.  Return
+    0 if nothing needed formatting, and 1 otherwise.
+    """
+    diff = git(repoDir, ["-c", "core.quotePath=false",
+                         "diff", "--cached", "-U0", "--no-color",
+                         "--no-ext-diff", "--diff-filter=ACMR", base])
+
+    ret = 0
+    with GitCatFile(repoDir) as catFile:
+        for path, ranges in sorted(parseDiff(diff).items()):
+            if not path.endswith(sourcefile.SOURCE_EXTENSIONS) or \
+               not ranges:
+                continue
+
+            staged = catFile.read(":" + path)
+            if staged is None:
+                continue
+
+            text = sourcefile.decodeSource(staged)
+            lines = text.split("\n")
+            edits = bdeformatutil.formatBdeRanges(lines, ranges, cache)
+            if not edits:
+                continue
+
+            ret = 1
+            for (start, end), _ in edits:
+                print("%s:%d: DATA section needs formatting" % (path,
+                                                                start + 1))
+
+            if check:
+                continue
+
+            fullPath = os.path.join(repoDir, path)
+            with open(fullPath, "rb") as f:
+                if f.read() != staged:
+                    print("%s: not formatted, since it has unstaged changes" %
+                                                                         path)
+                    continue
+
+            fixed = "\n".join(applyEdits(lines, edits))
+            with open(fullPath, "wb") as f:
+                f.write(sourcefile.encodeSource(fixed))
+
+    return ret
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+             description="Format the DATA sections touched by staged changes")
+    parser.add_argument("--base",
+                        default="HEAD",
+                        help="revision to compare the staged changes to "
+                             "(default: HEAD)")
+    parser.add_argument("--check",
+                        action="store_true",
+                        help="report unformatted sections instead of fixing "
+                             "them")
+    parser.add_argument("--cache-dir",
+                        help="directory of a persistent cache of formatted "
+                             "blocks (default: $%s)" %
+                                                  bdeformatcache.CACHE_DIR_ENV)
+    args = parser.parse_args(argv)
+
+    try:
+        repoDir = git(os.getcwd(), ["rev-parse", "--show-toplevel"]).strip()
+    except subprocess.CalledProcessError:
+        return 1
+
+    cache = bdeformatcache.openCache(args.cache_dir)
+    try:
+        return formatStaged(repoDir, args.base, args.check, cache)
+    finally:
+        if cache:
+            cache.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import bdeformatgit
+
+class TestDriver(unittest.TestCase):
+
+    def test_parseDiff(self):
+        diff = """\
+diff --git a/a.h b/a.h
+index 1111111..2222222 100644
+--- a/a.h
++++ b/a.h
+@@ -3 +3 @@ class Foo {
+-    int d_a;
++    int  d_a;
+@@ -10,0 +11,2 @@ class Foo {
++    int d_b;
++    int d_c;
+@@ -20,2 +22,0 @@ class Foo {
+-    int d_d;
+-    int d_e;
+diff --git a/b.cpp b/b.cpp
+deleted file mode 100644
+--- a/b.cpp
++++ /dev/null
+@@ -1,2 +0,0 @@
+-int x;
+-int y;
+diff --git a/c.cpp b/c.cpp
+new file mode 100644
+--- /dev/null
++++ b/c.cpp
+@@ -0,0 +1,3 @@
++int x;
++int y;
++int z;
+"""
+        self.assertEqual(bdeformatgit.parseDiff(diff),
+                         {"a.h": [(2, 2), (10, 11), (21, 22)],
+                          "c.cpp": [(0, 2)]})
+
+        # Quoted paths, and paths with spaces
+        diff = """\
+--- /dev/null
++++ b/d e.h\t
+@@ -0,0 +1 @@
+--- /dev/null
++++ "b/f\\"g\\th\\\\i\\012.h"
+@@ -0,0 +1 @@
+"""
+        self.assertEqual(bdeformatgit.parseDiff(diff),
+                         {"d e.h": [(0, 0)],
+                          'f"g\th\\i\n.h': [(0, 0)]})
+
+    def test_unquotePath(self):
+        F = bdeformatgit.unquotePath
+        self.assertEqual(F("b/a.h"), "b/a.h")
+        self.assertEqual(F("b/a b.h\t"), "b/a b.h")
+        self.assertEqual(F('"b/a\\tb.h"'), "b/a\tb.h")
+        self.assertEqual(F('"b/\\"a\\".h"'), 'b/"a".h')
+        self.assertEqual(F('"b/a\\001.h"'), "b/a\001.h")
+
+    def test_applyEdits(self):
+        self.assertEqual(
+              bdeformatgit.applyEdits(["a", "b", "c", "d", "e"],
+                                      [((1, 1), ["B1", "B2"]),
+                                       ((3, 4), ["DE"])]),
+              ["a", "B1", "B2", "c", "DE"])
+
+    def test_formatStaged(self):
+        repoDir = tempfile.mkdtemp()
+        try:
+            def git(*args):
+                with open(os.devnull, "w") as devnull:
+                    subprocess.check_call(["git",
+                                           "-c", "user.name=test",
+                                           "-c", "user.email=test@test"] +
+                                          list(args),
+                                          cwd=repoDir,
+                                          stdout=devnull)
+
+            def write(name, content):
+                with open(os.path.join(repoDir, name), "w") as f:
+                    f.write(content)
+
+            def read(name):
+                with open(os.path.join(repoDir, name)) as f:
+                    return f.read()
+
+            header = """\
+class Foo {
+    // DATA
+    int d_a; // untouched
+
+    // CREATORS
+    Foo();
+
+    // DATA
+    int d_b;
+    double d_c;
+
+  public:
+};
+"""
+            git("init", "-q")
+            write("foo.h", header)
+            write("other.h", header)
+            git("add", ".")
+            git("commit", "-q", "-m", "initial")
+
+            # Change the second DATA section of 'foo.h'
+            write("foo.h", header.replace("double d_c;", "double d_c; // c"))
+            git("add", "foo.h")
+
+            self.assertEqual(
+                  bdeformatgit.formatStaged(repoDir, "HEAD", True), 1)
+            self.assertEqual(
+                  read("foo.h"),
+                  header.replace("double d_c;", "double d_c; // c"))
+
+            self.assertEqual(
+                  bdeformatgit.formatStaged(repoDir, "HEAD", False), 1)
+            self.assertEqual(read("foo.h"), header.replace("""\
+    int d_b;
+    double d_c;
+""", """\
+    int    d_b;
+    double d_c;  // c
+"""))
+            self.assertEqual(read("other.h"), header)
+
+            git("add", "foo.h")
+            self.assertEqual(
+                  bdeformatgit.formatStaged(repoDir, "HEAD", False), 0)
+
+            # Paths that git quotes, or follows with a tab
+            for name in ('with "quotes".h', "with space.h"):
+                write(name,
+                      header.replace("double d_c;", "double d_c; // c"))
+                git("add", name)
+                self.assertEqual(
+                      bdeformatgit.formatStaged(repoDir, "HEAD", False), 1)
+                self.assertTrue("    double d_c;  // c\n" in read(name))
+        finally:
+            shutil.rmtree(repoDir)
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+"""
+bdeformatlsp.py: Language Server Protocol server for the BDE formatter
+
+This module can be executed on the command line to start a language server
+speaking the Language Server Protocol on its standard input and output, so
+that any editor with an LSP client can use the formatter.  It supports:
+
+    textDocument/formatting       formats all the DATA sections
+    textDocument/rangeFormatting  formats the DATA sections intersecting the
+                                  range
+    workspace/executeCommand      with the 'bdeformat.formatBlock' command and
+                                  the arguments '[uri, position]', formats the
+                                  block or section around the position, like
+                                  'bdeformatfile.py', by sending a
+                                  'workspace/applyEdit' request to the client
+                                  (the edits are also returned)
+
+Documents are synchronized incrementally: the server keeps the lines of every
+open document in memory and applies the ranges of each 'didChange' to them,
+so requests never read files.  As for the other tools, formatted blocks are
+cached in memory, and persistently if a cache directory is configured (see
+'bdeformatcache').
+"""
+
+import argparse
+import json
+import sys
+
+import bdeformatcache
+import bdeformatutil
+import linesource
+
+FORMAT_BLOCK_COMMAND = "bdeformat.formatBlock"
+    # Name of the command formatting the block around a position
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_FAILED = -32803
+    # JSON-RPC and LSP error codes
+
+STRING_TYPES = (type(""), type(u""))
+    # Types of the strings decoded from JSON, which are 'unicode' in Python 2
+
+def utf16Index(line, character):
+    """
+    Return the index in the specified 'line' of the character at the
+    specified 'character' offset, which is in UTF-16 code units as in LSP
+    positions.  Offsets past the end of 'line' are clamped to its length.
+    """
+    units = 0
+    for index, c in enumerate(line):
+        if units >= character:
+            return index
+
+        units += 2 if ord(c) > 0xffff else 1
+
+    return len(line)
+
+def utf16Length(line):
+    """
+    Return the length of the specified 'line' in UTF-16 code units.
+    """
+    return len(line) + len([c for c in line if ord(c) > 0xffff])
+
+class ResponseError(Exception):
+    """
+    An error to be returned as the response to a request.
+    """
+
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+def checkParam(value, types, name):
+    """
+    Return the specified 'value' of the request param with the specified
+    'name'.  Throw a 'ResponseError' with 'INVALID_PARAMS' if it isn't an
+    instance of the specified 'types'.
+    """
+    if not isinstance(value, types):
+        raise ResponseError(INVALID_PARAMS, "Invalid params: %s" % name)
+
+    return value
+
+def getParam(container, name, types):
+    """
+    Return the member with the specified 'name' of the specified 'container'
+    of request params.  Throw a 'ResponseError' with 'INVALID_PARAMS' if
+    'container' isn't a dictionary, or if the member is missing or isn't an
+    instance of the specified 'types'.
+    """
+    if not isinstance(container, dict) or name not in container:
+        raise ResponseError(INVALID_PARAMS, "Missing params: %s" % name)
+
+    return checkParam(container[name], types, name)
+
+def checkPosition(position, name):
+    """
+    Return the specified LSP 'position' of the request param with the
+    specified 'name'.  Throw a 'ResponseError' with 'INVALID_PARAMS' if it
+    isn't a dictionary of non-negative integer 'line' and 'character'.
+    """
+    checkParam(position, dict, name)
+    for member in ("line", "character"):
+        if getParam(position, member, int) < 0:
+            raise ResponseError(INVALID_PARAMS, "Invalid params: %s" % name)
+
+    return position
+
+def getRange(container, name):
+    """
+    Return the '(start, end)' positions of the LSP range with the specified
+    'name' in the specified 'container' of request params.  Throw a
+    'ResponseError' with 'INVALID_PARAMS' if it isn't a valid range.
+    """
+    lspRange = getParam(container, name, dict)
+    start = checkPosition(lspRange.get("start"), name)
+    end = checkPosition(lspRange.get("end"), name)
+
+    if (start["line"], start["character"]) > (end["line"], end["character"]):
+        raise ResponseError(INVALID_PARAMS, "Invalid params: %s" % name)
+
+    return start, end
+
+class Document(object):
+    """
+    The lines of an open text document.
+    """
+
+    def __init__(self, text, version=None):
+        """
+        Create a document with the specified 'text' and the optionally
+        specified 'version'.
+        """
+        self.d_lines = text.split("\n")
+        self.d_version = version
+
+    def lines(self):
+        """
+        Return the list of lines of this document, which must not be
+        modified.
+        """
+        return self.d_lines
+
+    def text(self):
+        """
+        Return the text of this document.
+        """
+        return "\n".join(self.d_lines)
+
+    def position(self, position):
+        """
+        Return the '(row, index)' tuple of the specified LSP 'position' in
+        this document, clamped to the document.
+        """
+        row = position["line"]
+        if row >= len(self.d_lines):
+            row = len(self.d_lines) - 1
+            return (row, len(self.d_lines[row]))
+
+        return (row, utf16Index(self.d_lines[row], position["character"]))
+
+    def applyChange(self, change, version=None):
+        """
+        Apply the specified LSP 'TextDocumentContentChangeEvent' 'change' to
+        this document, replacing the whole text if the change has no 'range',
+        and set the version to the optionally specified 'version'.  Only the
+        lines within the range are rebuilt.
+        """
+        if version is not None:
+            self.d_version = version
+
+        if "range" not in change:
+            self.d_lines = change["text"].split("\n")
+            return
+
+        startRow, startIndex = self.position(change["range"]["start"])
+        endRow, endIndex = self.position(change["range"]["end"])
+
+        text = self.d_lines[startRow][:startIndex] + change["text"] + \
+               self.d_lines[endRow][endIndex:]
+        self.d_lines[startRow:endRow + 1] = text.split("\n")
+
+    def textEdit(self, start, end, lines):
+        """
+        Return the LSP 'TextEdit' replacing the rows from the specified
+        'start' to the specified 'end' (inclusive) with the specified
+        'lines'.
+        """
+        pos = lambda row, character: {"line": row, "character": character}
+
+        newText = "\n".join(lines)
+        if end + 1 < len(self.d_lines):
+            return {"range": {"start": pos(start, 0), "end": pos(end + 1, 0)},
+                    "newText": newText + "\n"}
+
+        return {"range": {"start": pos(start, 0),
+                          "end": pos(end, utf16Length(self.d_lines[end]))},
+                "newText": newText}
+
+class Server(object):
+    """
+    The state of the language server: the open documents and the cache of
+    formatted blocks.
+    """
+
+    def __init__(self, cache=None):
+        """
+        Create a server caching the formatted blocks in memory and in the
+        optionally specified 'cache'.
+        """
+        self.d_cache = bdeformatcache.MemoryCache(backingCache=cache)
+        self.d_documents = {}
+        self.d_nextRequestId = 1
+        self.d_isShutdown = False
+        self.d_isExited = False
+
+        self.d_methods = {
+            "initialize": self._initialize,
+            "initialized": lambda params: None,
+            "shutdown": self._shutdown,
+            "exit": self._exit,
+            "textDocument/didOpen": self._didOpen,
+            "textDocument/didChange": self._didChange,
+            "textDocument/didClose": self._didClose,
+            "textDocument/formatting": self._formatting,
+            "textDocument/rangeFormatting": self._rangeFormatting,
+            "workspace/executeCommand": self._executeCommand,
+        }
+
+        self.d_outgoing = []
+            # Requests to send to the client after the current response
+
+    def isExited(self):
+        """
+        Return 'True' if the client sent 'exit'.
+        """
+        return self.d_isExited
+
+    def exitCode(self):
+        """
+        Return the exit code of the server, which is 0 if the client sent
+        'shutdown' before 'exit', and 1 otherwise.
+        """
+        return 0 if self.d_isShutdown else 1
+
+    def document(self, uri):
+        """
+        Return the open 'Document' with the specified 'uri'.  Throw a
+        'ResponseError' if there is none.
+        """
+        checkParam(uri, STRING_TYPES, "uri")
+        document = self.d_documents.get(uri)
+        if document is None:
+            raise ResponseError(INVALID_PARAMS, "Unknown document: %s" % uri)
+
+        return document
+
+    def handle(self, message):
+        """
+        Handle the specified JSON-RPC 'message' dictionary and return the list
+        of messages to send back, which is empty for notifications and for
+        responses from the client.
+        """
+        if isinstance(message, dict) and "method" not in message \
+                                     and "id" in message:
+            # A response to one of our requests
+            return []
+
+        if not isinstance(message, dict) or \
+                        not isinstance(message.get("method"), STRING_TYPES):
+            return [{"jsonrpc": "2.0",
+                     "id": None,
+                     "error": {"code": INVALID_REQUEST,
+                               "message": "Invalid request"}}]
+
+        isRequest = "id" in message
+        method = self.d_methods.get(message["method"])
+        response = {"jsonrpc": "2.0", "id": message.get("id")}
+        try:
+            if method is None:
+                raise ResponseError(METHOD_NOT_FOUND,
+                                    "Unknown method: %s" % message["method"])
+
+            response["result"] = method(message.get("params") or {})
+        except ResponseError as e:
+            response["error"] = {"code": e.code, "message": str(e)}
+        except ValueError as e:
+            response["error"] = {"code": REQUEST_FAILED, "message": str(e)}
+        except Exception as e:
+            # The params were validated, so this is a bug of the server
+            response["error"] = {"code": INTERNAL_ERROR,
+                                 "message": "Internal error: %r" % e}
+
+        outgoing = self.d_outgoing
+        self.d_outgoing = []
+        if not isRequest:
+            # Errors in notifications can't be reported
+            return outgoing
+
+        return [response] + outgoing
+
+    def _initialize(self, params):
+        return {
+            "capabilities": {
+                "textDocumentSync": {
+                    "openClose": True,
+                    "change": 2, # Incremental
+                },
+                "documentFormattingProvider": True,
+                "documentRangeFormattingProvider": True,
+                "executeCommandProvider": {
+                    "commands": [FORMAT_BLOCK_COMMAND],
+                },
+            },
+            "serverInfo": {"name": "bdeformat"},
+        }
+
+    def _shutdown(self, params):
+        self.d_isShutdown = True
+        return None
+
+    def _exit(self, params):
+        self.d_isExited = True
+
+    def _didOpen(self, params):
+        textDocument = getParam(params, "textDocument", dict)
+        uri = getParam(textDocument, "uri", STRING_TYPES)
+        text = getParam(textDocument, "text", STRING_TYPES)
+        self.d_documents[uri] = Document(text, textDocument.get("version"))
+
+    def _didChange(self, params):
+        textDocument = getParam(params, "textDocument", dict)
+        document = self.document(getParam(textDocument, "uri", STRING_TYPES))
+        changes = getParam(params, "contentChanges", list)
+
+        # Check every change before applying any of them
+        for change in changes:
+            getParam(change, "text", STRING_TYPES)
+            if "range" in change:
+                getRange(change, "range")
+
+        for change in changes:
+            document.applyChange(change, textDocument.get("version"))
+
+    def _didClose(self, params):
+        textDocument = getParam(params, "textDocument", dict)
+        self.d_documents.pop(getParam(textDocument, "uri", STRING_TYPES),
+                             None)
+
+    def _formatRanges(self, document, ranges):
+        """
+        Return the list of 'TextEdit's formatting the DATA sections of the
+        specified 'document' intersecting the specified 'ranges'.
+        """
+        edits = bdeformatutil.formatBdeRanges(document.lines(),
+                                              ranges,
+                                              self.d_cache)
+        return [document.textEdit(start, end, lines)
+                for (start, end), lines in edits]
+
+    def _textDocument(self, params):
+        """
+        Return the open 'Document' identified by the 'textDocument' member
+        of the specified request 'params'.
+        """
+        textDocument = getParam(params, "textDocument", dict)
+        return self.document(getParam(textDocument, "uri", STRING_TYPES))
+
+    def _formatting(self, params):
+        document = self._textDocument(params)
+        return self._formatRanges(document, [(0, len(document.lines()) - 1)])
+
+    def _rangeFormatting(self, params):
+        document = self._textDocument(params)
+        start, end = getRange(params, "range")
+
+        endRow = end["line"]
+        if end["character"] == 0 and endRow > start["line"]:
+            # The range ends at the end of the previous line
+            endRow -= 1
+
+        return self._formatRanges(document, [(start["line"], endRow)])
+
+    def _executeCommand(self, params):
+        command = getParam(params, "command", STRING_TYPES)
+        if command != FORMAT_BLOCK_COMMAND:
+            raise ResponseError(INVALID_PARAMS,
+                                "Unknown command: %s" % command)
+
+        arguments = getParam(params, "arguments", list)
+        if len(arguments) != 2:
+            raise ResponseError(INVALID_PARAMS, "Invalid params: arguments")
+
+        uri, position = arguments
+        document = self.document(uri)
+        row, col = document.position(checkPosition(position, "arguments"))
+
+        lineSource = linesource.ListLineSource(document.lines())
+        (start, end), lines = bdeformatutil.formatBde(lineSource,
+                                                      row,
+                                                      col,
+                                                      self.d_cache)
+        lines = "\n".join(lines).split("\n")
+        if lines == document.lines()[start:end + 1]:
+            return []
+
+        edits = [document.textEdit(start, end, lines)]
+        self.d_outgoing.append({"jsonrpc": "2.0",
+                                "id": "bdeformat-%d" % self.d_nextRequestId,
+                                "method": "workspace/applyEdit",
+                                "params": {"label": "BDE format block",
+                                           "edit": {"changes": {uri: edits}}}})
+        self.d_nextRequestId += 1
+        return edits
+
+def readMessage(stream):
+    """
+    Return the content of the next message read from the specified binary
+    'stream', which is framed by a 'Content-Length' header, as a string, or
+    'None' at the end of the stream.
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+
+            continue
+
+        name, _, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+
+    return stream.read(length).decode("utf-8")
+
+def writeMessage(stream, message):
+    """
+    Write the specified 'message' dictionary to the specified binary 'stream'
+    as JSON framed by a 'Content-Length' header.
+    """
+    body = json.dumps(message).encode("utf-8")
+    stream.write(("Content-Length: %d\r\n\r\n" % len(body)).encode("ascii"))
+    stream.write(body)
+    stream.flush()
+
+def serve(server, inStream, outStream):
+    """
+    Serve the messages read from the specified binary 'inStream' with the
+    specified 'server', writing the responses to the specified binary
+    'outStream', until the client sends 'exit' or 'inStream' ends.  Messages
+    are handled in order.
+    """
+    while not server.isExited():
+        content = readMessage(inStream)
+        if content is None:
+            break
+
+        try:
+            message = json.loads(content)
+        except ValueError as e:
+            writeMessage(outStream, {"jsonrpc": "2.0",
+                                     "id": None,
+                                     "error": {"code": PARSE_ERROR,
+                                               "message": str(e)}})
+            continue
+
+        for response in server.handle(message):
+            writeMessage(outStream, response)
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                 description="Serve BDE formatting with the Language Server "
+                             "Protocol on stdin and stdout")
+    parser.add_argument("--cache-dir",
+                        help="directory of a persistent cache of formatted "
+                             "blocks (default: $%s)" %
+                                                  bdeformatcache.CACHE_DIR_ENV)
+    args = parser.parse_args(argv)
+
+    inStream = getattr(sys.stdin, "buffer", sys.stdin)
+    outStream = getattr(sys.stdout, "buffer", sys.stdout)
+
+    cache = bdeformatcache.openCache(args.cache_dir)
+    server = Server(cache)
+    try:
+        serve(server, inStream, outStream)
+    finally:
+        if cache:
+            cache.close()
+
+    return server.exitCode()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
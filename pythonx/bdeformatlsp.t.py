@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import subprocess
+import sys
+import unittest
+
+import bdeformatlsp
+from bdeformatlsp import Document, Server
+from testsources import DATA_END, DATA_START, LINES
+from testsources import FORMATTED_CTOR_LINES, FORMATTED_DATA_LINES
+
+URI = "file:///tmp/foo.h"
+
+def P(line, character):
+    return {"line": line, "character": character}
+
+def R(startLine, startChar, endLine, endChar):
+    return {"start": P(startLine, startChar), "end": P(endLine, endChar)}
+
+DATA_EDIT = {"range": R(DATA_START, 0, DATA_END + 1, 0),
+             "newText": "\n".join(FORMATTED_DATA_LINES) + "\n"}
+
+def request(id, method, **params):
+    return {"jsonrpc": "2.0", "id": id, "method": method, "params": params}
+
+def notification(method, **params):
+    return {"jsonrpc": "2.0", "method": method, "params": params}
+
+class TestDriver(unittest.TestCase):
+
+    def test_utf16(self):
+        A = self.assertEqual
+        line = u"a\U0001f600béc"
+
+        A(bdeformatlsp.utf16Length(line), 6)
+        A(bdeformatlsp.utf16Length(u""), 0)
+        A([bdeformatlsp.utf16Index(line, c) for c in range(8)],
+          [0, 1, 2, 2, 3, 4, 5, 5])
+
+    def test_applyChange(self):
+        document = Document(u"one\ntwo\nthree", 1)
+        A = self.assertEqual
+        C = lambda text, range=None: document.applyChange(
+                          dict(text=text, range=range) if range is not None
+                          else dict(text=text))
+
+        C(u"ONE", R(0, 0, 0, 3))
+        A(document.lines(), [u"ONE", u"two", u"three"])
+
+        C(u"w\nx\ny", R(1, 1, 1, 2))
+        A(document.lines(), [u"ONE", u"tw", u"x", u"yo", u"three"])
+
+        C(u"", R(0, 3, 3, 0))
+        A(document.lines(), [u"ONEyo", u"three"])
+
+        C(u"\nfour", R(1, 5, 9, 0))
+        A(document.lines(), [u"ONEyo", u"three", u"four"])
+
+        C(u"!", R(2, 99, 2, 99))
+        A(document.text(), u"ONEyo\nthree\nfour!")
+
+        C(u"a\U0001f600b")
+        C(u"X", R(0, 1, 0, 3))
+        A(document.lines(), [u"aXb"])
+
+        document.applyChange({"text": u""}, 7)
+        A(document.lines(), [u""])
+        A(document.d_version, 7)
+
+    def test_textEdit(self):
+        document = Document(u"a\nb\ncé")
+        A = self.assertEqual
+
+        A(document.textEdit(0, 1, [u"x"]),
+          {"range": R(0, 0, 2, 0), "newText": u"x\n"})
+        A(document.textEdit(1, 2, [u"x", u"y"]),
+          {"range": R(1, 0, 2, 2), "newText": u"x\ny"})
+
+    def test_server(self):
+        server = Server()
+        A = self.assertEqual
+        H = server.handle
+
+        ret = H(request(1, "initialize", capabilities={}))
+        A(len(ret), 1)
+        capabilities = ret[0]["result"]["capabilities"]
+        A(capabilities["textDocumentSync"]["change"], 2)
+        A(capabilities["executeCommandProvider"]["commands"],
+          [bdeformatlsp.FORMAT_BLOCK_COMMAND])
+        A(H(notification("initialized")), [])
+
+        # Start from a document with DATA already formatted, then break it
+        # with incremental changes
+        A(H(notification("textDocument/didOpen",
+                         textDocument={"uri": URI,
+                                       "languageId": "cpp",
+                                       "version": 1,
+                                       "text": "\n".join(
+                                               LINES[:DATA_START] +
+                                               FORMATTED_DATA_LINES +
+                                               LINES[DATA_END + 1:])})),
+          [])
+        A(H(request(2, "textDocument/formatting", textDocument={"uri": URI},
+                    options={"tabSize": 4, "insertSpaces": True})),
+          [{"jsonrpc": "2.0", "id": 2, "result": []}])
+
+        A(H(notification("textDocument/didChange",
+                         textDocument={"uri": URI, "version": 2},
+                         contentChanges=[
+                             {"range": R(2, 7, 2, 11), "text": " "},
+                             {"range": R(2, 12, 2, 14), "text": " "}])),
+          [])
+        A(server.document(URI).lines(), LINES)
+
+        A(H(request(3, "textDocument/formatting", textDocument={"uri": URI},
+                    options={"tabSize": 4, "insertSpaces": True})),
+          [{"jsonrpc": "2.0", "id": 3, "result": [DATA_EDIT]}])
+        A(H(request(4, "textDocument/rangeFormatting",
+                    textDocument={"uri": URI},
+                    range=R(0, 0, 2, 0),
+                    options={}))[0]["result"],
+          [DATA_EDIT])
+        A(H(request(5, "textDocument/rangeFormatting",
+                    textDocument={"uri": URI},
+                    range=R(5, 0, 7, 2),
+                    options={}))[0]["result"],
+          [])
+
+        # Formatting a block sends 'workspace/applyEdit'
+        ret = H(request(6, "workspace/executeCommand",
+                        command=bdeformatlsp.FORMAT_BLOCK_COMMAND,
+                        arguments=[URI, P(6, 20)]))
+        edit = {"range": R(6, 0, 7, 0),
+                "newText": "\n".join(FORMATTED_CTOR_LINES) + "\n"}
+        A(ret,
+          [{"jsonrpc": "2.0", "id": 6, "result": [edit]},
+           {"jsonrpc": "2.0",
+            "id": "bdeformat-1",
+            "method": "workspace/applyEdit",
+            "params": {"label": "BDE format block",
+                       "edit": {"changes": {URI: [edit]}}}}])
+        A(H({"jsonrpc": "2.0", "id": "bdeformat-1",
+             "result": {"applied": True}}),
+          [])
+
+        # Errors
+        E = lambda message: H(message)[0]["error"]["code"]
+        A(E(request(7, "workspace/executeCommand",
+                    command=bdeformatlsp.FORMAT_BLOCK_COMMAND,
+                    arguments=[URI, P(0, 0)])),
+          bdeformatlsp.REQUEST_FAILED)
+        A(E(request(8, "workspace/executeCommand", command="bogus",
+                    arguments=[])),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E(request(9, "textDocument/formatting",
+                    textDocument={"uri": "file:///missing.h"})),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E(request(10, "textDocument/formatting")),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E(request(11, "textDocument/bogus")),
+          bdeformatlsp.METHOD_NOT_FOUND)
+        A(E({"jsonrpc": "2.0", "params": {}}), bdeformatlsp.INVALID_REQUEST)
+        A(E({"jsonrpc": "2.0", "id": 14, "method": ["shutdown"]}),
+          bdeformatlsp.INVALID_REQUEST)
+        A(E(request(15, "workspace/executeCommand",
+                    command=bdeformatlsp.FORMAT_BLOCK_COMMAND,
+                    arguments=[URI, P(-1, 0)])),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E(request(16, "workspace/executeCommand",
+                    command=bdeformatlsp.FORMAT_BLOCK_COMMAND,
+                    arguments=[URI])),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E(request(17, "textDocument/rangeFormatting",
+                    textDocument={"uri": URI},
+                    range=R(2, 0, 1, 0))),
+          bdeformatlsp.INVALID_PARAMS)
+        A(E({"jsonrpc": "2.0", "id": 18, "method": "textDocument/formatting",
+             "params": [URI]}),
+          bdeformatlsp.INVALID_PARAMS)
+
+        # Invalid changes are rejected without applying any of them
+        A(E(request(19, "textDocument/didChange",
+                    textDocument={"uri": URI, "version": 3},
+                    contentChanges=[{"range": R(0, 0, 0, 0), "text": "x"},
+                                    {"range": R(0, 0, 0, 0)}])),
+          bdeformatlsp.INVALID_PARAMS)
+        A(server.document(URI).lines()[0], LINES[0])
+        A(H(notification("textDocument/bogus")), [])
+
+        A(H(notification("textDocument/didClose", textDocument={"uri": URI})),
+          [])
+        A(E(request(12, "textDocument/formatting", textDocument={"uri": URI})),
+          bdeformatlsp.INVALID_PARAMS)
+
+        A(H(request(13, "shutdown")),
+          [{"jsonrpc": "2.0", "id": 13, "result": None}])
+        A(server.isExited(), False)
+        A(H(notification("exit")), [])
+        A(server.isExited(), True)
+        A(server.exitCode(), 0)
+
+    def test_internalError(self):
+        server = Server()
+        server.handle(notification("textDocument/didOpen",
+                                   textDocument={"uri": URI,
+                                                 "text": "\n".join(LINES)}))
+        def formatRanges(document, ranges):
+            raise IndexError("bug")
+        server._formatRanges = formatRanges
+
+        error = server.handle(request(1,
+                                      "textDocument/formatting",
+                                      textDocument={"uri": URI}))[0]["error"]
+        self.assertEqual(error["code"], bdeformatlsp.INTERNAL_ERROR)
+        self.assertTrue("bug" in error["message"])
+
+    def test_framing(self):
+        stream = io.BytesIO()
+        bdeformatlsp.writeMessage(stream, {"a": u"é"})
+        bdeformatlsp.writeMessage(stream, {"b": 1})
+        stream.seek(0)
+
+        self.assertEqual(json.loads(bdeformatlsp.readMessage(stream)),
+                         {"a": u"é"})
+        self.assertEqual(json.loads(bdeformatlsp.readMessage(stream)),
+                         {"b": 1})
+        self.assertEqual(bdeformatlsp.readMessage(stream), None)
+
+    def test_stdio(self):
+        messages = [
+            request(1, "initialize", capabilities={}),
+            notification("initialized"),
+            notification("textDocument/didOpen",
+                         textDocument={"uri": URI,
+                                       "languageId": "cpp",
+                                       "version": 1,
+                                       "text": "\n".join(LINES)})]
+        messages += [request(i, "textDocument/formatting",
+                             textDocument={"uri": URI},
+                             options={})
+                     for i in range(2, 12)]
+        messages += [request(12, "shutdown"), notification("exit")]
+
+        stream = io.BytesIO()
+        for message in messages:
+            bdeformatlsp.writeMessage(stream, message)
+        stream.write(b"Content-Length: 8\r\n\r\nnot json")
+
+        process = subprocess.Popen([sys.executable, "bdeformatlsp.py"],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        out, _ = process.communicate(stream.getvalue())
+        self.assertEqual(process.returncode, 0)
+
+        responses = []
+        stream = io.BytesIO(out)
+        while True:
+            content = bdeformatlsp.readMessage(stream)
+            if content is None:
+                break
+            responses.append(json.loads(content))
+
+        # The server stops reading at 'exit'
+        self.assertEqual([r["id"] for r in responses], list(range(1, 13)))
+        self.assertEqual([r["result"] for r in responses[1:11]],
+                         [[DATA_EDIT]] * 10)
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+"""
+bdeformatmicrobench.py: Micro-benchmarks of the formatting and parsing helpers
+
+This module defines a suite of micro-benchmarks timing, for inputs of 10 to
+10,000 elements, the helpers of 'parseutil' and 'bdeformatutil' that most of
+the formatting time is spent in, so that the time per element of each size
+shows how they scale.  Each case is warmed up, then the number of calls per
+sample is calibrated so that a sample takes at least 'MIN_SAMPLE_SECONDS',
+and the best and median time per call of the samples are reported.
+
+It can be executed on the command line to run the suite, save its results as
+a baseline, and compare them against a baseline saved before:
+
+    bdeformatmicrobench.py [--filter <text>] [--sizes <n>,...] [--repeat <n>]
+                           [--save <file>] [--compare <file>]
+                           [--threshold <fraction>]
+
+With '--compare', the cases whose best time per call is slower than in the
+baseline by more than '--threshold' are reported as regressions, and so are
+the cases of the baseline that were selected by '--filter' and '--sizes' but
+skipped, and the script fails if there are any.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+import bdeformatutil
+import parseutil
+
+RESULTS_VERSION = 1
+    # Version of the layout of the JSON results
+
+SIZES = (10, 100, 1000, 10000)
+    # Default numbers of elements of the inputs of each case
+
+WARMUP_SECONDS = 0.05
+    # Time spent calling a case before calibrating it
+
+MIN_SAMPLE_SECONDS = 0.02
+    # Minimum duration of a sample, which is reached by calling the case
+    # repeatedly
+
+DEFAULT_REPEAT = 5
+    # Default number of samples taken of each case
+
+DEFAULT_THRESHOLD = 0.25
+    # Default fraction by which a case can be slower than its baseline before
+    # it's reported as a regression
+
+MAX_CALL_SECONDS = 2.0
+    # Time per call of a case, estimated from the time of the previous size
+    # assuming it scales linearly, above which a size is skipped, along with
+    # the larger ones, as measuring it would take too long
+
+s_parsedElements = {}
+    # Map from size to the result of '_parsedElements', which is shared by
+    # several cases
+
+def _elementLines(size):
+    """
+    Return the lines of a parameter list of the specified 'size' elements,
+    with a trailing comment after each, the last one followed by ');'.
+    """
+    types = ("int", "const bsl::string&", "bsl::vector<bsl::pair<int, int> >",
+             "bslma::Allocator", "const char", "double")
+    ret = []
+    for i in range(size):
+        typeName = types[i % len(types)]
+        stars = "*" if typeName in ("bslma::Allocator", "const char") else ""
+        ret.append("%s %sargument%d%s  // the argument number %d of the "
+                   "function being declared" % (typeName,
+                                                stars,
+                                                i,
+                                                "," if i + 1 < size else ");",
+                                                i))
+
+    return ret
+
+def _parsedElements(size):
+    """
+    Return the 'parseutil.parseElement' tuples of the parameter list of the
+    specified 'size' elements.
+    """
+    if size not in s_parsedElements:
+        text = "(" + "\n".join(_elementLines(size))
+        elements = parseutil.determineElements(text, (0, text.rfind(")")))
+        s_parsedElements[size] = [parseutil.parseElement(e)
+                                  for e in elements]
+
+    return s_parsedElements[size]
+
+def _findSkippingGroupsCase(size):
+    line = "(" + ", ".join("bsl::map<int, bsl::vector<char> > a%d[4]" % i
+                           for i in range(size)) + ") x"
+    return lambda: parseutil.findSkippingGroups(line, 0, ";", 1)
+
+def _determineElementsCase(size):
+    text = "(" + "\n".join(_elementLines(size))
+    openClose = (0, text.rfind(")"))
+    return lambda: parseutil.determineElements(text, openClose)
+
+def _parseElementCase(size):
+    text = "(" + "\n".join(_elementLines(size))
+    elements = parseutil.determineElements(text, (0, text.rfind(")")))
+    return lambda: [parseutil.parseElement(e) for e in elements]
+
+def _alignElementPartsCase(size):
+    parsed = _parsedElements(size)
+    return lambda: bdeformatutil.alignElementParts(parsed)
+
+def _writeBdeGroupMultilineCase(size):
+    parsed = _parsedElements(size)
+    return lambda: bdeformatutil.writeBdeGroupMultiline(parsed,
+                                                        79,
+                                                        "void foo(",
+                                                        ");")
+
+def _writeCommentsCase(size):
+    parsed = _parsedElements(size)
+    lines, namePos = bdeformatutil.writeBdeGroupMultiline(parsed,
+                                                          79,
+                                                          "void foo(",
+                                                          ");")
+    return lambda: bdeformatutil.writeComments(lines,
+                                               30,
+                                               79 - namePos - 2,
+                                               79,
+                                               False)
+
+def _splitCommentIntoLinesCase(size):
+    comment = " ".join("word%d" % i for i in range(size))
+    return lambda: bdeformatutil.splitCommentIntoLines(comment, 40)
+
+def _parseMembersCase(size):
+    decl = "\n".join("    bsl::vector<int>  *d_member%d_p;  // member %d\n" %
+                                                                        (i, i)
+                     for i in range(size))
+    return lambda: list(parseutil.parseMembers(decl))
+
+def _parseFuncDeclarationsCase(size):
+    decl = "\n".join("    int function%d(const bsl::string& name,\n"
+                     "                  int                 value) const;\n"
+                     "        // Return the function number %d.\n" % (i, i)
+                     for i in range(size))
+    return lambda: parseutil.parseFuncDeclarations(decl)
+
+CASES = (
+    ("findSkippingGroups",     _findSkippingGroupsCase),
+    ("determineElements",      _determineElementsCase),
+    ("parseElement",           _parseElementCase),
+    ("alignElementParts",      _alignElementPartsCase),
+    ("writeBdeGroupMultiline", _writeBdeGroupMultilineCase),
+    ("writeComments",          _writeCommentsCase),
+    ("splitCommentIntoLines",  _splitCommentIntoLinesCase),
+    ("parseMembers",           _parseMembersCase),
+    ("parseFuncDeclarations",  _parseFuncDeclarationsCase),
+)
+    # Pairs of the name of each case and the function returning the function
+    # to time for inputs of a given number of elements
+
+def caseKey(name, size):
+    """
+    Return the key of the results of the case of the specified 'name' for
+    inputs of the specified 'size'.
+    """
+    return "%s/%d" % (name, size)
+
+def measure(function, repeat=DEFAULT_REPEAT):
+    """
+    Return the '{"loops", "best", "median"}' timing of the specified
+    'function' after warming it up: the number of calls per sample, and the
+    best and median seconds per call of the optionally specified 'repeat'
+    samples.
+    """
+    timer = timeit.Timer(function)
+
+    # Warm up
+    start = timeit.default_timer()
+    while timeit.default_timer() - start < WARMUP_SECONDS:
+        function()
+
+    # Calibrate
+    loops = 1
+    while timer.timeit(loops) < MIN_SAMPLE_SECONDS:
+        loops *= 2
+
+    samples = sorted(seconds / loops for seconds in timer.repeat(repeat,
+                                                                 loops))
+    return {"loops": loops,
+            "best": samples[0],
+            "median": samples[len(samples) // 2]}
+
+def runSuite(sizes=SIZES, repeat=DEFAULT_REPEAT, nameFilter=None):
+    """
+    Return a map from the 'caseKey' of each case for each of the optionally
+    specified 'sizes' to its 'measure' result over the optionally specified
+    'repeat' samples, only running the cases whose name contains the
+    optionally specified 'nameFilter'.  The sizes of a case estimated to
+    take more than 'MAX_CALL_SECONDS' per call are skipped.
+    """
+    ret = {}
+    for name, makeCase in CASES:
+        if nameFilter and nameFilter not in name:
+            continue
+
+        previous = None
+        for size in sorted(sizes):
+            if previous is not None and \
+               previous[1] * size / previous[0] > MAX_CALL_SECONDS:
+                break
+
+            result = measure(makeCase(size), repeat)
+            ret[caseKey(name, size)] = result
+            previous = (size, result["best"])
+
+    return ret
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return the list of '(key, baselineBest, best, isRegression)' tuples of
+    the cases, ordered by key, in the specified 'baseline' map returned by
+    'runSuite', where 'isRegression' is 'True' if the best time per call of
+    the case in the specified 'results' map is slower than in 'baseline' by
+    more than the optionally specified 'threshold' fraction.  The cases
+    missing from 'results', which were skipped, have a 'best' of 'None' and
+    are regressions.
+    """
+    ret = []
+    for key in sorted(baseline):
+        baselineBest = baseline[key]["best"]
+        if key not in results:
+            ret.append((key, baselineBest, None, True))
+            continue
+
+        best = results[key]["best"]
+        ret.append((key,
+                    baselineBest,
+                    best,
+                    best > baselineBest * (1 + threshold)))
+
+    return ret
+
+def loadResults(fileName):
+    """
+    Return the results saved in the specified 'fileName'.  Throw a
+    'ValueError' if the file isn't a results file of this version.
+    """
+    with open(fileName) as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or data.get("version") != RESULTS_VERSION:
+        raise ValueError("%s: not a version %d results file" %
+                                                   (fileName, RESULTS_VERSION))
+
+    return data["results"]
+
+def saveResults(results, fileName):
+    """
+    Save the specified 'results' to the specified 'fileName'.
+    """
+    with open(fileName, "w") as f:
+        json.dump({"version": RESULTS_VERSION,
+                   "python": platform.python_version(),
+                   "results": results},
+                  f,
+                  indent=4,
+                  sort_keys=True)
+        f.write("\n")
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                   description="Run the micro-benchmarks of the formatter")
+    parser.add_argument("--filter",
+                        help="only run the cases whose name contains FILTER")
+    parser.add_argument("--sizes",
+                        default=",".join(str(size) for size in SIZES),
+                        help="comma separated numbers of elements of the "
+                             "inputs (default: %s)" %
+                                         ",".join(str(size) for size in SIZES))
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=DEFAULT_REPEAT,
+                        help="number of samples of each case (default: %d)" %
+                                                                DEFAULT_REPEAT)
+    parser.add_argument("--save",
+                        metavar="FILE",
+                        help="save the results as a baseline to FILE")
+    parser.add_argument("--compare",
+                        metavar="FILE",
+                        help="compare the results with the baseline in FILE")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help="fraction by which a case can be slower than "
+                             "the baseline (default: %g)" % DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+    except ValueError:
+        sizes = []
+
+    if not sizes or min(sizes) < 1:
+        parser.error("invalid sizes: %s" % args.sizes)
+
+    baseline = None
+    if args.compare:
+        try:
+            baseline = loadResults(args.compare)
+        except (IOError, ValueError) as e:
+            parser.error(str(e))
+
+        # Only the cases selected are compared
+        selected = set(caseKey(name, size)
+                       for name, _ in CASES
+                       if not args.filter or args.filter in name
+                       for size in sizes)
+        baseline = dict((key, result) for key, result in baseline.items()
+                        if key in selected)
+
+    results = runSuite(sizes, args.repeat, args.filter)
+    if args.save:
+        saveResults(results, args.save)
+
+    if baseline is None:
+        for name, _ in CASES:
+            if args.filter and args.filter not in name:
+                continue
+
+            for size in sizes:
+                key = caseKey(name, size)
+                if key not in results:
+                    print("%-30s %17s" % (key, "skipped"))
+                    continue
+
+                best = results[key]["best"]
+                print("%-30s %14.3f us %10.1f ns/element" %
+                                         (key, best * 1e6, best * 1e9 / size))
+        return 0
+
+    ret = 0
+    for key, baselineBest, best, isRegression in compare(results,
+                                                         baseline,
+                                                         args.threshold):
+        if best is None:
+            print("%-30s %14.3f us %17s  REGRESSION" %
+                                       (key, baselineBest * 1e6, "skipped"))
+            ret = 1
+            continue
+
+        print("%-30s %14.3f us %14.3f us %+7.1f%%%s" %
+                                  (key,
+                                   baselineBest * 1e6,
+                                   best * 1e6,
+                                   (best / baselineBest - 1) * 100,
+                                   "  REGRESSION" if isRegression else ""))
+        if isRegression:
+            ret = 1
+
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
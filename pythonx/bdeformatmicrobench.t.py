@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import bdeformatmicrobench
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (bdeformatmicrobench.WARMUP_SECONDS,
+                      bdeformatmicrobench.MIN_SAMPLE_SECONDS,
+                      bdeformatmicrobench.MAX_CALL_SECONDS)
+        bdeformatmicrobench.WARMUP_SECONDS = 0
+        bdeformatmicrobench.MIN_SAMPLE_SECONDS = 0.001
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        (bdeformatmicrobench.WARMUP_SECONDS,
+         bdeformatmicrobench.MIN_SAMPLE_SECONDS,
+         bdeformatmicrobench.MAX_CALL_SECONDS) = self.saved
+        shutil.rmtree(self.dir)
+
+    def test_cases(self):
+        # Every case runs, and scales with the size of its input
+        for name, makeCase in bdeformatmicrobench.CASES:
+            small = makeCase(10)()
+            large = makeCase(20)()
+            if isinstance(small, list):
+                self.assertTrue(len(small) < len(large), name)
+
+    def test_measure(self):
+        calls = []
+        result = bdeformatmicrobench.measure(lambda: calls.append(1), 3)
+
+        self.assertEqual(sorted(result), ["best", "loops", "median"])
+        self.assertTrue(result["loops"] >= 1)
+        self.assertTrue(0 < result["best"] <= result["median"])
+        self.assertTrue(len(calls) >= 3 * result["loops"])
+
+    def test_runSuite(self):
+        F = bdeformatmicrobench.runSuite
+
+        results = F([100, 10], 1, "parseMembers")
+        self.assertEqual(sorted(results),
+                         ["parseMembers/10", "parseMembers/100"])
+
+        # Sizes estimated to be too slow are skipped
+        bdeformatmicrobench.MAX_CALL_SECONDS = 0
+        self.assertEqual(sorted(F([10, 100], 1, "parseMembers")),
+                         ["parseMembers/10"])
+
+    def test_compare(self):
+        baseline = {"a/10": {"best": 1.0},
+                    "b/10": {"best": 1.0},
+                    "c/10": {"best": 1.0}}
+        results = {"a/10": {"best": 1.1},
+                   "b/10": {"best": 1.5},
+                   "d/10": {"best": 9.0}}
+
+        # Skipped cases are regressions, new ones are ignored
+        self.assertEqual(bdeformatmicrobench.compare(results, baseline, 0.2),
+                         [("a/10", 1.0, 1.1, False),
+                          ("b/10", 1.0, 1.5, True),
+                          ("c/10", 1.0, None, True)])
+        self.assertEqual(bdeformatmicrobench.compare(results, baseline, 0.05),
+                         [("a/10", 1.0, 1.1, True),
+                          ("b/10", 1.0, 1.5, True),
+                          ("c/10", 1.0, None, True)])
+
+    def test_saveAndLoad(self):
+        fileName = os.path.join(self.dir, "baseline.json")
+        results = {"a/10": {"best": 1.0, "median": 2.0, "loops": 4}}
+
+        bdeformatmicrobench.saveResults(results, fileName)
+        self.assertEqual(bdeformatmicrobench.loadResults(fileName), results)
+
+        with open(fileName, "w") as f:
+            f.write('{"version": 0, "results": {}}')
+        self.assertRaises(ValueError,
+                          bdeformatmicrobench.loadResults,
+                          fileName)
+
+    def test_main(self):
+        baseline = os.path.join(self.dir, "baseline.json")
+        command = [sys.executable,
+                   "bdeformatmicrobench.py",
+                   "--filter",
+                   "splitComment",
+                   "--sizes",
+                   "10",
+                   "--repeat",
+                   "1"]
+
+        out = subprocess.check_output(command + ["--save", baseline],
+                                      universal_newlines=True)
+        self.assertTrue(out.startswith("splitCommentIntoLines/10 "))
+
+        # No regression against a much slower baseline
+        results = bdeformatmicrobench.loadResults(baseline)
+        results["splitCommentIntoLines/10"]["best"] *= 1000
+        bdeformatmicrobench.saveResults(results, baseline)
+        subprocess.check_output(command + ["--compare", baseline])
+
+        # Regression against a much faster one
+        results["splitCommentIntoLines/10"]["best"] /= 1e6
+        bdeformatmicrobench.saveResults(results, baseline)
+        process = subprocess.Popen(command + ["--compare", baseline],
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        out = process.communicate()[0]
+        self.assertEqual(process.returncode, 1)
+        self.assertTrue("REGRESSION" in out)
+
+        # Cases of the baseline that weren't run are only regressions if
+        # they were selected
+        results["splitCommentIntoLines/10"]["best"] *= 1e9
+        results["splitCommentIntoLines/20"] = {"best": 1.0}
+        results["parseMembers/10"] = {"best": 1.0}
+        bdeformatmicrobench.saveResults(results, baseline)
+        out = subprocess.check_output(command + ["--compare", baseline],
+                                      universal_newlines=True)
+        self.assertFalse("parseMembers" in out)
+
+        process = subprocess.Popen(command[:-3] + ["10,20",
+                                                   "--repeat",
+                                                   "1",
+                                                   "--compare",
+                                                   baseline],
+                                   stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        out = process.communicate()[0]
+        self.assertEqual(process.returncode, 0)
+
+        # Invalid sizes
+        for sizes in ["0", "10,-1", "x", ","]:
+            process = subprocess.Popen(command[:-3] + [sizes],
+                                       stderr=subprocess.PIPE)
+            process.communicate()
+            self.assertEqual(process.returncode, 2)
+
+if __name__ == "__main__":
+    unittest.main();
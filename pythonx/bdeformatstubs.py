@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+bdeformatstubs.py: Offline generation of stubs for the classes of headers
+
+This module can be executed on the command line to generate, for every BDE
+class defined in the specified headers, the code the snippets would generate
+in vim, as plain text with the default value of every tabstop:
+
+    accessors      declarations of accessors for the DATA members
+    initializers   a constructor initializer list of the DATA members
+    definitions    definition stubs of the functions declared in the
+                   CREATORS, MANIPULATORS and ACCESSORS sections, with
+                   initializer lists for the constructors
+
+The stubs of each header are printed, in order, or written to '--output-dir'
+as '<header name>.stubs', under the path of the header relative to the
+directory it was found in.  Headers whose stubs would be written to the same
+file are rejected.  Headers are processed in parallel by a pool of '--jobs'
+processes.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+import classstructure
+import sniputil
+import sourcefile
+from sectiontype import SectionType
+
+PARTS = ("accessors", "initializers", "definitions")
+    # Kinds of stubs that can be generated, in the order they are written
+
+STUBS_EXTENSION = ".stubs"
+    # Extension of the files written to '--output-dir'
+
+def classBanner(className):
+    """
+    Return the lines of the implementation file header of the specified
+    'className'.
+    """
+    title = "// class " + className
+    indent = " " * ((79 - len(title)) // 2)
+    rule = indent + "// " + "-" * (len(title) - 3)
+    return [rule, indent + title, rule]
+
+def findHeaders(paths):
+    """
+    Return the list of '(path, name)' tuples of the headers among the
+    specified 'paths', and under the directories among them, where 'name' is
+    the path of the header relative to the directory in 'paths' it was found
+    under, or its base name if it's in 'paths' itself.  Throw a 'ValueError'
+    if two headers have the same name.
+    """
+    ret = []
+    names = {}
+    for root in paths:
+        rootDir = os.path.abspath(root)
+        if not os.path.isdir(root):
+            rootDir = os.path.dirname(rootDir)
+
+        for path in sourcefile.findSourceFiles([root]):
+            if not path.endswith(".h"):
+                continue
+
+            name = os.path.relpath(path, rootDir)
+            if name in names:
+                if names[name] != path:
+                    raise ValueError("%s and %s have the same name: %s" %
+                                                    (names[name], path, name))
+
+                continue
+
+            names[name] = path
+            ret.append((path, name))
+
+    return ret
+
+def generateClassStubs(structure, className, parts=PARTS):
+    """
+    Return the list of lines of the optionally specified 'parts' of the stubs
+    of the specified 'className' defined in the specified 'structure', which
+    is a 'classstructure.ClassStructure'.
+    """
+    members = structure.dataMembers(className)
+
+    lines = classBanner(className)
+    if members and "accessors" in parts:
+        lines += ["", "// ACCESSOR DECLARATIONS"]
+        lines += sniputil.renderSnippet(sniputil.genDeclSnippet(
+                                       members,
+                                       sniputil.genAccessorDeclSnippet,
+                                       flat=True)).rstrip("\n").split("\n")
+
+    if members and "initializers" in parts:
+        lines += ["", "// INITIALIZER LIST"]
+        lines += sniputil.renderSnippet(
+                   sniputil.genCtorMemSnippet(members, ": ")).split("\n")
+
+    if "definitions" in parts:
+        sections = classstructure.DECLARATION_SECTIONS
+        decls = structure.extractClassSections(className, sections) or []
+        snipNum = 1
+        for section, sectionDecls in zip(sections, decls):
+            if not sectionDecls:
+                continue
+
+            snippet, snipNum = sniputil.genDefSnippet(className,
+                                                      sectionDecls,
+                                                      False,
+                                                      members,
+                                                      snipNum)
+            lines += ["", SectionType.getName(section)]
+            lines += sniputil.renderSnippet(snippet).rstrip("\n").split("\n")
+
+    return lines
+
+def generateStubs(path, parts=PARTS):
+    """
+    Return the text of the optionally specified 'parts' of the stubs of every
+    class defined in the file at the specified 'path', or 'None' if it
+    defines no classes.  Throw an 'IOError' if the file can't be read.
+    """
+    with open(path, "rb") as f:
+        lines = sourcefile.decodeSource(f.read()).split("\n")
+
+    structure = classstructure.ClassStructure(lines)
+    definitions = structure.classDefinitions()
+    if not definitions:
+        return None
+
+    ret = []
+    for className, _, _ in definitions:
+        if ret:
+            ret += ["", ""]
+
+        ret += generateClassStubs(structure, className, parts)
+
+    return "\n".join(ret) + "\n"
+
+def _generateStubs(args):
+    """
+    Return a '(path, stubs, error)' tuple of the result of 'generateStubs'
+    for the specified '(path, parts)' 'args', where 'error' describes why the
+    stubs couldn't be generated, if they couldn't.  This is the task run by
+    the worker processes.
+    """
+    path, parts = args
+    try:
+        return (path, generateStubs(path, parts), None)
+    except (IOError, OSError, ValueError) as e:
+        return (path, None, str(e))
+
+def generateAll(paths, parts=PARTS, jobs=1):
+    """
+    Generate the '(path, stubs, error)' tuples of 'generateStubs' for each of
+    the specified 'paths', in order, generating the optionally specified
+    'parts' in the optionally specified 'jobs' processes.
+    """
+    tasks = [(path, parts) for path in paths]
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _generateStubs(task)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap(_generateStubs, tasks):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+              description="Generate stubs for the classes of C++ headers")
+    parser.add_argument("paths",
+                        nargs="+",
+                        help="headers, or directories to search for headers")
+    parser.add_argument("--parts",
+                        default=",".join(PARTS),
+                        help="comma separated kinds of stubs to generate "
+                             "(default: %s)" % ",".join(PARTS))
+    parser.add_argument("--output-dir",
+                        help="directory to write '<header>%s' files to "
+                             "instead of printing the stubs" %
+                                                               STUBS_EXTENSION)
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of headers processed in parallel "
+                             "(default: the number of CPUs)")
+    args = parser.parse_args(argv)
+
+    parts = tuple(part for part in args.parts.split(",") if part)
+    for part in parts:
+        if part not in PARTS:
+            parser.error("unknown part: %s" % part)
+
+    try:
+        headers = findHeaders(args.paths)
+    except ValueError as e:
+        parser.error(str(e))
+
+    names = dict(headers)
+    paths = [path for path, _ in headers]
+
+    ret = 0
+    for path, stubs, error in generateAll(paths, parts, args.jobs):
+        if error is not None:
+            sys.stderr.write("%s: %s\n" % (path, error))
+            ret = 1
+            continue
+
+        if stubs is None:
+            continue
+
+        if args.output_dir:
+            outPath = os.path.join(args.output_dir,
+                                   names[path] + STUBS_EXTENSION)
+            outDir = os.path.dirname(outPath)
+            if not os.path.isdir(outDir):
+                os.makedirs(outDir)
+
+            with open(outPath, "wb") as f:
+                f.write(sourcefile.encodeSource(stubs))
+        else:
+            sys.stdout.write("// %s\n\n%s\n" % (path, stubs))
+
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
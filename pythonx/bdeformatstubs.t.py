@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import bdeformatstubs
+
+HEADER = """\
+                               // =========
+                               // class Foo
+                               // =========
+
+class Foo {
+    // DATA
+    int               d_a;
+    bslma::Allocator *d_allocator_p;
+
+  public:
+    // CREATORS
+    explicit Foo(int a, bslma::Allocator *basicAllocator = 0);
+
+    // ACCESSORS
+    int a() const;
+};
+
+                               // ==========
+                               // struct Bar
+                               // ==========
+
+struct Bar {
+    // MANIPULATORS
+    void reset();
+};
+"""
+
+FOO_STUBS = """\
+                                 // ---------
+                                 // class Foo
+                                 // ---------
+
+// ACCESSOR DECLARATIONS
+    const int& a() const;
+        // Return a reference providing const access to the 'a' property of
+        // this object.
+
+    const bslma::Allocator *& allocator() const;
+        // Return a reference providing const access to the 'allocator'
+        // property of this object.
+
+// INITIALIZER LIST
+: d_a()
+, d_allocator_p()
+
+// CREATORS
+Foo::Foo(int a, bslma::Allocator *basicAllocator)
+: d_a(a, basicAllocator)
+, d_allocator_p(bslma::Default::allocator(basicAllocator))
+{
+    // TODO
+}
+
+// ACCESSORS
+int Foo::a() const
+{
+    // TODO
+}"""
+
+BAR_STUBS = """\
+                                 // ---------
+                                 // class Bar
+                                 // ---------
+
+// MANIPULATORS
+void Bar::reset()
+{
+    // TODO
+}"""
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+
+        return path
+
+    def test_classBanner(self):
+        self.assertEqual(bdeformatstubs.classBanner("Example"),
+                         [" " * 31 + "// -------------",
+                          " " * 31 + "// class Example",
+                          " " * 31 + "// -------------"])
+
+    def test_generateStubs(self):
+        path = self.write("foo.h", HEADER)
+        A = self.assertEqual
+
+        A(bdeformatstubs.generateStubs(path),
+          FOO_STUBS + "\n\n\n" + BAR_STUBS + "\n")
+
+        A(bdeformatstubs.generateStubs(path, ("definitions",)),
+          "\n".join(FOO_STUBS.split("\n")[:4] + FOO_STUBS.split("\n")[17:]) +
+          "\n\n\n" + BAR_STUBS + "\n")
+
+        A(bdeformatstubs.generateStubs(self.write("empty.h", "int x;\n")),
+          None)
+        self.assertRaises(IOError,
+                          bdeformatstubs.generateStubs,
+                          os.path.join(self.dir, "missing.h"))
+
+    def test_generateAll(self):
+        paths = [self.write("foo%d.h" % i, HEADER.replace("Foo", "Foo%d" % i))
+                 for i in range(10)]
+        paths.append(os.path.join(self.dir, "missing.h"))
+
+        serial = list(bdeformatstubs.generateAll(paths))
+        parallel = list(bdeformatstubs.generateAll(paths, jobs=4))
+        self.assertEqual(serial, parallel)
+        self.assertEqual([r[0] for r in parallel], paths)
+        self.assertTrue("\nFoo3::Foo3(int a, bslma::Allocator " in
+                                                              parallel[3][1])
+        self.assertEqual(parallel[-1][1], None)
+        self.assertNotEqual(parallel[-1][2], None)
+
+    def test_findHeaders(self):
+        foo = self.write("foo.h", HEADER)
+        os.makedirs(os.path.join(self.dir, "sub"))
+        subFoo = self.write(os.path.join("sub", "foo.h"), HEADER)
+        self.write(os.path.join("sub", "foo.cpp"), HEADER)
+
+        A = self.assertEqual
+        A(bdeformatstubs.findHeaders([self.dir]),
+          [(foo, "foo.h"), (subFoo, os.path.join("sub", "foo.h"))])
+        A(bdeformatstubs.findHeaders([foo, self.dir]), [(foo, "foo.h")] +
+          [(subFoo, os.path.join("sub", "foo.h"))])
+        self.assertRaises(ValueError,
+                          bdeformatstubs.findHeaders,
+                          [subFoo, self.dir])
+
+    def test_main(self):
+        self.write("foo.h", HEADER)
+        self.write("foo.cpp", HEADER)
+        outDir = os.path.join(self.dir, "out")
+
+        subprocess.check_call([sys.executable,
+                               "bdeformatstubs.py",
+                               "--jobs",
+                               "2",
+                               "--output-dir",
+                               outDir,
+                               self.dir])
+        self.assertEqual(os.listdir(outDir), ["foo.h.stubs"])
+        with open(os.path.join(outDir, "foo.h.stubs")) as f:
+            self.assertEqual(f.read(),
+                             FOO_STUBS + "\n\n\n" + BAR_STUBS + "\n")
+
+        # Headers with the same name in different directories
+        os.makedirs(os.path.join(self.dir, "sub"))
+        self.write(os.path.join("sub", "foo.h"), HEADER)
+        subprocess.check_call([sys.executable,
+                               "bdeformatstubs.py",
+                               "--output-dir",
+                               outDir,
+                               self.dir])
+        self.assertTrue(os.path.isfile(os.path.join(outDir,
+                                                    "sub",
+                                                    "foo.h.stubs")))
+
+        process = subprocess.Popen([sys.executable,
+                                    "bdeformatstubs.py",
+                                    os.path.join(self.dir, "foo.h"),
+                                    os.path.join(self.dir, "sub")],
+                                   stderr=subprocess.PIPE)
+        process.communicate()
+        self.assertEqual(process.returncode, 2)
+
+        process = subprocess.Popen([sys.executable,
+                                    "bdeformatstubs.py",
+                                    "--parts",
+                                    "bogus",
+                                    self.dir],
+                                   stderr=subprocess.PIPE)
+        process.communicate()
+        self.assertEqual(process.returncode, 2)
+
+if __name__ == "__main__":
+    unittest.main();
@@ -31,11 +31,27 @@ initialization lists
 """
 
 import re
+import time
 from parseutil import *
 from functools import reduce
 
+import cancellation
+import profiling
 from sectiontype import SectionType
 
+FORMAT_VERSION = 1
+    # The version of the formatting rules implemented by this component.  This
+    # is part of the key of persistently cached formatting results, so it must
+    # be incremented by any change that alters the formatted output.
+
+MAX_SECTION_ROWS = 300
+    # The maximum number of rows searched for the boundaries of a block or
+    # section before giving up
+
+SCAN_CHUNK_ROWS = 16
+    # The number of rows read at once when searching for the boundaries of a
+    # block or section in a line source having a 'getRange' method
+
 def alignElementParts(parsedElements):
     """
     Align the parts of all the specified 'parsedElements' which is a list of
@@ -136,6 +152,9 @@ def writeBdeGroupMultiline(parsedElements, width, prefix, suffix):
     comment corresponding to this line, and <namePos> is the column where the
     names start in the lines
     """
+    profile = profiling.active()
+    if profile is not None:
+        started = time.time()
 
     writeAlignedElementsRet = writeAlignedElements(
                                              alignElementParts(parsedElements))
@@ -172,6 +191,9 @@ def writeBdeGroupMultiline(parsedElements, width, prefix, suffix):
         else:
             ret[-1] = (ret[-1][0] + suffix, ret[-1][1])
 
+    if profile is not None:
+        profile.addTime("align", time.time() - started)
+
     return (ret, writeAlignedElementsRet[1] + elemStartColumn)
 
 def splitCommentIntoLines(comment, maxWidth):
@@ -217,6 +239,9 @@ def writeComments(linesAndComments,
     empty line should be placed between each <line> and associated <comment>
     if any <line>, <comment> pair ends up spanning multiple lines
     """
+    profile = profiling.active()
+    if profile is not None:
+        started = time.time()
 
     # + 2 because there are 2 spaces before the comment starts
     maxContentWidth = reduce(max, [len(x[0]) for x in linesAndComments]) + 2
@@ -241,11 +266,16 @@ def writeComments(linesAndComments,
 
     best = []
     bestWidth = lineWidth
+    widthsTried = 0
     for commentWidth in possibleWidths:
+        cancellation.check()
+
         commentPos = lineWidth - commentWidth
         if commentWidth <= 3:
             continue
 
+        widthsTried += 1
+
         haveMultiline = maxCommentWidth + maxContentWidth > lineWidth
 
         result = []
@@ -284,9 +314,40 @@ def writeComments(linesAndComments,
     if len(best) == 0:
         best = [x[0] for x in linesAndComments]
 
+    if profile is not None:
+        profile.addTime("comments", time.time() - started)
+        profile.addCount("commentWidthsTried", widthsTried)
+
     return best
 
 
+def writeBdeGroup(parsedElements, prefix, suffix, width, minCommentWidth):
+    """
+    Return the list of lines of the group of the specified 'parsedElements'
+    following the specified 'prefix' and followed by the specified 'suffix',
+    written on one line if it fits in the specified 'width', and aligned on
+    multiple lines, with comments at least the specified 'minCommentWidth'
+    wide, otherwise.
+    """
+    oneLine = tryWriteBdeGroupOneLine(parsedElements,
+                                      width - len(prefix) - len(suffix))
+    if oneLine:
+        return [prefix + oneLine + suffix]
+
+    multilineRet = writeBdeGroupMultiline(parsedElements,
+                                          width,
+                                          prefix,
+                                          suffix)
+
+    namePos = multilineRet[1]
+    maxCommentWidth = width - namePos - 2
+
+    return writeComments(multilineRet[0],
+                         minCommentWidth,
+                         maxCommentWidth,
+                         width,
+                         False)
+
 def fixBdeBlock(text, pos, width, minCommentWidth):
     """
     Fix the bde block containing the specified 'pos' in the specified 'text'
@@ -294,8 +355,15 @@ def fixBdeBlock(text, pos, width, minCommentWidth):
     list of lines consisting of the fixed text, or 'None' if a block
     couldn't be found.
     """
+    profile = profiling.active()
+    if profile is not None:
+        started = time.time()
+
     openClose = findOpenClose(text, pos)
     if not openClose:
+        if profile is not None:
+            profile.addTime("parse", time.time() - started)
+
         return None
 
     # If the closing character is '>', and the char before it is '>', put a
@@ -313,6 +381,10 @@ def fixBdeBlock(text, pos, width, minCommentWidth):
     elements = [parseElement(e) for e in determineElements(text, openClose)]
     elements = fixParsedElements(elements);
 
+    if profile is not None:
+        profile.addTime("parse", time.time() - started)
+        profile.addCount("elementsParsed", len(elements))
+
     preLines = text[:openClose[0] + 1].splitlines()
     postLines = text[openClose[1] + 1:].splitlines()
 
@@ -322,23 +394,9 @@ def fixBdeBlock(text, pos, width, minCommentWidth):
     suffix = postLines[0] if postLines else ""
     postLines = postLines[1:]
 
-    oneLine = tryWriteBdeGroupOneLine(elements,
-                                      width - len(prefix) - len(suffix))
-    if oneLine:
-        return preLines + [prefix + oneLine + suffix] + postLines
-
-    multilineRet = writeBdeGroupMultiline(elements, width, prefix, suffix)
-
-    namePos = multilineRet[1]
-    maxCommentWidth = width - namePos - 2
-
-    ret = writeComments(multilineRet[0],
-                        minCommentWidth,
-                        maxCommentWidth,
-                        width,
-                        False)
-
-    return preLines + ret + postLines
+    return preLines + \
+           writeBdeGroup(elements, prefix, suffix, width, minCommentWidth) + \
+           postLines
 
 
 def fixBdeData(text, width, minCommentWidth):
@@ -348,9 +406,21 @@ def fixBdeData(text, width, minCommentWidth):
     consisting of the fixed text, or 'None' if there was a problem parsing the
     data definitions.
     """
+    profile = profiling.active()
+    if profile is not None:
+        started = time.time()
+
     openClose = (-1, len(text))
     elements = [parseElement(e) for e in determineElements(text, openClose)]
-    elements = fixParsedElements(elements);
+    if elements:
+        elements = fixParsedElements(elements);
+
+    if profile is not None:
+        profile.addTime("parse", time.time() - started)
+        profile.addCount("elementsParsed", len(elements))
+
+    if not elements:
+        return None
 
     prefix = " " * (len(text) - len(text.lstrip()))
     multilineRet = writeBdeGroupMultiline(elements, width, prefix, "")
@@ -369,21 +439,178 @@ def fixBdeData(text, width, minCommentWidth):
 
     return ret
 
-def formatBde(lineSource, row, col):
+def formatDeclaration(retType,
+                      qualifiedName,
+                      parsedArgs,
+                      suffix="",
+                      width=79,
+                      minCommentWidth=30):
+    """
+    Return the list of lines of the declaration of the function with the
+    specified 'retType' and 'qualifiedName', taking the specified
+    'parsedArgs', which is a list of tuples returned by 'parseElement', and
+    followed by the specified 'suffix' (such as 'const'), laid out as
+    'formatBde' would lay out the same declaration written on one line in
+    the optionally specified 'width', with comments at least the optionally
+    specified 'minCommentWidth' wide.  The arguments aren't parsed again, so
+    this is much faster than 'formatBde' for declarations that are already
+    parsed.
+    """
+    prefix = retType
+    if len(retType) > 0 and retType[-1] != "*":
+        prefix += " "
+
+    prefix += qualifiedName + "("
+    suffix = " " + suffix if len(suffix) > 0 else ""
+
+    if not parsedArgs:
+        return [prefix + ")" + suffix]
+
+    # Normalize the elements as parsing them from a single line would, ending
+    # them with the ',' and ')' separating them
+    endChars = [","] * (len(parsedArgs) - 1) + [")"]
+    elements = [(argType.strip(),
+                 argStars.replace(" ", ""),
+                 " ".join(argName.split()),
+                 value,
+                 endChar,
+                 comment)
+                for (argType, argStars, argName, value, _, comment), endChar
+                                                 in zip(parsedArgs, endChars)]
+    elements = fixParsedElements(elements)
+
+    return writeBdeGroup(elements, prefix, suffix, width, minCommentWidth)
+
+def formatDeclarations(declarations, width=79, minCommentWidth=30):
+    """
+    Return the list of the lists of lines returned by 'formatDeclaration' for
+    each of the specified 'declarations', which is a sequence of
+    '(retType, qualifiedName, parsedArgs, suffix)' tuples, such as the
+    declarations of a whole section, in the optionally specified 'width' with
+    comments at least the optionally specified 'minCommentWidth' wide.
+    """
+    ret = []
+    for retType, qualifiedName, parsedArgs, suffix in declarations:
+        cancellation.check()
+        ret.append(formatDeclaration(retType,
+                                     qualifiedName,
+                                     parsedArgs,
+                                     suffix,
+                                     width,
+                                     minCommentWidth))
+
+    return ret
+
+def formatBde(lineSource, row, col, cache=None, deadline=None, profile=None):
     """
     Using the specified 'lineSource', which takes an integer row argument and
     returns this row of text from the code being formatter, format the bde
     block/section around the specified 'col' of the specified 'row'.  Return a
     tuple ((start, end), lines) where '(start, end) is the range of lines
     (inclusive) to be replaced by the 'lines', which is a list of strings.
-    Throw a ValueError if there is a problem formatting.
+    See 'linesource' for line sources that read their rows in bulk.
+    If the optionally specified 'cache' (a 'bdeformatcache.FormatCache') is
+    given, look up the formatted block in it before formatting it.  Throw a
+    ValueError if there is a problem formatting, or a
+    'cancellation.DeadlineExceeded', which is a 'ValueError', if the
+    optionally specified 'cancellation.Deadline' 'deadline' expires first.
+    If the optionally specified 'profiling.Profile' 'profile' is given, add
+    the time spent in each phase and the work done to it.
     """
+    with cancellation.activate(deadline):
+        if profile is None:
+            return _formatBde(lineSource, row, col, cache, None)
+
+        with profiling.activate(profile):
+            return _formatBde(lineSource, row, col, cache, profile)
+
+def _formatBde(lineSource, row, col, cache, profile):
+    """
+    Implement 'formatBde' with the deadline and the specified 'profile', if
+    any, already active.
+    """
+    if hasattr(lineSource, "getRange"):
+        lineSource = _ScanWindow(lineSource)
+
+    if profile is None:
+        block = _findBlock(lineSource, row, col)
+    else:
+        def countingSource(row):
+            profile.addCount("rowsScanned", 1)
+            return lineSource(row)
+
+        started = time.time()
+        try:
+            block = _findBlock(countingSource, row, col)
+        finally:
+            profile.addTime("scan", time.time() - started)
+
+    startRow, endRow, text, col, sectionType = block
+    if sectionType == SectionType.DATA:
+        fix, args = fixBdeData, (text, 79, 40)
+    else:
+        fix, args = fixBdeBlock, (text, col, 79, 30)
+
+    fixedBlock = cache.call(fix, *args) if cache else fix(*args)
+
+    if not fixedBlock:
+        raise ValueError("Couldn't find BDE block")
+
+    return ((startRow, endRow), fixedBlock)
+
+class _ScanWindow(object):
+    """
+    A line source holding a contiguous window of the rows of a
+    'linesource.LineSource', which is extended by 'SCAN_CHUNK_ROWS' rows at a
+    time with 'getRange' in the direction of the rows requested, so that
+    searching for the boundaries of a block reads the source in bulk.
+    """
+
+    def __init__(self, lineSource):
+        """
+        Create a window on the specified 'lineSource', which has a
+        'getRange' method.
+        """
+        self.d_lineSource = lineSource
+        self.d_start = 0
+        self.d_rows = []
+
+    def __call__(self, row):
+        start = self.d_start
+        end = start + len(self.d_rows)
+        if not self.d_rows:
+            self.d_start = row
+            self.d_rows = self.d_lineSource.getRange(row,
+                                                     row + SCAN_CHUNK_ROWS)
+        elif row < start:
+            self.d_start = min(row, start - SCAN_CHUNK_ROWS)
+            self.d_rows = self.d_lineSource.getRange(self.d_start, start) + \
+                          self.d_rows
+        elif row >= end:
+            self.d_rows += self.d_lineSource.getRange(
+                                       end,
+                                       max(row + 1, end + SCAN_CHUNK_ROWS))
+
+        return self.d_rows[row - self.d_start]
+
+def _findBlock(lineSource, row, col):
+    """
+    Return a '(startRow, endRow, text, col, sectionType)' tuple describing
+    the block or section around the specified 'col' of the specified 'row'
+    read from the specified 'lineSource', where 'text' is the text of the
+    rows from 'startRow' to 'endRow' (inclusive), 'col' is the position in
+    'text' corresponding to the specified one, and 'sectionType' is the type
+    of the section, or 'None' if it's a block.  Throw a ValueError if the
+    block can't be found.
+    """
+    cancellation.check()
 
     startRow = endRow = row
     text = lineSource(startRow)
 
     def checkSectionSize(startRow, endRow):
-        if endRow - startRow >= 300:
+        cancellation.check()
+        if endRow - startRow >= MAX_SECTION_ROWS:
             raise ValueError("Can't find group/section")
 
     # Find start of group/section
@@ -395,10 +622,11 @@ def formatBde(lineSource, row, col):
         checkSectionSize(startRow, endRow)
 
         startRow -= 1
-        sectionType = SectionType.check(lineSource(startRow))
+        line = lineSource(startRow)
+        sectionType = SectionType.check(line)
         if sectionType == None:
-            text = lineSource(startRow) + "\n" + text
-            col += len(lineSource(startRow)) + 1
+            text = line + "\n" + text
+            col += len(line) + 1
         else:
             startRow += 1
 
@@ -412,19 +640,185 @@ def formatBde(lineSource, row, col):
     else:
         # We found the start of a section
         endRow += 1
-        while SectionType.check(lineSource(endRow)) == None:
-            text = text + "\n" + lineSource(endRow)
+        line = lineSource(endRow)
+        while SectionType.check(line) == None:
+            text = text + "\n" + line
             endRow += 1
             checkSectionSize(startRow, endRow)
+            line = lineSource(endRow)
 
         endRow -= 1
 
-    if sectionType == SectionType.DATA:
-        fixedBlock = fixBdeData(text, 79, 40)
-    else:
-        fixedBlock = fixBdeBlock(text, col, 79, 30)
+    return (startRow, endRow, text, col, sectionType)
 
-    if not fixedBlock:
-        raise ValueError("Couldn't find BDE block")
+def formatDataSection(rows, cache=None):
+    """
+    Return the specified 'rows' of the contents of a DATA section formatted as
+    'formatBde' would format them, or the unmodified 'rows' if they can't be
+    formatted or contain preprocessor directives, which can't be safely
+    reformatted without supervision.  If the optionally specified 'cache' is
+    given, look up the formatted section in it first.  Throw a
+    'cancellation.DeadlineExceeded' if the active deadline expires.  The
+    work done is added to the active 'profiling.Profile', if any.
+    """
+    for row in rows:
+        if row.lstrip().startswith("#"):
+            return rows
+
+    text = "\n".join(rows)
+    try:
+        fixed = cache.call(fixBdeData, text, 79, 40) if cache else \
+                fixBdeData(text, 79, 40)
+    except cancellation.DeadlineExceeded:
+        raise
+    except ValueError:
+        return rows
+
+    if not fixed:
+        return rows
+
+    # Formatted elements can span several lines
+    return "\n".join(fixed).split("\n")
+
+def _scanDataSections(lines, firstRow=0):
+    """
+    Generate '(row, rows, isData)' tuples splitting the specified iterable of
+    'lines', the first of which is at the optionally specified 'firstRow',
+    into consecutive runs of 'rows' starting at 'row'.  The contents of each
+    DATA section terminated by a section header within 'MAX_SECTION_ROWS'
+    rows form one run with 'isData' true; every other row is a run of its
+    own, except for the contents of sections that are too long or not
+    terminated, which are generated as one run.  Only the section being
+    scanned is held in memory.
+    """
+    section = None
+    for row, line in enumerate(lines, firstRow):
+        sectionType = SectionType.check(line)
+        if section is not None:
+            if sectionType is None:
+                section.append(line)
+                if len(section) < MAX_SECTION_ROWS:
+                    continue
 
-    return ((startRow, endRow), fixedBlock)
+                # Too long to be a DATA section.  Give up on it
+                yield (row - len(section) + 1, section, False)
+                section = None
+                continue
+
+            yield (row - len(section), section, True)
+            section = None
+
+        yield (row, [line], False)
+
+        if sectionType == SectionType.DATA:
+            section = []
+
+    if section:
+        # The section wasn't terminated, so leave it as it is
+        yield (row - len(section) + 1, section, False)
+
+def formatBdeLines(lines, cache=None, ranges=None, profile=None):
+    """
+    Generate the specified iterable of 'lines', which don't have line
+    terminators, with the contents of every DATA section formatted using
+    'formatDataSection' with the optionally specified 'cache'.  If the
+    optionally specified 'ranges' list of '(start, end)' (inclusive) rows is
+    given, only format the sections that intersect one of them, where a
+    section header is considered part of its section.  Only the section being
+    formatted is held in memory, and sections longer than 'MAX_SECTION_ROWS'
+    are left unmodified.  If the optionally specified 'profiling.Profile'
+    'profile' is given, add the time spent formatting the sections and the
+    work done to it.
+    """
+    def inRanges(start, end):
+        if ranges is None:
+            return True
+
+        for rangeStart, rangeEnd in ranges:
+            if rangeStart <= end and rangeEnd >= start:
+                return True
+
+        return False
+
+    for row, rows, isData in _scanDataSections(lines):
+        if isData and inRanges(row - 1, row + len(rows) - 1):
+            if profile is None:
+                rows = formatDataSection(rows, cache)
+            else:
+                # The profile can't stay active while this generator is
+                # suspended, as the caller might format other code meanwhile
+                with profiling.activate(profile):
+                    rows = formatDataSection(rows, cache)
+
+        for line in rows:
+            yield line
+
+def formatBdeRanges(lines,
+                    ranges,
+                    cache=None,
+                    deadline=None,
+                    profile=None):
+    """
+    Format the DATA sections in the specified 'lines', which is a sequence of
+    strings, that intersect any of the specified 'ranges' of '(start, end)'
+    (inclusive) rows using 'formatDataSection' with the optionally specified
+    'cache'.  Return a list of '((start, end), lines)' tuples, ordered by
+    row, where the inclusive range '(start, end)' of rows is to be replaced
+    by 'lines', with one entry for each section whose formatting changed.
+    Throw a 'cancellation.DeadlineExceeded' if the optionally specified
+    'cancellation.Deadline' 'deadline' expires first.  If the optionally
+    specified 'profiling.Profile' 'profile' is given, add the time spent in
+    each phase and the work done to it.
+    """
+    with cancellation.activate(deadline):
+        if profile is None:
+            return _formatBdeRanges(lines, ranges, cache, None)
+
+        with profiling.activate(profile):
+            return _formatBdeRanges(lines, ranges, cache, profile)
+
+def _formatBdeRanges(lines, ranges, cache, profile):
+    """
+    Implement 'formatBdeRanges' with the deadline and the specified
+    'profile', if any, already active.
+    """
+    if profile is not None:
+        started = time.time()
+
+    numRows = len(lines)
+    def rowsFrom(row):
+        while row < numRows:
+            yield lines[row]
+            row += 1
+
+    sections = {}
+    for start, end in ranges:
+        cancellation.check()
+        if start >= numRows or end < start:
+            continue
+
+        # Scan from the header of the section containing 'start'
+        row = max(start, 0)
+        while row > max(start - MAX_SECTION_ROWS, 0) and \
+              SectionType.check(lines[row]) is None:
+            row -= 1
+
+        for row, rows, isData in _scanDataSections(rowsFrom(row), row):
+            if row > end and not isData:
+                break
+
+            if isData and row + len(rows) > start:
+                sections[row] = rows
+
+    if profile is not None:
+        profile.addTime("scan", time.time() - started)
+
+    ret = []
+    for start in sorted(sections):
+        cancellation.check()
+        rows = sections[start]
+        fixed = formatDataSection(rows, cache)
+        if fixed != rows:
+            ret.append(((start, start + len(rows) - 1), fixed))
+
+    return ret
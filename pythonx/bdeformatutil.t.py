@@ -468,6 +468,141 @@ void *d_ptr_p;
 
           """)
 
+    def test_formatBdeLines(self):
+        def T(inS, outS = None):
+            inLines = inS.split("\n")[1:-1]
+            expected = outS.split("\n")[1:-1] if outS else inLines
+
+            ret = list(bdeformatutil.formatBdeLines(iter(inLines)))
+            if ret != expected:
+                print "BAD RETURN:"
+                print "\n".join(ret)
+
+            self.assertEqual(ret, expected)
+
+        T("""
+class Foo {
+    // DATA
+    int d_a; // first
+    double d_b;
+
+  public:
+    // DATA
+    int d_c;
+    // CREATORS
+    Foo();
+};
+""", """
+class Foo {
+    // DATA
+    int    d_a;  // first
+    double d_b;
+
+  public:
+    // DATA
+    int d_c;
+
+    // CREATORS
+    Foo();
+};
+""")
+
+        # Sections with preprocessor directives, empty sections and
+        # unterminated sections are left alone
+        T("""
+    // DATA
+#ifdef FOO
+    int d_a; // first
+#endif
+
+    // DATA
+
+    // DATA
+    int d_a; // first
+""")
+
+        # Sections that are too long are left alone
+        data = ["    int d_a;"] * bdeformatutil.MAX_SECTION_ROWS
+        lines = ["    // DATA"] + data + ["};"]
+        self.assertEqual(list(bdeformatutil.formatBdeLines(lines)), lines)
+
+    def test_formatBdeRanges(self):
+        lines = ["class Foo {",                 # 0
+                 "    // DATA",                 # 1
+                 "    int d_a; // first",       # 2
+                 "    double d_b;",             # 3
+                 "",                            # 4
+                 "    // CREATORS",             # 5
+                 "    Foo();",                  # 6
+                 "",                            # 7
+                 "    // DATA",                 # 8
+                 "    int    d_c;",             # 9
+                 "    double d_d;",             # 10
+                 "",                            # 11
+                 "    // DATA",                 # 12
+                 "    int d_e;",                # 13
+                 "    double d_f;",             # 14
+                 "};"]                          # 15
+
+        F = lambda r: bdeformatutil.formatBdeRanges(lines, r)
+        A = self.assertEqual
+
+        first = ((2, 4), ["    int    d_a;  // first",
+                          "    double d_b;",
+                          ""])
+        last = ((13, 14), ["    int    d_e;",
+                           "    double d_f;",
+                           ""])
+
+        A(F([]), [])
+        A(F([(0, 0)]), [])
+        A(F([(6, 6)]), [])
+        A(F([(3, 3)]), [first])
+        A(F([(1, 1)]), [first])
+        A(F([(4, 6)]), [first])
+
+        # Formatted sections aren't returned
+        A(F([(10, 10)]), [])
+
+        A(F([(14, 14), (3, 3), (2, 4)]), [first, last])
+        A(F([(0, 15)]), [first, last])
+
+        # Ranges beyond the last row are clamped
+        A(F([(12, 40)]), [last])
+        A(F([(40, 50)]), [])
+
+    def test_formatDeclaration(self):
+        F = bdeformatutil.formatDeclaration
+        A = self.assertEqual
+        P = bdeformatutil.parseElement
+
+        A(F("int", "Foo::f", [], "const"), ["int Foo::f() const"])
+        A(F("", "Foo::Foo", [P("int a"), P("double *b")]),
+          ["Foo::Foo(int a, double *b)"])
+        A(F("const char *", "Foo::name", [P("int   a")]),
+          ["const char *Foo::name(int a)"])
+
+        args = [P("int a"),
+                P("const char *name"),
+                P("double value"),
+                P("bslma::Allocator *basicAllocator")]
+        expected = ["void Foo::set(int               a,",
+                    "              const char       *name,",
+                    "              double            value,",
+                    "              bslma::Allocator *basicAllocator) const"]
+        A(F("void", "Foo::set", args, "const"), expected)
+
+        # Same layout as 'formatBde' on the declaration written on one line
+        text = "void Foo::set(int a, const char *name, double value, " \
+               "bslma::Allocator *basicAllocator) const"
+        lineSource = lambda row: text if row == 1 else "// CREATORS"
+        A(bdeformatutil.formatBde(lineSource, 1, 14)[1], expected)
+
+        A(bdeformatutil.formatDeclarations([("void", "Foo::set", args,
+                                             "const"),
+                                            ("int", "Foo::f", [], "")]),
+          [expected, ["int Foo::f()"]])
+
 # Test functions in 'bdeformatutil'
 if __name__ == "__main__":
     unittest.main();
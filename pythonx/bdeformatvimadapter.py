@@ -2,30 +2,667 @@
 bdeformatvimadapter.py: Adapter to expose 'bdeformat' inside vim
 """
 
+import os
+import threading
+import time
+
 import vim
 import bdeformatutil
+import cancellation
+import changedrows
+import classstructure
+import componentindex
+import formatstats
+import linesource
+import profiling
+
+DEFAULT_TIMEOUT_MS = 5000
+    # Time after which formatting is abandoned, unless overridden by
+    # 'g:bdeformat_timeout_ms'
+
+POLL_INTERVAL_MS = 20
+    # Interval at which the results of asynchronous formatting are checked
+
+s_pendingFormats = {}
+    # Map from buffer number to the '_AsyncFormat' running for that buffer
+
+s_pollTimer = None
+    # Id of the vim timer calling 'pollAsyncFormat', or 'None' if there is
+    # none
+
+s_changedRows = {}
+    # Map from buffer number to the 'changedrows.ChangedRows' changed in that
+    # buffer since it was last read or written
+
+s_bufferStructures = {}
+    # Map from buffer number to a '(changedtick, ClassStructure)' tuple of the
+    # structure of that buffer as of 'b:changedtick'
+
+s_precomputeThread = None
+    # Thread running '_precompute', or 'None'
+
+s_componentIndex = None
+    # The 'componentindex.ComponentIndex' of 'g:bdeformat_source_roots', or
+    # 'None' until it's first used
+
+s_indexLock = threading.Lock()
+    # Lock protecting 's_indexPaths' and 's_isIndexing'
+
+s_indexPaths = set()
+    # Paths of the files whose entries '_updateIndex' is to update
+
+s_isIndexing = False
+    # 'True' while a thread is running '_updateIndex'
+
+s_isIndexSynced = False
+    # 'True' once the whole index was brought up to date with the source
+    # roots, after which only the files read or written are updated
+
+s_stats = formatstats.FormatStats()
+    # Timings of the recent invocations of 'formatBde' and 'formatBdeAsync'
+
+def _deadline():
+    """
+    Return a new 'cancellation.Deadline' expiring after
+    'g:bdeformat_timeout_ms', or 'DEFAULT_TIMEOUT_MS' if it isn't set.  A
+    timeout of 0 means no time limit.
+    """
+    timeoutMs = int(vim.eval('get(g:, "bdeformat_timeout_ms", %d)' %
+                                                          DEFAULT_TIMEOUT_MS))
+    return cancellation.Deadline(timeoutMs / 1000.0 if timeoutMs > 0
+                                                    else None)
+
+class _LayoutProfile(profiling.Profile):
+    """
+    A 'profiling.Profile' of 'bdeformatutil.formatBde' telling the time spent
+    laying out the block apart from the time spent finding it.
+    """
+
+    def layoutSeconds(self):
+        """
+        Return the number of seconds spent parsing and laying out the block.
+        """
+        return sum(self.seconds(phase) for phase in profiling.PHASES
+                                       if phase != "scan")
+
+def _record(location, result, rowsRead, readSeconds, formatSeconds, profile,
+            applySeconds, error):
+    """
+    Add to 's_stats' the timing of formatting at the specified 'location'
+    with the specified 'result' of 'formatBde', or the specified 'error', in
+    the specified 'formatSeconds', of which the specified 'readSeconds' were
+    spent reading the specified 'rowsRead' rows, and the specified
+    '_LayoutProfile' 'profile' measured the layout, then applying it in the
+    specified 'applySeconds'.
+    """
+    layoutSeconds = profile.layoutSeconds()
+    rows = None
+    if result is not None:
+        (startRow, endRow), _ = result
+        rows = endRow - startRow + 1
+
+    s_stats.record(formatstats.FormatRecord(
+                       location=location,
+                       rows=rows,
+                       rowsRead=rowsRead,
+                       read=readSeconds,
+                       scan=formatSeconds - readSeconds - layoutSeconds,
+                       layout=layoutSeconds,
+                       apply=applySeconds,
+                       error=None if error is None else str(error)))
 
 def formatBde():
+    started = time.time()
     buf = vim.current.buffer
-    lineSource = lambda row: buf[row]
+
+    reads = [0, 0.0]
+    def fetchRange(start, end):
+        readStarted = time.time()
+        ret = buf[start:end]
+        reads[0] += len(ret)
+        reads[1] += time.time() - readStarted
+        return ret
+
+    lineSource = linesource.PrefetchingLineSource(fetchRange, len(buf))
+    profile = _LayoutProfile()
+    row, col = vim.current.window.cursor
+    location = (buf.name, row - 1, col)
     try:
-        row, col = vim.current.window.cursor
-        startEnd, lines = bdeformatutil.formatBde(lineSource, row - 1, col)
+        result = bdeformatutil.formatBde(lineSource,
+                                         row - 1,
+                                         col,
+                                         deadline=_deadline(),
+                                         profile=profile)
     except ValueError as e:
+        _record(location, None, reads[0], reads[1], time.time() - started,
+                profile, 0.0, e)
+        print(e)
+        return
+
+    formatted = time.time()
+    (startRow, endRow), lines = result
+    replaceLines(buf, startRow, endRow, lines)
+    _record(location, result, reads[0], reads[1], formatted - started,
+            profile, time.time() - formatted, None)
+
+def printStats():
+    """
+    Print the latency statistics of the recent formatting invocations.
+    """
+    for line in s_stats.report():
+        print(line)
+
+def replaceLines(buf, startRow, endRow, lines):
+    """
+    Replace the rows from the specified 'startRow' to the specified 'endRow'
+    (inclusive) of the specified 'buf' with the specified 'lines' using a
+    single slice assignment, leaving the unchanged rows at either end alone so
+    that vim only sees the modified rows change.
+    """
+
+    # Formatted elements can span several lines
+    if lines:
+        lines = "\n".join(lines).split("\n")
+
+    oldLines = buf[startRow:endRow + 1]
+
+    prefix = 0
+    maxCommon = min(len(oldLines), len(lines))
+    while prefix < maxCommon and oldLines[prefix] == lines[prefix]:
+        prefix += 1
+
+    suffix = 0
+    maxCommon -= prefix
+    while suffix < maxCommon and oldLines[-1 - suffix] == lines[-1 - suffix]:
+        suffix += 1
+
+    if prefix == len(oldLines) == len(lines):
+        # Nothing changed
+        return
+
+    buf[startRow + prefix:endRow + 1 - suffix] = \
+                                          lines[prefix:len(lines) - suffix]
+
+def _changedTick(bufferNumber):
+    """
+    Return the 'b:changedtick' of the buffer with the specified
+    'bufferNumber'.
+    """
+    return int(vim.eval("getbufvar(%d, 'changedtick')" % bufferNumber))
+
+class _AsyncFormat(object):
+    """
+    The formatting of the block around a position of a buffer, running on a
+    worker thread over a snapshot of the rows around the position.
+    """
+
+    def __init__(self, buf, row, col):
+        """
+        Start formatting the block around the specified 'col' of the specified
+        'row' of the specified 'buf'.
+        """
+        self.d_bufferNumber = buf.number
+        self.d_changedTick = _changedTick(buf.number)
+        self.d_result = None
+        self.d_error = None
+        self.d_deadline = _deadline()
+        self.d_location = (buf.name, row, col)
+        self.d_profile = _LayoutProfile()
+        self.d_formatSeconds = 0.0
+
+        # 'formatBde' never looks further than 'MAX_SECTION_ROWS' from 'row'
+        started = time.time()
+        windowStart = max(row - bdeformatutil.MAX_SECTION_ROWS, 0)
+        window = buf[windowStart:row + bdeformatutil.MAX_SECTION_ROWS + 1]
+        self.d_windowStart = windowStart
+        self.d_rowsRead = len(window)
+        self.d_readSeconds = time.time() - started
+
+        self.d_thread = threading.Thread(target=self._run,
+                                         args=(window, row - windowStart, col))
+        self.d_thread.daemon = True
+        self.d_thread.start()
+
+    def _run(self, window, row, col):
+        started = time.time()
+        lineSource = linesource.ListLineSource(window)
+        try:
+            self.d_result = bdeformatutil.formatBde(lineSource,
+                                                    row,
+                                                    col,
+                                                    deadline=self.d_deadline,
+                                                    profile=self.d_profile)
+        except Exception as e:
+            # Anything escaping would leave no result for 'apply'
+            self.d_error = e
+
+        self.d_formatSeconds = time.time() - started
+
+    def cancel(self):
+        """
+        Stop the formatting as soon as possible.  Its result is an error.
+        """
+        self.d_deadline.cancel()
+
+    def isDone(self):
+        """
+        Return 'True' if the formatting has finished.
+        """
+        return not self.d_thread.is_alive()
+
+    def apply(self):
+        """
+        Replace the formatted block in the buffer, unless the buffer was
+        changed or closed since the formatting started, in which case the
+        result is discarded.  The formatting must have finished.
+        """
+        try:
+            buf = vim.buffers[self.d_bufferNumber]
+        except KeyError:
+            return
+
+        if _changedTick(self.d_bufferNumber) != self.d_changedTick:
+            print("Buffer changed while formatting, result discarded")
+            return
+
+        applyStarted = time.time()
+        if self.d_error:
+            print(self.d_error)
+        else:
+            (startRow, endRow), lines = self.d_result
+            replaceLines(buf,
+                         startRow + self.d_windowStart,
+                         endRow + self.d_windowStart,
+                         lines)
+
+        _record(self.d_location,
+                self.d_result,
+                self.d_rowsRead,
+                self.d_readSeconds,
+                self.d_readSeconds + self.d_formatSeconds,
+                self.d_profile,
+                time.time() - applyStarted,
+                self.d_error)
+
+def formatBdeAsync():
+    """
+    Start formatting the block around the cursor in the background, without
+    blocking the editor.  The result is applied by 'pollAsyncFormat' once the
+    formatting has finished, if the buffer is still unchanged.  Any formatting
+    already running for the current buffer is superseded.  Without timer
+    support in vim, format synchronously.
+    """
+    global s_pollTimer
+
+    if not int(vim.eval('has("timers")')):
+        formatBde()
+        return
+
+    buf = vim.current.buffer
+    row, col = vim.current.window.cursor
+    superseded = s_pendingFormats.get(buf.number)
+    if superseded is not None:
+        superseded.cancel()
+
+    s_pendingFormats[buf.number] = _AsyncFormat(buf, row - 1, col)
+
+    if s_pollTimer is None:
+        s_pollTimer = int(vim.eval(
+                         "timer_start(%d, 'BDEFormatPoll', {'repeat': -1})" %
+                                                             POLL_INTERVAL_MS))
+
+def pollAsyncFormat():
+    """
+    Apply the results of the asynchronous formatting that has finished, and
+    stop the poll timer if nothing is left running.
+    """
+    global s_pollTimer
+
+    for bufferNumber, asyncFormat in list(s_pendingFormats.items()):
+        if asyncFormat.isDone():
+            del s_pendingFormats[bufferNumber]
+            asyncFormat.apply()
+
+    if not s_pendingFormats and s_pollTimer is not None:
+        vim.eval("timer_stop(%d)" % s_pollTimer)
+        s_pollTimer = None
+
+def _autocmdBuffer():
+    """
+    Return the number of the buffer for which the current autocommand is run.
+    """
+    return int(vim.eval('expand("<abuf>")'))
+
+def _formatOnSave():
+    """
+    Return 'True' if formatting on save is enabled with
+    'g:bdeformat_on_save'.
+    """
+    return bool(int(vim.eval('get(g:, "bdeformat_on_save", 0)')))
+
+def trackChanges():
+    """
+    Start recording the rows changed in the buffer of the current autocommand
+    if formatting on save is enabled.
+    """
+    bufferNumber = _autocmdBuffer()
+    if not _formatOnSave() or bufferNumber in s_changedRows:
+        return
+
+    s_changedRows[bufferNumber] = changedrows.ChangedRows()
+    vim.eval("listener_add('BDEFormatListener', %d)" % bufferNumber)
+
+def forgetBuffer():
+    """
+    Drop the state kept for the buffer of the current autocommand, which is
+    being wiped out.
+    """
+    bufferNumber = _autocmdBuffer()
+    s_changedRows.pop(bufferNumber, None)
+    s_bufferStructures.pop(bufferNumber, None)
+
+def recordChanges():
+    """
+    Record the changes passed to 'BDEFormatListener' by vim.
+    """
+    rows = s_changedRows.get(int(vim.eval("a:bufnr")))
+    if rows is None:
+        return
+
+    for change in vim.eval("a:changes"):
+        rows.change(int(change["lnum"]) - 1,
+                    int(change["end"]) - 1,
+                    int(change["added"]))
+
+class _BufferRows(object):
+    """
+    The rows of a vim buffer as the sequence of lines taken by
+    'bdeformatutil.formatBdeRanges', read in chunks through a
+    'linesource.PrefetchingLineSource' rather than one row at a time.
+    """
+
+    def __init__(self, buf):
+        """
+        Create a sequence of the rows of the specified vim 'buf'.
+        """
+        self.d_numRows = len(buf)
+        self.d_lineSource = linesource.PrefetchingLineSource(
+                                             lambda start, end: buf[start:end],
+                                             self.d_numRows)
+
+    def __len__(self):
+        return self.d_numRows
+
+    def __getitem__(self, row):
+        return self.d_lineSource(row)
+
+def formatChangedRows():
+    """
+    Format the DATA sections intersecting the rows changed since the buffer of
+    the current autocommand was last read or written, if formatting on save is
+    enabled.
+    """
+    bufferNumber = _autocmdBuffer()
+    if not _formatOnSave():
+        return
+
+    if bufferNumber not in s_changedRows:
+        # Enabled after the buffer was read
+        trackChanges()
+        return
+
+    # Listeners are called lazily
+    vim.eval("listener_flush(%d)" % bufferNumber)
+
+    ranges = s_changedRows[bufferNumber].ranges()
+    if not ranges:
+        return
+
+    buf = vim.buffers[bufferNumber]
+    try:
+        edits = bdeformatutil.formatBdeRanges(_BufferRows(buf),
+                                              ranges,
+                                              deadline=_deadline())
+    except cancellation.DeadlineExceeded as e:
+        # Save the buffer as it is
         print(e)
         return
 
-    # Figure out if we need to add or remove lines
-    startRow, endRow = startEnd
-    oldLines = endRow - startRow + 1
-    newLines = len(lines)
-    if oldLines < newLines:
-        # Add lines
-        for i in range(newLines - oldLines):
-            vim.command("normal o")
-    elif newLines < oldLines:
-        # Delete lines
-        del buf[startRow:startRow + oldLines - newLines]
-
-    for i in range(len(lines)):
-        buf[startRow + i] = lines[i]
+    for (startRow, endRow), lines in reversed(edits):
+        replaceLines(buf, startRow, endRow, lines)
+
+def clearChangedRows():
+    """
+    Forget the rows changed in the buffer of the current autocommand, which
+    was just written.
+    """
+    bufferNumber = _autocmdBuffer()
+    rows = s_changedRows.get(bufferNumber)
+    if rows is not None:
+        vim.eval("listener_flush(%d)" % bufferNumber)
+        rows.clear()
+
+def bufferStructure(buf=None):
+    """
+    Return the 'classstructure.ClassStructure' of the specified 'buf', or of
+    the current buffer if 'buf' is 'None'.  The structure is shared by all
+    callers until the buffer changes, and is then updated with
+    'ClassStructure.updated', which only scans the buffer again if a header
+    was edited.
+    """
+    if buf is None:
+        buf = vim.current.buffer
+
+    changedTick = _changedTick(buf.number)
+    cached = s_bufferStructures.get(buf.number)
+    if cached is not None and cached[0] == changedTick:
+        return cached[1]
+
+    if cached is None:
+        structure = classstructure.ClassStructure(buf[:])
+    else:
+        # Typing the trigger of the snippet being expanded changed the buffer
+        structure = cached[1].updated(buf[:])
+
+    s_bufferStructures[buf.number] = (changedTick, structure)
+    return structure
+
+def flatDeclSnippets():
+    """
+    Return 'True' if the 'decl' snippets should leave their declarations flat
+    instead of nesting each of them in a tabstop, which is enabled with
+    'g:bdeformat_flat_decl_snippets'.
+    """
+    return bool(int(vim.eval('get(g:, "bdeformat_flat_decl_snippets", 0)')))
+
+def _headerPath(buf):
+    """
+    Return the path of the header corresponding to the specified 'buf' if it
+    is a .cpp file, and 'None' otherwise.
+    """
+    if buf.name and buf.name.endswith(".cpp"):
+        return buf.name[:-len(".cpp")] + ".h"
+
+    return None
+
+def _precompute(bufferNumber, changedTick, structure, lines, row, headerPath):
+    """
+    Bring the specified 'structure' of the buffer with the specified
+    'bufferNumber' up to date with the specified 'lines' as of the specified
+    'changedTick', building it if 'structure' is 'None', and load the
+    structure of the header at the specified 'headerPath', if any.  Then
+    prepare the class at the specified 'row' in both.  'lines' is 'None' if
+    'structure' is already up to date.  This runs on a worker thread, so it
+    doesn't call vim.
+    """
+    if lines is not None:
+        if structure is None:
+            structure = classstructure.ClassStructure(lines)
+        else:
+            structure = structure.updated(lines)
+
+        cached = s_bufferStructures.get(bufferNumber)
+        if cached is None or cached[0] < changedTick:
+            s_bufferStructures[bufferNumber] = (changedTick, structure)
+
+    structures = [structure]
+    if headerPath:
+        headerStructure = classstructure.fileStructure(headerPath)
+        if headerStructure:
+            structures.append(headerStructure)
+
+    className, _ = structure.findClassHeader(row)
+    if className:
+        for s in structures:
+            s.prepareClass(className)
+
+def precomputeStructure():
+    """
+    Start building, on a worker thread, the structure of the buffer of the
+    current autocommand and of its header, and looking up the class under the
+    cursor in them, so that snippets expand without scanning the files.  Do
+    nothing if 'g:bdeformat_precompute' is 0 or if this is already running.
+    """
+    global s_precomputeThread
+
+    if not int(vim.eval('get(g:, "bdeformat_precompute", 1)')):
+        return
+
+    if s_precomputeThread is not None and s_precomputeThread.is_alive():
+        return
+
+    bufferNumber = _autocmdBuffer()
+    buf = vim.buffers[bufferNumber]
+    changedTick = _changedTick(bufferNumber)
+
+    # Only the snapshot of the lines has to be taken here.  A stale structure
+    # is updated rather than rebuilt, keeping the classes already prepared.
+    structure = None
+    lines = None
+    cached = s_bufferStructures.get(bufferNumber)
+    if cached is not None:
+        structure = cached[1]
+    if cached is None or cached[0] != changedTick:
+        lines = buf[:]
+
+    row = 0
+    if vim.current.buffer.number == bufferNumber:
+        row = vim.current.window.cursor[0] - 1
+
+    s_precomputeThread = threading.Thread(target=_precompute,
+                                          args=(bufferNumber,
+                                                changedTick,
+                                                structure,
+                                                lines,
+                                                row,
+                                                _headerPath(buf)))
+    s_precomputeThread.daemon = True
+    s_precomputeThread.start()
+
+def _sourceRoots():
+    """
+    Return the list of directories listed in 'g:bdeformat_source_roots'.
+    """
+    return [os.path.expanduser(root)
+            for root in vim.eval('get(g:, "bdeformat_source_roots", [])')]
+
+def componentIndex():
+    """
+    Return the 'componentindex.ComponentIndex' of the classes defined under
+    'g:bdeformat_source_roots', loaded from 'g:bdeformat_index_file', or from
+    the 'bdeformatcache' directory if it isn't set, or 'None' if there are no
+    source roots.  The index is kept up to date by 'updateComponentIndex'.
+    """
+    global s_componentIndex
+
+    if s_componentIndex is None:
+        if not _sourceRoots():
+            return None
+
+        fileName = vim.eval('get(g:, "bdeformat_index_file", "")') or \
+                   componentindex.defaultIndexFile()
+        s_componentIndex = componentindex.ComponentIndex(fileName)
+
+    return s_componentIndex
+
+def _updateIndex(index, roots, jobs):
+    """
+    Update the specified 'index' with the files under the specified 'roots',
+    if any, using the specified 'jobs' processes, then with the files in
+    's_indexPaths' until there are none left, and save it.  This runs on a
+    worker thread, so it doesn't call vim.
+    """
+    global s_isIndexing
+
+    if roots:
+        index.update(roots, jobs)
+
+    while True:
+        while True:
+            with s_indexLock:
+                if not s_indexPaths:
+                    break
+
+                path = s_indexPaths.pop()
+
+            index.updateFile(path)
+
+        try:
+            index.save()
+        except (IOError, OSError):
+            pass
+
+        with s_indexLock:
+            if not s_indexPaths:
+                s_isIndexing = False
+                return
+
+def _isUnder(path, roots):
+    """
+    Return 'True' if the specified absolute 'path' is one of the specified
+    'roots' or is under one of them.
+    """
+    for root in roots:
+        root = os.path.abspath(root)
+        if path == root or path.startswith(os.path.join(root, "")):
+            return True
+
+    return False
+
+def updateComponentIndex():
+    """
+    Update, on a worker thread, the index of the classes defined under
+    'g:bdeformat_source_roots' with the file of the current autocommand.  The
+    first time, rescan instead all the files under the roots that changed
+    since they were last indexed, using 'g:bdeformat_index_jobs' processes (1
+    by default, since forking vim is best avoided; 'componentindex.py' builds
+    the initial index in parallel).  Do nothing if there are no source roots.
+    """
+    global s_isIndexing, s_isIndexSynced
+
+    index = componentIndex()
+    if index is None:
+        return
+
+    roots = _sourceRoots()
+    path = os.path.abspath(vim.eval('expand("<afile>:p")'))
+
+    with s_indexLock:
+        if s_isIndexSynced:
+            if not _isUnder(path, roots):
+                return
+
+            roots = None
+            s_indexPaths.add(path)
+
+        s_isIndexSynced = True
+        if s_isIndexing:
+            # The running thread picks up the path
+            return
+
+        s_isIndexing = True
+
+    jobs = int(vim.eval('get(g:, "bdeformat_index_jobs", 1)'))
+    thread = threading.Thread(target=_updateIndex, args=(index, roots, jobs))
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,111 @@
+"""
+cancellation.py: Time budgets and cancellation of formatting
+
+This module defines 'Deadline', which is both a time budget and a
+cancellation token for formatting.  The formatting entry points in
+'bdeformatutil' take an optional 'Deadline', which they make the active
+deadline of the calling thread with 'activate' while they run.  The scanning,
+parsing and comment layout loops call 'check', which throws a
+'DeadlineExceeded' once the active deadline has passed or was cancelled, so
+that formatting stops before anything is modified.  With no active deadline,
+'check' does nothing, and while no deadline is active on any thread it only
+reads 's_numActive'.
+"""
+
+import contextlib
+import threading
+import time
+
+s_active = threading.local()
+    # The 'deadline' attribute is the deadline active on the thread, if any
+
+s_numActive = 0
+    # Number of 'activate' contexts entered with a deadline on all threads
+
+s_numActiveLock = threading.Lock()
+    # Lock protecting 's_numActive'
+
+class DeadlineExceeded(ValueError):
+    """
+    Thrown when formatting runs past its 'Deadline' or the 'Deadline' is
+    cancelled.  Since it's a 'ValueError', callers that don't distinguish it
+    from other formatting failures leave the code unmodified as they do for
+    those.
+    """
+    pass
+
+class Deadline(object):
+    """
+    A time by which formatting must finish, which can also be cancelled
+    explicitly from another thread.
+    """
+
+    def __init__(self, seconds=None):
+        """
+        Create a deadline expiring after the optionally specified 'seconds',
+        or that only expires when cancelled if 'seconds' is 'None'.
+        """
+        self.d_expiry = time.time() + seconds if seconds is not None \
+                                              else None
+        self.d_cancelled = False
+
+    def cancel(self):
+        """
+        Make this deadline expire immediately.
+        """
+        self.d_cancelled = True
+
+    def isExpired(self):
+        """
+        Return 'True' if this deadline has passed or was cancelled.
+        """
+        return self.d_cancelled or \
+               (self.d_expiry is not None and time.time() >= self.d_expiry)
+
+    def check(self):
+        """
+        Throw a 'DeadlineExceeded' if this deadline has passed or was
+        cancelled.
+        """
+        if self.d_cancelled:
+            raise DeadlineExceeded("Formatting cancelled")
+
+        if self.d_expiry is not None and time.time() >= self.d_expiry:
+            raise DeadlineExceeded("Formatting took too long")
+
+@contextlib.contextmanager
+def activate(deadline):
+    """
+    Return a context manager making the specified 'deadline' the active
+    deadline of the calling thread while it's entered.  If 'deadline' is
+    'None', the active deadline is left as it is.
+    """
+    if deadline is None:
+        yield
+        return
+
+    global s_numActive
+
+    with s_numActiveLock:
+        s_numActive += 1
+
+    previous = getattr(s_active, "deadline", None)
+    s_active.deadline = deadline
+    try:
+        yield
+    finally:
+        s_active.deadline = previous
+        with s_numActiveLock:
+            s_numActive -= 1
+
+def check():
+    """
+    Throw a 'DeadlineExceeded' if the active deadline of the calling thread
+    has passed or was cancelled.
+    """
+    if not s_numActive:
+        return
+
+    deadline = getattr(s_active, "deadline", None)
+    if deadline is not None:
+        deadline.check()
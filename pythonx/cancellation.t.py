@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+
+import bdeformatcache
+import bdeformatutil
+import cancellation
+import linesource
+from cancellation import Deadline, DeadlineExceeded
+from testsources import LINES
+
+class TestDriver(unittest.TestCase):
+
+    def test_deadline(self):
+        A = self.assertEqual
+
+        deadline = Deadline()
+        A(deadline.isExpired(), False)
+        deadline.check()
+        deadline.cancel()
+        A(deadline.isExpired(), True)
+        self.assertRaises(DeadlineExceeded, deadline.check)
+
+        A(Deadline(60).isExpired(), False)
+        A(Deadline(0).isExpired(), True)
+        self.assertRaises(DeadlineExceeded, Deadline(-1).check)
+        self.assertTrue(issubclass(DeadlineExceeded, ValueError))
+
+    def test_activate(self):
+        expired = Deadline(0)
+
+        # Nothing is active by default
+        cancellation.check()
+        self.assertEqual(cancellation.s_numActive, 0)
+
+        with cancellation.activate(expired):
+            self.assertEqual(cancellation.s_numActive, 1)
+            self.assertRaises(DeadlineExceeded, cancellation.check)
+
+            # 'None' keeps the active deadline
+            with cancellation.activate(None):
+                self.assertRaises(DeadlineExceeded, cancellation.check)
+
+            with cancellation.activate(Deadline()):
+                cancellation.check()
+
+            self.assertRaises(DeadlineExceeded, cancellation.check)
+
+            # Other threads are not affected
+            errors = []
+            def run():
+                try:
+                    cancellation.check()
+                except DeadlineExceeded as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+            self.assertEqual(errors, [])
+
+        cancellation.check()
+        self.assertEqual(cancellation.s_numActive, 0)
+
+    def test_formatBde(self):
+        lineSource = linesource.ListLineSource(LINES)
+        F = bdeformatutil.formatBde
+
+        for row, col in ((2, 4), (6, 20)):
+            expected = F(lineSource, row, col)
+            self.assertEqual(F(lineSource, row, col, deadline=Deadline(60)),
+                             expected)
+            self.assertRaises(DeadlineExceeded,
+                              F, lineSource, row, col, deadline=Deadline(0))
+
+        # Nothing is cached when the deadline expires
+        cache = bdeformatcache.MemoryCache()
+        self.assertRaises(DeadlineExceeded,
+                          F, lineSource, 2, 4, cache, Deadline(0))
+        self.assertEqual(len(cache.d_entries), 0)
+
+    def test_formatBdeRanges(self):
+        F = bdeformatutil.formatBdeRanges
+        ranges = [(0, len(LINES) - 1)]
+
+        self.assertEqual(len(F(LINES, ranges, deadline=Deadline(60))), 1)
+        self.assertRaises(DeadlineExceeded,
+                          F, LINES, ranges, deadline=Deadline(0))
+
+if __name__ == "__main__":
+    unittest.main();
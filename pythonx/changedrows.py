@@ -0,0 +1,72 @@
+"""
+changedrows.py: Tracking of the rows of a buffer changed since a point in time
+
+This module defines 'ChangedRows', which keeps the ranges of rows changed by a
+sequence of edits, adjusting them as rows are inserted and deleted, so that
+the DATA sections touched since a buffer was last saved can be formatted
+without looking at the rest of the buffer.
+"""
+
+class ChangedRows(object):
+    """
+    The set of rows changed by the edits recorded with 'change', expressed as
+    row numbers after the last recorded edit.
+    """
+
+    def __init__(self):
+        """
+        Create an object with no changed rows.
+        """
+        self.d_ranges = []
+            # Sorted list of '[start, end)' ranges, neither overlapping nor
+            # adjacent
+
+    def change(self, start, end, added):
+        """
+        Record that the rows from the specified 'start' up to, but not
+        including, the specified 'end' were replaced with 'end - start +
+        added' rows, where the specified 'added' is negative if rows were
+        deleted.  This matches the changes reported by vim's 'listener_add',
+        with 0-based rows.
+        """
+        newEnd = end + added
+        if newEnd <= start:
+            # Only deletions, which join the rows around them
+            changedStart, changedEnd = max(start - 1, 0), start + 1
+        else:
+            changedStart, changedEnd = start, newEnd
+
+        ranges = []
+        for rangeStart, rangeEnd in self.d_ranges:
+            if rangeEnd < start:
+                ranges.append((rangeStart, rangeEnd))
+            elif rangeStart > end:
+                ranges.append((rangeStart + added, rangeEnd + added))
+            else:
+                changedStart = min(changedStart, rangeStart)
+                changedEnd = max(changedEnd, rangeEnd + added)
+
+        ranges.append((changedStart, changedEnd))
+        ranges.sort()
+
+        # Shifted ranges can end up touching the changed range
+        self.d_ranges = []
+        for rangeStart, rangeEnd in ranges:
+            if self.d_ranges and rangeStart <= self.d_ranges[-1][1]:
+                self.d_ranges[-1] = (self.d_ranges[-1][0],
+                                     max(self.d_ranges[-1][1], rangeEnd))
+            else:
+                self.d_ranges.append((rangeStart, rangeEnd))
+
+    def clear(self):
+        """
+        Forget all the changed rows.
+        """
+        self.d_ranges = []
+
+    def ranges(self):
+        """
+        Return a sorted list of '(start, end)' tuples of the inclusive ranges
+        of changed rows.
+        """
+        return [(start, end - 1) for start, end in self.d_ranges]
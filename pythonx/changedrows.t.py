@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import unittest
+
+from changedrows import ChangedRows
+
+class TestDriver(unittest.TestCase):
+
+    def test_change(self):
+        def T(changes, expected):
+            rows = ChangedRows()
+            for change in changes:
+                rows.change(*change)
+            self.assertEqual(rows.ranges(), expected)
+
+        T([], [])
+
+        # Modified rows
+        T([(3, 4, 0)], [(3, 3)])
+        T([(3, 6, 0)], [(3, 5)])
+
+        # Inserted rows
+        T([(3, 3, 2)], [(3, 4)])
+
+        # Deleted rows mark the rows around them
+        T([(3, 5, -2)], [(2, 3)])
+        T([(0, 1, -1)], [(0, 0)])
+
+        # Later ranges are shifted
+        T([(10, 11, 0), (3, 3, 2)], [(3, 4), (12, 12)])
+        T([(10, 11, 0), (3, 5, -2)], [(2, 3), (8, 8)])
+
+        # Earlier ranges are not
+        T([(3, 4, 0), (10, 10, 5)], [(3, 3), (10, 14)])
+
+        # Overlapping and adjacent ranges are merged
+        T([(3, 6, 0), (5, 8, 0)], [(3, 7)])
+        T([(3, 4, 0), (4, 5, 0)], [(3, 4)])
+        T([(3, 4, 0), (10, 11, 0), (4, 10, 0)], [(3, 10)])
+        T([(3, 4, 0), (6, 7, 0), (4, 6, -2)], [(3, 4)])
+        T([(10, 12, 0), (3, 5, 5)], [(3, 9), (15, 16)])
+
+    def test_clear(self):
+        rows = ChangedRows()
+        rows.change(3, 4, 0)
+        rows.clear()
+        self.assertEqual(rows.ranges(), [])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,476 @@
+"""
+classstructure.py: Index of the class headers and sections of a source file
+
+This module defines 'ClassStructure', which scans the lines of a C++ source
+file once, remembering where its BDE class headers and section headers are, so
+that the lookups done by the snippets ('findClassHeader' and
+'extractClassSections' in 'parseutil') can be answered repeatedly without
+walking the file again.  The structures of files on disk, such as the headers
+of the '.cpp' files being edited, are cached by 'fileStructure' until the
+files change.  Structures stored on disk only hold the rows of the headers
+and the offsets of the sections in the file, so that the sections looked up
+are read directly from the file.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import bdeformatcache
+import parseutil
+import sourcefile
+from sectiontype import SectionType
+
+STRUCTURE_VERSION = 1
+    # Version of the layout of the structures cached on disk, stored with
+    # them so that structures stored by other versions are ignored
+
+STRUCTURE_CACHE_DIR_NAME = "structures"
+    # Name of the subdirectory of the 'bdeformatcache' directory holding the
+    # cached structures of files
+
+DECLARATION_SECTIONS = [
+    SectionType.PRIVATE_CREATORS,
+    SectionType.PRIVATE_MANIPULATORS,
+    SectionType.PRIVATE_ACCESSORS,
+    SectionType.CREATORS,
+    SectionType.MANIPULATORS,
+    SectionType.ACCESSORS]
+    # Sections containing the function declarations 'def' generates
+    # definitions for
+
+MAX_FILE_STRUCTURES = 64
+    # Number of files whose structure is kept in memory by 'fileStructure'.
+    # The structures are all dropped when the limit is reached
+
+s_fileStructures = {}
+    # Map from absolute path to a '((size, mtime), ClassStructure)' tuple of
+    # the structure of that file when it had that size and modification time
+
+def _commonPrefixLength(a, b):
+    """
+    Return the number of leading elements that the specified lists 'a' and
+    'b' have in common.
+    """
+    limit = min(len(a), len(b))
+
+    # Compare slices first, so that long common runs are skipped quickly
+    ret = 0
+    step = 256
+    while ret + step <= limit and a[ret:ret + step] == b[ret:ret + step]:
+        ret += step
+
+    while ret < limit and a[ret] == b[ret]:
+        ret += 1
+
+    return ret
+
+class ClassStructure(object):
+    """
+    The class headers and section headers of a list of lines, and the results
+    of the lookups made on them.
+    """
+
+    def __init__(self, lines):
+        """
+        Index the specified 'lines', which is a sequence of strings.
+        """
+
+        if not hasattr(ClassStructure, "pattern"):
+            ClassStructure.pattern = re.compile(
+                                           r'^ *// (?:class|struct) (.*)')
+            ClassStructure.defPattern = re.compile(r'^ *// =+ *$')
+
+        self.d_lines = list(lines)
+
+        self.d_numRows = len(self.d_lines)
+
+        self.d_readRows = None
+            # Function taking a 'start' and 'end' row and returning the list
+            # of rows from 'start' up to, but not including, 'end', which is
+            # used instead of 'd_lines' by structures loaded from disk
+
+        self.d_classHeaders = []
+            # List of '(row, className, isDefinition)' tuples, ordered by row
+
+        self.d_classRows = []
+            # Rows of the 'd_classHeaders'
+
+        self.d_sections = []
+            # List of '(row, SectionType)' tuples, ordered by row
+
+        self.d_sectionRows = []
+            # Rows of the 'd_sections'
+
+        self.d_extracted = {}
+            # Map from the arguments of 'extractClassSections' to its result
+
+        self.d_dataMembers = {}
+            # Map from class name to the result of 'dataMembers'
+
+        numRows = self.d_numRows
+        for row, line in enumerate(self.d_lines):
+            section = SectionType.check(line)
+            if section is not None:
+                self.d_sections.append((row, section))
+                self.d_sectionRows.append(row)
+                continue
+
+            match = ClassStructure.pattern.match(line)
+            if match:
+                isDefinition = row + 1 < numRows and \
+                    ClassStructure.defPattern.match(self.d_lines[row + 1]) \
+                                                                  is not None
+                self.d_classHeaders.append((row, match.group(1), isDefinition))
+                self.d_classRows.append(row)
+
+    def updated(self, lines):
+        """
+        Return the structure of the specified 'lines', which is a sequence of
+        strings holding an edited version of the lines of this structure.  If
+        the rows that changed hold no class or section header, either before
+        or after the edit, the headers of this structure are reused, moved by
+        the number of rows added or removed, along with the results of the
+        lookups on the classes whose definitions don't intersect the changed
+        rows, so that edits such as typing a snippet trigger don't cause the
+        file to be scanned again.  Return this structure if 'lines' are
+        unchanged.
+        """
+        lines = list(lines)
+        if self.d_readRows is not None:
+            return ClassStructure(lines)
+
+        oldLines = self.d_lines
+        prefix = _commonPrefixLength(oldLines, lines)
+        if prefix == len(oldLines) == len(lines):
+            return self
+
+        suffix = _commonPrefixLength(oldLines[prefix:][::-1],
+                                     lines[prefix:][::-1])
+        oldEnd = len(oldLines) - suffix
+        newEnd = len(lines) - suffix
+
+        for line in oldLines[prefix:oldEnd] + lines[prefix:newEnd]:
+            if SectionType.check(line) is not None or \
+               ClassStructure.pattern.match(line) or \
+               ClassStructure.defPattern.match(line):
+                return ClassStructure(lines)
+
+        delta = newEnd - oldEnd
+        move = lambda row: row + delta if row >= oldEnd else row
+
+        ret = ClassStructure([])
+        ret.d_lines = lines
+        ret.d_numRows = len(lines)
+        ret.d_classHeaders = [(move(row), name, isDefinition)
+                              for row, name, isDefinition in
+                                                         self.d_classHeaders]
+        ret.d_classRows = [row for row, _, _ in ret.d_classHeaders]
+        ret.d_sections = [(move(row), section)
+                          for row, section in self.d_sections]
+        ret.d_sectionRows = [row for row, _ in ret.d_sections]
+
+        # The lookups may be running on another thread, so copy them first
+        stale = set(name for name, startRow, endRow in self.classDefinitions()
+                    if startRow < oldEnd and endRow >= prefix)
+        ret.d_extracted = dict(
+                        (key, value)
+                        for key, value in dict(self.d_extracted).items()
+                        if key[0] not in stale)
+        ret.d_dataMembers = dict(
+                        (name, value)
+                        for name, value in dict(self.d_dataMembers).items()
+                        if name not in stale)
+        return ret
+
+    def findClassHeader(self, row, sections=[]):
+        """
+        Return a '(className, section)' tuple of the closest class header at
+        or above the specified 'row', and of the closest section from the
+        optionally specified 'sections' between the class header and 'row',
+        like 'parseutil.findClassHeader' searching up from 'row'.  Return
+        '(None, None)' if there is no class header, and a 'section' of 'None'
+        if none of the 'sections' was found.
+        """
+        index = bisect.bisect_right(self.d_classRows, row) - 1
+        if index < 0:
+            return (None, None)
+
+        headerRow, className, _ = self.d_classHeaders[index]
+
+        section = None
+        index = bisect.bisect_right(self.d_sectionRows, row) - 1
+        while index >= 0 and self.d_sectionRows[index] > headerRow:
+            if self.d_sections[index][1] in sections:
+                section = self.d_sections[index][1]
+                break
+
+            index -= 1
+
+        return (className, section)
+
+    def extractClassSections(self, className, sections):
+        """
+        Return the contents of the specified 'sections' of the definition of
+        the specified 'className' as 'parseutil.extractClassSections' would
+        for the whole file.
+        """
+        requestedList = isinstance(sections, list)
+        key = (className, tuple(sections) if requestedList else sections)
+        if key in self.d_extracted:
+            return self.d_extracted[key]
+
+        if not requestedList:
+            sections = [sections]
+
+        retSections = [None] * len(sections)
+
+        start = None
+        for row, name, isDefinition in self.d_classHeaders:
+            if isDefinition and name == className:
+                start = row + 2
+                break
+
+        if start is not None:
+            index = bisect.bisect_left(self.d_sectionRows, start)
+            while index < len(self.d_sections):
+                row, section = self.d_sections[index]
+                if section == SectionType.END:
+                    break
+
+                index += 1
+                if section in sections:
+                    i = sections.index(section)
+                    if retSections[i] is None:
+                        end = self.d_sectionRows[index] \
+                              if index < len(self.d_sections) \
+                              else self.d_numRows
+                        retSections[i] = "\n".join(self._rows(row + 1, end))
+
+        if not any(retSections):
+            ret = None
+        else:
+            ret = retSections if requestedList else retSections[0]
+
+        self.d_extracted[key] = ret
+        return ret
+
+    def dataMembers(self, className):
+        """
+        Return the 'parseutil.MemberModel' of the DATA section of the
+        specified 'className', or 'None' if the class has no DATA section.
+        """
+        if className not in self.d_dataMembers:
+            data = self.extractClassSections(className, SectionType.DATA)
+            self.d_dataMembers[className] = \
+                   parseutil.memberModel(data) if data is not None else None
+
+        return self.d_dataMembers[className]
+
+    def classDefinitions(self):
+        """
+        Return a list of '(className, startRow, endRow)' tuples of the class
+        definitions, from the row of their class header to the row ending
+        the definition, or the row before the next class header if the
+        definition isn't ended.
+        """
+        ret = []
+        for index, (row, name, isDefinition) in \
+                                              enumerate(self.d_classHeaders):
+            if not isDefinition:
+                continue
+
+            limit = self.d_classRows[index + 1] \
+                    if index + 1 < len(self.d_classRows) \
+                    else self.d_numRows
+            endRow = limit - 1
+
+            sectionIndex = bisect.bisect_left(self.d_sectionRows, row + 2)
+            while sectionIndex < len(self.d_sections) and \
+                  self.d_sectionRows[sectionIndex] < limit:
+                if self.d_sections[sectionIndex][1] == SectionType.END:
+                    endRow = self.d_sectionRows[sectionIndex]
+                    break
+
+                sectionIndex += 1
+
+            ret.append((name, row, endRow))
+
+        return ret
+
+    def _rows(self, start, end):
+        """
+        Return the list of rows from the specified 'start' up to, but not
+        including, the specified 'end'.
+        """
+        if self.d_readRows is not None:
+            return self.d_readRows(start, end)
+
+        return self.d_lines[start:end]
+
+    def prepareClass(self, className):
+        """
+        Look up, ahead of time, the sections of the specified 'className' used
+        by the snippets: its parsed DATA members, and its declaration sections
+        both together, as 'DECLARATION_SECTIONS', and individually.
+        """
+        self.dataMembers(className)
+        self.extractClassSections(className, DECLARATION_SECTIONS)
+        for section in DECLARATION_SECTIONS:
+            self.extractClassSections(className, section)
+
+def _structureCacheFile(cacheDir, path):
+    """
+    Return the path of the file in the specified 'cacheDir' holding the
+    structure of the file at the specified absolute 'path'.
+    """
+    name = hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json"
+    return os.path.join(cacheDir, STRUCTURE_CACHE_DIR_NAME, name)
+
+def _fileRowReader(path, offsets):
+    """
+    Return a function taking a 'start' and 'end' row and returning the list
+    of rows of the file at the specified 'path' from 'start' up to, but not
+    including, 'end', where the specified 'offsets' maps each row that can be
+    a 'start' or an 'end' to the offset at which it starts in the file.
+    """
+    def readRows(start, end):
+        with open(path, "rb") as f:
+            f.seek(offsets[start])
+            data = f.read(offsets[end] - offsets[start])
+
+        return sourcefile.decodeSource(data).split("\n")[:end - start]
+
+    return readRows
+
+def _loadStructure(cacheFile, key, path):
+    """
+    Return the 'ClassStructure' of the file at the specified 'path' stored in
+    the specified 'cacheFile' if it was stored with the specified 'key', and
+    'None' otherwise.  The sections of the structure are read from 'path'
+    when they are looked up.
+    """
+    try:
+        with open(cacheFile) as f:
+            stored = json.load(f)
+
+        if stored["version"] != STRUCTURE_VERSION or \
+           stored["key"] != list(key):
+            return None
+
+        structure = ClassStructure([])
+        structure.d_numRows = stored["numRows"]
+        structure.d_classHeaders = [(row, str(name), isDefinition)
+                                    for row, name, isDefinition in
+                                                     stored["classHeaders"]]
+        structure.d_sections = [(row, section)
+                                for row, section in stored["sections"]]
+        offsets = dict((row, offset) for row, offset in stored["offsets"])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        # Missing or corrupt
+        return None
+
+    structure.d_classRows = [row for row, _, _ in structure.d_classHeaders]
+    structure.d_sectionRows = [row for row, _ in structure.d_sections]
+    structure.d_readRows = _fileRowReader(path, offsets)
+    return structure
+
+def _storeStructure(cacheFile, key, structure):
+    """
+    Store the rows of the headers of the specified 'structure', which was
+    built from the lines of a file, and the offsets in the file of the rows
+    bounding its sections, with the specified 'key' in the specified
+    'cacheFile', replacing it atomically.  Failures are ignored.
+    """
+    # Sections span from the row after their header to the next header or
+    # the end of the file
+    boundaries = set([structure.d_numRows])
+    for row in structure.d_sectionRows:
+        boundaries.update((row, row + 1))
+
+    offsets = []
+    offset = 0
+    for row, line in enumerate(structure.d_lines):
+        if row in boundaries:
+            offsets.append((row, offset))
+
+        offset += len(line) + 1
+
+    offsets.append((structure.d_numRows, offset))
+
+    cacheDir = os.path.dirname(cacheFile)
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+        fd, tempPath = tempfile.mkstemp(dir=cacheDir)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": STRUCTURE_VERSION,
+                       "key": list(key),
+                       "numRows": structure.d_numRows,
+                       "classHeaders": structure.d_classHeaders,
+                       "sections": structure.d_sections,
+                       "offsets": offsets},
+                      f)
+
+        os.rename(tempPath, cacheFile)
+    except (IOError, OSError):
+        pass
+
+def fileStructure(path, cacheDir=None):
+    """
+    Return the 'ClassStructure' of the file at the specified 'path', or
+    'None' if it can't be read.  The structure is cached in memory and, if
+    the optionally specified 'cacheDir' or the 'BDEFORMAT_CACHE_DIR'
+    environment variable names a directory, on disk, keyed by the path, size
+    and modification time of the file, so that the file is only scanned again
+    once it changes.  Structures loaded from disk read the sections looked up
+    from the file.  At most 'MAX_FILE_STRUCTURES' structures are kept in
+    memory.
+    """
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    mtime = sourcefile.mtimeNs(st)
+    key = (st.st_size, mtime)
+    cached = s_fileStructures.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    cacheDir = cacheDir or os.environ.get(bdeformatcache.CACHE_DIR_ENV)
+    cacheFile = _structureCacheFile(cacheDir, path) if cacheDir else None
+
+    structure = _loadStructure(cacheFile, key, path) if cacheFile else None
+    if structure is None:
+        try:
+            with open(path, "rb") as f:
+                text = sourcefile.decodeSource(f.read())
+        except IOError:
+            return None
+
+        lines = text.split("\n")
+        if lines[-1] == "":
+            # Like a buffer, the file has no row after its last newline
+            lines.pop()
+
+        structure = ClassStructure(lines)
+        if time.time() * 1e9 - mtime < sourcefile.RACY_INTERVAL_NS:
+            # The file might change again without its modification time
+            # changing, so the structure can't be cached
+            return structure
+
+        if cacheFile:
+            _storeStructure(cacheFile, key, structure)
+
+    if len(s_fileStructures) >= MAX_FILE_STRUCTURES:
+        s_fileStructures.clear()
+
+    s_fileStructures[path] = (key, structure)
+    return structure
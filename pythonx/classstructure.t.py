@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import classstructure
+import parseutil
+import sniputil
+from classstructure import ClassStructure
+from sectiontype import SectionType
+
+SOURCE = """\
+                               // =============
+                               // class Example
+                               // =============
+
+class Example {
+  private:
+    // DATA
+    int           d_myIntMember;
+    SomeClass    *d_otherPointer_p;  // held, not owned
+
+  public:
+    // CREATORS
+    Example(bslma::Allocator *basicAllocator = 0);
+
+    // MANIPULATORS
+    int& myIntMember();
+
+    // ACCESSORS
+    int myIntMember() const;
+};
+
+                               // -------------
+                               // class Example
+                               // -------------
+
+// MANIPULATORS
+int& Example::myIntMember()
+{
+}
+
+                                 // ==========
+                                 // struct Foo
+                                 // ==========
+
+struct Foo {
+    // PUBLIC DATA
+    int d_a;
+
+    // ACCESSORS
+};
+"""
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+        classstructure.s_fileStructures.clear()
+
+    def test_findClassHeader(self):
+        lines = SOURCE.split("\n")
+        structure = ClassStructure(lines)
+
+        def T(row, sections, expected):
+            self.assertEqual(structure.findClassHeader(row, sections),
+                             expected)
+
+            # Same as searching up with 'parseutil'
+            lineGen = (lines[r] for r in range(row, -1, -1))
+            self.assertEqual(parseutil.findClassHeader(lineGen,
+                                                       sections=sections),
+                             expected)
+
+        T(0, [], (None, None))
+        T(1, [], ("Example", None))
+        T(7, [], ("Example", None))
+        T(7, [SectionType.DATA], ("Example", SectionType.DATA))
+        T(16, [SectionType.DATA], ("Example", SectionType.DATA))
+        T(16,
+          [SectionType.DATA, SectionType.MANIPULATORS],
+          ("Example", SectionType.MANIPULATORS))
+        T(18,
+          [SectionType.MANIPULATORS],
+          ("Example", SectionType.MANIPULATORS))
+        T(25,
+          [SectionType.MANIPULATORS],
+          ("Example", SectionType.MANIPULATORS))
+        T(34, [SectionType.DATA], ("Foo", None))
+        T(37, [SectionType.DATA], ("Foo", SectionType.DATA))
+        T(39,
+          [SectionType.DATA, SectionType.ACCESSORS],
+          ("Foo", SectionType.ACCESSORS))
+
+    def test_extractClassSections(self):
+        lines = SOURCE.split("\n")
+        structure = ClassStructure(lines)
+
+        def T(className, sections, expected):
+            self.assertEqual(structure.extractClassSections(className,
+                                                            sections),
+                             expected)
+
+            # Cached
+            self.assertEqual(structure.extractClassSections(className,
+                                                            sections),
+                             expected)
+
+            # Same as 'parseutil'
+            self.assertEqual(parseutil.extractClassSections(iter(lines),
+                                                            className,
+                                                            sections),
+                             expected)
+
+        T("Example", SectionType.DATA, "\n".join(lines[7:10]))
+        T("Example", SectionType.CREATORS, "\n".join(lines[12:14]))
+        T("Example",
+          [SectionType.ACCESSORS,
+           SectionType.DATA,
+           SectionType.PRIVATE_CREATORS],
+          ["\n".join(lines[18:19]), "\n".join(lines[7:10]), None])
+        T("Foo", SectionType.DATA, "\n".join(lines[36:38]))
+        T("Foo", SectionType.ACCESSORS, None)
+        T("Foo", SectionType.MANIPULATORS, None)
+        T("Bar", SectionType.DATA, None)
+
+    def test_dataMembers(self):
+        structure = ClassStructure(SOURCE.split("\n"))
+        A = self.assertEqual
+
+        A(structure.dataMembers("Example").pairs(),
+          [("int", "d_myIntMember"), ("SomeClass *", "d_otherPointer_p")])
+        A(structure.dataMembers("Foo").pairs(), [("int", "d_a")])
+        A(structure.dataMembers("Bar"), None)
+        self.assertIs(structure.dataMembers("Example"),
+                      structure.dataMembers("Example"))
+
+    def test_classDefinitions(self):
+        structure = ClassStructure(SOURCE.split("\n"))
+        self.assertEqual(structure.classDefinitions(),
+                         [("Example", 1, 19), ("Foo", 31, 39)])
+
+        # Unterminated definitions end before the next class header
+        structure = ClassStructure(["// class A",
+                                    "// =======",
+                                    "class A {",
+                                    "",
+                                    "// class B",
+                                    "// =======",
+                                    "class B {"])
+        self.assertEqual(structure.classDefinitions(),
+                         [("A", 0, 3), ("B", 4, 6)])
+
+    def test_prepareClass(self):
+        structure = ClassStructure(SOURCE.split("\n"))
+        structure.prepareClass("Example")
+
+        # Only the cached results are used
+        structure.d_lines = []
+        A = self.assertEqual
+        A(structure.dataMembers("Example").pairs(),
+          [("int", "d_myIntMember"), ("SomeClass *", "d_otherPointer_p")])
+        A(structure.extractClassSections("Example",
+                                         SectionType.MANIPULATORS),
+          "    int& myIntMember();\n")
+        self.assertIsNotNone(structure.extractClassSections(
+                                        "Example",
+                                        classstructure.DECLARATION_SECTIONS))
+
+    def test_updated(self):
+        lines = SOURCE.split("\n")
+        structure = ClassStructure(lines)
+        structure.prepareClass("Example")
+        members = structure.dataMembers("Example")
+        A = self.assertEqual
+
+        self.assertIs(structure.updated(list(lines)), structure)
+
+        # Typing a snippet trigger on a new line in a function body reuses the
+        # headers and the lookups, and expanding the snippet finds the class
+        edited = lines[:25] + ["ctor"] + lines[25:]
+        updated = structure.updated(edited)
+        A(updated.d_lines, edited)
+        A(updated.findClassHeader(25), ("Example", None))
+        A(updated.findClassHeader(38, [SectionType.DATA]),
+          ("Foo", SectionType.DATA))
+        self.assertIs(updated.dataMembers("Example"), members)
+        A(updated.dataMembers("Foo").pairs(), [("int", "d_a")])
+        A(sniputil.genCtorMemSnippet(updated.dataMembers("Example"), ": "),
+          sniputil.genCtorMemSnippet(members, ": "))
+
+        retyped = updated.updated(edited[:25] + ["ctormem"] + edited[26:])
+        self.assertIs(retyped.dataMembers("Example"), members)
+
+        # Editing the definition of a class drops its lookups only
+        edited = list(lines)
+        edited[7] = "    long          d_myIntMember;"
+        updated = structure.updated(edited)
+        A(updated.dataMembers("Example").pairs(),
+          [("long", "d_myIntMember"), ("SomeClass *", "d_otherPointer_p")])
+        A(updated.extractClassSections("Example", SectionType.DATA),
+          "\n".join(edited[7:10]))
+
+        # Editing a header scans the lines again
+        edited = list(lines)
+        edited[36] = "    // DATA"
+        A(structure.updated(edited).findClassHeader(38, [SectionType.DATA]),
+          ("Foo", SectionType.DATA))
+        edited[36] = "    // CREATORS"
+        A(structure.updated(edited).extractClassSections("Foo",
+                                                         SectionType.DATA),
+          None)
+        for row in (16, 26):
+            edited = lines[:row] + lines[row + 1:]
+            A(structure.updated(edited).classDefinitions(),
+              ClassStructure(edited).classDefinitions())
+
+    def test_fileStructure(self):
+        path = os.path.join(self.tempDir, "example.h")
+        cacheDir = os.path.join(self.tempDir, "cache")
+        def write(text, mtime):
+            with open(path, "w") as f:
+                f.write(text)
+
+            os.utime(path, (mtime, mtime))
+
+        A = self.assertEqual
+        F = lambda: classstructure.fileStructure(path, cacheDir)
+
+        A(F(), None)
+
+        # Cached by size and modification time, in memory and on disk
+        write(SOURCE, 1000000)
+        structure = F()
+        A(structure.dataMembers("Foo").pairs(), [("int", "d_a")])
+        self.assertIs(F(), structure)
+
+        write(SOURCE.replace("d_a", "d_b"), 1000000)
+        self.assertIs(F(), structure)
+
+        # The headers are loaded from disk, but the sections are read from
+        # the file
+        classstructure.s_fileStructures.clear()
+        structure = F()
+        A(structure.d_lines, [])
+        A(structure.dataMembers("Foo").pairs(), [("int", "d_b")])
+
+        write(SOURCE.replace("d_a", "d_b"), 2000000)
+        A(F().dataMembers("Foo").pairs(), [("int", "d_b")])
+
+        write(SOURCE.replace("d_a", "d_abc"), 1000000)
+        A(F().dataMembers("Foo").pairs(), [("int", "d_abc")])
+
+        # Recently modified files aren't cached
+        os.utime(path, None)
+        structure = F()
+        A(structure.dataMembers("Foo").pairs(), [("int", "d_abc")])
+        self.assertIsNot(F(), structure)
+
+    def test_fileStructureDiskCache(self):
+        path = os.path.join(self.tempDir, "example.h")
+        cacheDir = os.path.join(self.tempDir, "cache")
+        with open(path, "w") as f:
+            f.write(SOURCE)
+        os.utime(path, (1000000, 1000000))
+
+        A = self.assertEqual
+        F = lambda: classstructure.fileStructure(path, cacheDir)
+        expected = ClassStructure(SOURCE.split("\n")[:-1])
+        sections = [SectionType.DATA, SectionType.MANIPULATORS]
+
+        F()
+        cacheFile = classstructure._structureCacheFile(cacheDir, path)
+        with open(cacheFile) as f:
+            stored = f.read()
+
+        # Only rows and offsets are stored, not the lines of the file
+        self.assertFalse("d_myIntMember" in stored)
+
+        # A structure loaded from disk reads the sections from the file
+        classstructure.s_fileStructures.clear()
+        structure = F()
+        A(structure.d_lines, [])
+        A(structure.classDefinitions(), expected.classDefinitions())
+        A(structure.findClassHeader(16, sections),
+          expected.findClassHeader(16, sections))
+        for className in ("Example", "Foo"):
+            A(structure.extractClassSections(className, sections),
+              expected.extractClassSections(className, sections))
+        A(structure.dataMembers("Foo").pairs(), [("int", "d_a")])
+
+        # Corrupt cache files are ignored
+        for content in ("garbage", '{"version": 0}', "[]"):
+            with open(cacheFile, "w") as f:
+                f.write(content)
+
+            classstructure.s_fileStructures.clear()
+            A(F().dataMembers("Foo").pairs(), [("int", "d_a")])
+
+    def test_fileStructureLimit(self):
+        saved = classstructure.MAX_FILE_STRUCTURES
+        classstructure.MAX_FILE_STRUCTURES = 2
+        try:
+            for name in ("a.h", "b.h", "c.h"):
+                path = os.path.join(self.tempDir, name)
+                with open(path, "w") as f:
+                    f.write(SOURCE)
+                os.utime(path, (1000000, 1000000))
+                classstructure.fileStructure(path)
+
+            self.assertEqual(len(classstructure.s_fileStructures), 1)
+        finally:
+            classstructure.MAX_FILE_STRUCTURES = saved
+
+if __name__ == "__main__":
+    unittest.main();
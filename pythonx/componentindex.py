@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""
+componentindex.py: Persistent index of the class definitions of source trees
+
+This module defines 'ComponentIndex', which maps the name of each class
+defined under a BDE class header ('// class Foo' followed by '// ====') in the
+C++ files of a set of source roots to the files and rows defining it, so that
+the snippets can find the sections of classes defined in any component, not
+just in the current file and its header.
+
+The index is persisted as JSON along with the size and modification time of
+each file, and updating it only rescans the files that changed since, in
+parallel if requested.  Single files, such as one just written, can be
+updated without looking at the rest of the tree, and the classes found are
+loaded from the rows the index records for them rather than by scanning
+their whole files.  It can be built or updated on the command line:
+
+    componentindex.py [--index <file>] [--jobs <n>] <root>...
+
+and the definitions of a class looked up with '--find <className>'.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import bdeformatcache
+import classstructure
+import sourcefile
+from classstructure import ClassStructure
+
+INDEX_VERSION = 1
+    # Version of the layout of the index file.  Index files with another
+    # version are ignored
+
+INDEX_FILE_NAME = "componentindex.json"
+    # Name of the index file in the 'bdeformatcache' directory
+
+SCAN_CHUNK_SIZE = 16
+    # Number of files handed to a worker process at a time
+
+def defaultIndexFile(cacheDir=None):
+    """
+    Return the path of the index file in the specified 'cacheDir', or in the
+    directory named by the 'BDEFORMAT_CACHE_DIR' environment variable if
+    'cacheDir' is not specified, or 'None' if neither names a directory.
+    """
+    cacheDir = cacheDir or os.environ.get(bdeformatcache.CACHE_DIR_ENV)
+    if not cacheDir:
+        return None
+
+    return os.path.join(cacheDir, INDEX_FILE_NAME)
+
+def scanFile(path):
+    """
+    Return a '(path, entry)' tuple where 'entry' is the
+    '[size, mtimeNs, definitions]' index entry of the file at the specified
+    'path', 'definitions' being the list returned by
+    'ClassStructure.classDefinitions', or '(path, None)' if the file can't be
+    read.  'mtimeNs' is 'None' if the file was modified too recently for its
+    modification time to be trusted.
+    """
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+    except (IOError, OSError):
+        return (path, None)
+
+    lines = sourcefile.decodeSource(data).split("\n")
+    definitions = [list(d) for d in ClassStructure(lines).classDefinitions()]
+
+    mtime = sourcefile.mtimeNs(st)
+    if time.time() * 1e9 - mtime < sourcefile.RACY_INTERVAL_NS:
+        mtime = None
+
+    return (path, [st.st_size, mtime, definitions])
+
+class ComponentIndex(object):
+    """
+    A persistent map from class name to the files and rows defining the
+    class.
+    """
+
+    def __init__(self, fileName=None):
+        """
+        Load the index from the optionally specified 'fileName' if it exists.
+        If 'fileName' is not specified, the index is not persisted.
+        """
+        self.d_fileName = fileName
+        self.d_files = {}
+            # Map from absolute path to '[size, mtimeNs, definitions]'
+
+        self.d_classes = None
+            # '(files, classes)' tuple where 'classes' maps each class name to
+            # the list of '(path, startRow, endRow)' of its definitions in the
+            # 'files', which is the 'd_files' it was built from when needed
+
+        self.d_modified = False
+
+        if fileName and os.path.exists(fileName):
+            try:
+                with open(fileName) as f:
+                    data = json.load(f)
+            except ValueError:
+                # Corrupt index.  Start over
+                data = None
+
+            if isinstance(data, dict) and \
+               data.get("version") == INDEX_VERSION:
+                self.d_files = data["files"]
+
+    def find(self, className):
+        """
+        Return the list of '(path, startRow, endRow)' tuples of the
+        definitions of the specified 'className', ordered by path.
+        """
+        files = self.d_files
+        if self.d_classes is None or self.d_classes[0] is not files:
+            classes = {}
+            for path in sorted(files):
+                for name, startRow, endRow in files[path][2]:
+                    classes.setdefault(name, []).append(
+                                                    (path, startRow, endRow))
+
+            self.d_classes = (files, classes)
+
+        return self.d_classes[1].get(className, [])
+
+    def isCurrent(self, path, st):
+        """
+        Return 'True' if the entry of the specified 'path' was made when the
+        file had the same size and modification time as in the specified
+        'os.stat' result 'st'.
+        """
+        entry = self.d_files.get(path)
+        return entry is not None and \
+               entry[0] == st.st_size and \
+               entry[1] == sourcefile.mtimeNs(st)
+
+    def classStructure(self, path, startRow, endRow):
+        """
+        Return the 'ClassStructure' of the rows from the specified 'startRow'
+        to the specified 'endRow' (inclusive) of the file at the specified
+        'path', which are a class definition returned by 'find', or, if the
+        file changed since it was indexed, the structure of the whole file
+        returned by 'classstructure.fileStructure'.  Return 'None' if the
+        file can't be read.
+        """
+        try:
+            st = os.stat(path)
+            if self.isCurrent(path, st):
+                with open(path, "rb") as f:
+                    return ClassStructure(list(itertools.islice(
+                                                   sourcefile.readLines(f),
+                                                   startRow,
+                                                   endRow + 1)))
+        except (IOError, OSError):
+            return None
+
+        return classstructure.fileStructure(path)
+
+    def updateFile(self, path):
+        """
+        Bring the entry of the file at the specified absolute 'path' up to
+        date, scanning the file again if it changed since it was indexed and
+        forgetting it if it no longer exists, without looking at any other
+        file.  Return 'True' if the file was scanned.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+
+        if st is not None and self.isCurrent(path, st):
+            return False
+
+        files = dict(self.d_files)
+        entry = scanFile(path)[1] if st is not None else None
+        if entry is None:
+            if files.pop(path, None) is None:
+                return False
+        else:
+            files[path] = entry
+
+        self.d_files = files
+        self.d_modified = True
+        return st is not None
+
+    def update(self, roots, jobs=1):
+        """
+        Bring the index up to date with the C++ files under the specified
+        'roots', which are files or directories, scanning the new and changed
+        files using the optionally specified 'jobs' processes, and forgetting
+        the files that are no longer found.  Return the number of files
+        scanned.
+        """
+        # The entries are updated in a copy, so that 'find' can be called
+        # from other threads meanwhile
+        files = dict(self.d_files)
+        modified = False
+
+        found = set()
+        toScan = []
+        for path in sourcefile.findSourceFiles(roots):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            found.add(path)
+            if not self.isCurrent(path, st):
+                toScan.append(path)
+
+        for path in list(files):
+            if path not in found:
+                del files[path]
+                modified = True
+
+        if jobs > 1 and len(toScan) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(toScan)))
+            try:
+                results = pool.map(scanFile, toScan, SCAN_CHUNK_SIZE)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [scanFile(path) for path in toScan]
+
+        for path, entry in results:
+            if entry is None:
+                files.pop(path, None)
+            else:
+                files[path] = entry
+
+            modified = True
+
+        if modified:
+            self.d_files = files
+            self.d_modified = True
+
+        return len(toScan)
+
+    def save(self):
+        """
+        Write this index to its file, if it has one and was modified.
+        """
+        if not self.d_fileName or not self.d_modified:
+            return
+
+        indexDir = os.path.dirname(self.d_fileName)
+        if indexDir and not os.path.isdir(indexDir):
+            os.makedirs(indexDir)
+
+        tmpName = self.d_fileName + ".tmp"
+        with open(tmpName, "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.d_files}, f)
+
+        os.rename(tmpName, self.d_fileName)
+        self.d_modified = False
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+              description="Index the class definitions of C++ source trees")
+    parser.add_argument("roots",
+                        nargs="+",
+                        help="files, or directories to search for files")
+    parser.add_argument("--index",
+                        help="index file (default: %s in $%s)" %
+                             (INDEX_FILE_NAME, bdeformatcache.CACHE_DIR_ENV))
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of files scanned in parallel (default: "
+                             "the number of CPUs)")
+    parser.add_argument("--find",
+                        metavar="CLASS",
+                        help="print the definitions of CLASS after updating "
+                             "the index")
+    args = parser.parse_args(argv)
+
+    fileName = args.index or defaultIndexFile()
+    if not fileName:
+        parser.error("no index file: use --index or set $%s" %
+                                                  bdeformatcache.CACHE_DIR_ENV)
+
+    index = ComponentIndex(fileName)
+    index.update(args.roots, args.jobs)
+    index.save()
+
+    if args.find:
+        definitions = index.find(args.find)
+        for path, startRow, endRow in definitions:
+            print("%s:%d-%d" % (path, startRow + 1, endRow + 1))
+
+        if not definitions:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
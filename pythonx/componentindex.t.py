@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import componentindex
+from componentindex import ComponentIndex
+
+HEADER = """\
+                               // =========
+                               // class Foo
+                               // =========
+
+class Foo {
+    // DATA
+    int d_a;
+};
+
+                               // ==========
+                               // struct Bar
+                               // ==========
+
+struct Bar {
+};
+"""
+
+SOURCE = """\
+                               // ---------
+                               // class Foo
+                               // ---------
+
+int Foo::a() const
+{
+}
+"""
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, "src")
+        os.makedirs(os.path.join(self.src, "sub"))
+        self.indexFile = os.path.join(self.dir, "index.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content, age=10):
+        path = os.path.join(self.src, name)
+        with open(path, "w") as f:
+            f.write(content)
+
+        # Make the modification time old enough to be trusted
+        mtime = os.stat(path).st_mtime - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_scanFile(self):
+        path = self.write("foo.h", HEADER)
+        self.assertEqual(componentindex.scanFile(path),
+                         (path, [len(HEADER),
+                                 componentindex.sourcefile.mtimeNs(
+                                                                os.stat(path)),
+                                 [["Foo", 1, 7], ["Bar", 10, 14]]]))
+
+        # Recently modified files are rescanned next time
+        path = self.write("bar.h", HEADER, age=0)
+        self.assertEqual(componentindex.scanFile(path)[1][1], None)
+
+        self.assertEqual(componentindex.scanFile(path + ".missing"),
+                         (path + ".missing", None))
+
+    def test_update(self):
+        header = self.write("sub/foo.h", HEADER)
+        self.write("foo.cpp", SOURCE)
+        self.write("notes.txt", HEADER)
+
+        index = ComponentIndex(self.indexFile)
+        A = self.assertEqual
+
+        A(index.find("Foo"), [])
+        A(index.update([self.src]), 2)
+        A(index.find("Foo"), [(header, 1, 7)])
+        A(index.find("Bar"), [(header, 10, 14)])
+        A(index.find("Baz"), [])
+
+        # Only changed files are scanned again
+        A(index.update([self.src]), 0)
+        other = self.write("bar.h", HEADER.replace("Foo", "Baz"))
+        A(index.update([self.src]), 1)
+        A(index.find("Bar"), [(other, 10, 14), (header, 10, 14)])
+        A(index.find("Baz"), [(other, 1, 7)])
+
+        # Persisted
+        index.save()
+        index = ComponentIndex(self.indexFile)
+        A(index.find("Bar"), [(other, 10, 14), (header, 10, 14)])
+        A(index.update([self.src]), 0)
+
+        # Removed files are forgotten
+        os.remove(other)
+        A(index.update([self.src]), 0)
+        A(index.find("Bar"), [(header, 10, 14)])
+        A(index.find("Baz"), [])
+
+        # Files of other versions are ignored
+        with open(self.indexFile, "w") as f:
+            f.write('{"version": 0, "files": {}}')
+        A(ComponentIndex(self.indexFile).update([self.src]), 2)
+
+        with open(self.indexFile, "w") as f:
+            f.write("not json")
+        A(ComponentIndex(self.indexFile).update([self.src]), 2)
+
+    def test_updateFile(self):
+        header = self.write("foo.h", HEADER)
+        other = self.write(os.path.join("sub", "bar.h"),
+                           HEADER.replace("Foo", "Qux"))
+
+        index = ComponentIndex(self.indexFile)
+        index.update([self.src])
+        index.save()
+
+        # Only the file given is looked at
+        self.assertEqual(index.updateFile(header), False)
+        os.remove(other)
+        self.write("foo.h", HEADER.replace("Bar", "Baz"))
+        self.assertEqual(index.updateFile(header), True)
+        self.assertEqual(index.find("Bar"), [(other, 10, 14)])
+        self.assertEqual(index.find("Baz"), [(header, 10, 14)])
+        self.assertEqual(index.find("Qux"), [(other, 1, 7)])
+
+        # Removed files are forgotten
+        self.assertEqual(index.updateFile(other), False)
+        self.assertEqual(index.find("Bar"), [])
+        self.assertEqual(index.find("Qux"), [])
+
+        index.save()
+        self.assertEqual(ComponentIndex(self.indexFile).find("Baz"),
+                         [(header, 10, 14)])
+
+    def test_classStructure(self):
+        header = self.write("foo.h", HEADER)
+        index = ComponentIndex()
+        index.update([self.src])
+
+        [(path, startRow, endRow)] = index.find("Foo")
+        structure = index.classStructure(path, startRow, endRow)
+        self.assertEqual(structure.d_lines,
+                         HEADER.split("\n")[startRow:endRow + 1])
+        self.assertEqual(structure.dataMembers("Foo").pairs(),
+                         [("int", "d_a")])
+
+        # A file changed since it was indexed is scanned again
+        self.write("foo.h", "\n" + HEADER)
+        structure = index.classStructure(path, startRow, endRow)
+        self.assertEqual(structure.dataMembers("Foo").pairs(),
+                         [("int", "d_a")])
+        self.assertEqual(structure.findClassHeader(8)[0], "Foo")
+
+        os.remove(header)
+        self.assertIs(index.classStructure(path, startRow, endRow), None)
+
+    def test_parallel(self):
+        paths = [self.write("foo%d.h" % i,
+                            HEADER.replace("Foo", "Foo%d" % i))
+                 for i in range(20)]
+
+        index = ComponentIndex()
+        self.assertEqual(index.update([self.src], jobs=4), 20)
+        self.assertEqual([index.find("Foo%d" % i) for i in range(20)],
+                         [[(path, 1, 7)] for path in paths])
+
+    def test_main(self):
+        header = self.write("foo.h", HEADER)
+        command = [sys.executable,
+                   "componentindex.py",
+                   "--index",
+                   self.indexFile,
+                   "--jobs",
+                   "2",
+                   self.src]
+
+        out = subprocess.check_output(command + ["--find", "Bar"],
+                                      universal_newlines=True)
+        self.assertEqual(out, "%s:11-15\n" % header)
+        self.assertTrue(os.path.exists(self.indexFile))
+
+        process = subprocess.Popen(command + ["--find", "Baz"],
+                                   stdout=subprocess.PIPE)
+        process.communicate()
+        self.assertEqual(process.returncode, 1)
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,115 @@
+"""
+formatstats.py: Latency statistics of recent formatting invocations
+
+This module defines 'FormatStats', a fixed size ring buffer of
+'FormatRecord's, which describe how long each phase of a formatting invocation
+took, and a report of the percentiles of these times and of the slowest
+recent invocations.  Recording is a single 'deque.append', so it can be left
+on all the time.
+"""
+
+import collections
+
+FormatRecord = collections.namedtuple("FormatRecord", ["location",
+                                                       "rows",
+                                                       "rowsRead",
+                                                       "read",
+                                                       "scan",
+                                                       "layout",
+                                                       "apply",
+                                                       "error"])
+    # The timing of one formatting invocation.  'location' is a
+    # '(name, row, col)' tuple of where it was invoked, 'rows' is the number of
+    # rows of the formatted block, or 'None' if it failed, in which case
+    # 'error' describes the problem, and 'rowsRead' is the number of rows read
+    # from the source.  'read', 'scan', 'layout' and 'apply' are the seconds
+    # spent reading the rows, finding the block boundaries, formatting the
+    # block and applying the result
+
+PHASES = ("read", "scan", "layout", "apply")
+    # The fields of 'FormatRecord' holding the time spent in each phase
+
+DEFAULT_MAX_RECORDS = 512
+    # Default number of invocations remembered
+
+def totalTime(record):
+    """
+    Return the total number of seconds taken by the invocation described by
+    the specified 'record'.
+    """
+    return record.read + record.scan + record.layout + record.apply
+
+def percentile(values, p):
+    """
+    Return the specified 'p'th percentile of the specified sorted non-empty
+    list of 'values', using the nearest rank.
+    """
+    rank = int(p / 100.0 * len(values) + 0.5)
+    return values[min(max(rank - 1, 0), len(values) - 1)]
+
+class FormatStats(object):
+    """
+    The 'FormatRecord's of the most recent formatting invocations.
+    """
+
+    def __init__(self, maxRecords=DEFAULT_MAX_RECORDS):
+        """
+        Create an object remembering the optionally specified 'maxRecords'
+        most recent invocations.
+        """
+        self.d_records = collections.deque(maxlen=maxRecords)
+
+    def record(self, record):
+        """
+        Remember the specified 'record', forgetting the oldest one if there
+        are already 'maxRecords'.
+        """
+        self.d_records.append(record)
+
+    def records(self):
+        """
+        Return the list of remembered records, oldest first.
+        """
+        return list(self.d_records)
+
+    def report(self, numSlowest=5):
+        """
+        Return a list of lines describing the 50th, 90th and 99th percentile
+        and maximum time of each phase and of the whole invocations, and the
+        optionally specified 'numSlowest' slowest invocations.
+        """
+        records = self.records()
+        if not records:
+            return ["No formatting recorded"]
+
+        numFailed = len([r for r in records if r.error is not None])
+        ret = ["%d invocations, %d failed" % (len(records), numFailed),
+               "%-8s %8s %8s %8s %8s" % ("ms", "p50", "p90", "p99", "max")]
+
+        columns = [(phase, lambda r, phase=phase: getattr(r, phase))
+                   for phase in PHASES]
+        columns.append(("total", totalTime))
+        for name, getTime in columns:
+            times = sorted(getTime(r) * 1000 for r in records)
+            ret.append("%-8s %8.2f %8.2f %8.2f %8.2f" % (name,
+                                                        percentile(times, 50),
+                                                        percentile(times, 90),
+                                                        percentile(times, 99),
+                                                        times[-1]))
+
+        ret.append("Slowest:")
+        slowest = sorted(records, key=totalTime, reverse=True)[:numSlowest]
+        for r in slowest:
+            name, row, col = r.location
+            line = "%8.2f ms  %s:%d:%d" % (totalTime(r) * 1000,
+                                          name,
+                                          row + 1,
+                                          col + 1)
+            if r.error is None:
+                line += "  %d rows, %d read" % (r.rows, r.rowsRead)
+            else:
+                line += "  failed: %s" % r.error
+
+            ret.append(line)
+
+        return ret
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import unittest
+
+import formatstats
+from formatstats import FormatRecord, FormatStats
+
+def R(ms, rows=3, error=None, name="foo.h"):
+    return FormatRecord(location=(name, 9, 4),
+                        rows=rows,
+                        rowsRead=64,
+                        read=ms / 4000.0,
+                        scan=ms / 4000.0,
+                        layout=ms / 4000.0,
+                        apply=ms / 4000.0,
+                        error=error)
+
+class TestDriver(unittest.TestCase):
+
+    def test_percentile(self):
+        P = formatstats.percentile
+        A = self.assertEqual
+
+        values = list(range(1, 101))
+        A(P(values, 50), 50)
+        A(P(values, 90), 90)
+        A(P(values, 99), 99)
+        A(P(values, 100), 100)
+        A(P(values, 0), 1)
+        A(P([7], 50), 7)
+        A(P([1, 2], 50), 1)
+        A(P([1, 2], 99), 2)
+
+    def test_ringBuffer(self):
+        stats = FormatStats(3)
+        for ms in range(5):
+            stats.record(R(ms))
+
+        self.assertEqual([formatstats.totalTime(r) * 1000
+                          for r in stats.records()],
+                         [2, 3, 4])
+
+    def test_report(self):
+        stats = FormatStats()
+        A = self.assertEqual
+
+        A(stats.report(), ["No formatting recorded"])
+
+        stats.record(R(4))
+        stats.record(R(8, rows=None, error="Can't find group/section",
+                       name="bar.cpp"))
+        stats.record(R(2))
+
+        report = stats.report(numSlowest=2)
+        A(report[0], "3 invocations, 1 failed")
+        A(report[1].split(), ["ms", "p50", "p90", "p99", "max"])
+        A(report[2].split(), ["read", "1.00", "2.00", "2.00", "2.00"])
+        A(report[6].split(), ["total", "4.00", "8.00", "8.00", "8.00"])
+        A(report[7], "Slowest:")
+        A(report[8:],
+          ["    8.00 ms  bar.cpp:10:5  failed: Can't find group/section",
+           "    4.00 ms  foo.h:10:5  3 rows, 64 read"])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -0,0 +1,115 @@
+"""
+linesource.py: Sources of lines of code to be formatted
+
+'bdeformatutil.formatBde' reads the code it formats through a 'lineSource',
+which is called with a row number and returns the text of that row.  This
+module defines the 'LineSource' protocol, which extends this with a
+'getRange' method returning many rows at once, and implementations of it that
+let the formatter read from vim buffers and files with a few bulk reads
+instead of one read per row.  'formatBde' searches for the boundaries of
+blocks in sources having 'getRange' by reading chunks of rows with it.
+"""
+
+class LineSource(object):
+    """
+    Protocol for the sources of lines passed to 'bdeformatutil.formatBde'.
+    Rows that are outside of the source, including negative rows, are empty.
+    """
+
+    def __call__(self, row):
+        """
+        Return the text of the specified 'row'.
+        """
+        return self.getRange(row, row + 1)[0]
+
+    def getRange(self, start, end):
+        """
+        Return a list of the text of the rows from the specified 'start' up
+        to, but not including, the specified 'end'.  Implementations must
+        provide this method.
+        """
+
+class ListLineSource(LineSource):
+    """
+    A 'LineSource' reading from a list of lines.
+    """
+
+    def __init__(self, lines):
+        """
+        Create a source reading from the specified 'lines'.
+        """
+        self.d_lines = lines
+
+    def __call__(self, row):
+        return self.d_lines[row] if 0 <= row < len(self.d_lines) else ""
+
+    def getRange(self, start, end):
+        padBefore = max(min(end, 0) - start, 0)
+        ret = [""] * padBefore + list(self.d_lines[max(start, 0):max(end, 0)])
+        return ret + [""] * (end - start - len(ret))
+
+class PrefetchingLineSource(LineSource):
+    """
+    A 'LineSource' that reads rows from an underlying range reading function
+    in aligned chunks, and caches them, so that scanning through the rows in
+    either direction only needs a read for every 'chunkSize' rows.
+    """
+
+    def __init__(self, fetchRange, numRows=None, chunkSize=64):
+        """
+        Create a source reading chunks of the optionally specified 'chunkSize'
+        rows using the specified 'fetchRange', which takes a 'start' and 'end'
+        row and returns a list of the rows from 'start' up to, but not
+        including, 'end', and may return fewer if the underlying source ends
+        before 'end'.  If the optionally specified 'numRows' is given, rows at
+        or after it are not read.
+        """
+        self.d_fetchRange = fetchRange
+        self.d_numRows = numRows
+        self.d_chunkSize = chunkSize
+        self.d_chunks = {}
+
+    def __call__(self, row):
+        if row < 0 or (self.d_numRows is not None and row >= self.d_numRows):
+            return ""
+
+        chunk = self._chunk(row // self.d_chunkSize)
+        offset = row % self.d_chunkSize
+        return chunk[offset] if offset < len(chunk) else ""
+
+    def getRange(self, start, end):
+        ret = []
+        row = start
+        while row < end:
+            if row < 0 or (self.d_numRows is not None and
+                           row >= self.d_numRows):
+                ret.append("")
+                row += 1
+                continue
+
+            # Take the rest of the range within the chunk of 'row'
+            index = row // self.d_chunkSize
+            offset = row - index * self.d_chunkSize
+            count = min(end - row, self.d_chunkSize - offset)
+            rows = self._chunk(index)[offset:offset + count]
+            ret += rows + [""] * (count - len(rows))
+            row += count
+
+        return ret
+
+    def _chunk(self, index):
+        """
+        Return the list of rows of the chunk with the specified 'index',
+        reading it if necessary.
+        """
+        chunk = self.d_chunks.get(index)
+        if chunk is None:
+            start = index * self.d_chunkSize
+            end = start + self.d_chunkSize
+            if self.d_numRows is not None:
+                end = min(end, self.d_numRows)
+
+            chunk = list(self.d_fetchRange(start, end))
+            self.d_chunks[index] = chunk
+
+        return chunk
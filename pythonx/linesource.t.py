@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import unittest
+
+import bdeformatutil
+import linesource
+from testsources import CTOR_ROW, DATA_END, DATA_START, SOURCE
+from testsources import FORMATTED_CTOR_LINES, FORMATTED_DATA_LINES
+
+class TestDriver(unittest.TestCase):
+
+    def test_listLineSource(self):
+        source = linesource.ListLineSource(["a", "b", "c"])
+        A = self.assertEqual
+
+        A(source(0), "a")
+        A(source(2), "c")
+        A(source(3), "")
+        A(source(-1), "")
+        A(source.getRange(0, 3), ["a", "b", "c"])
+        A(source.getRange(1, 5), ["b", "c", "", ""])
+        A(source.getRange(-2, 1), ["", "", "a"])
+        A(source.getRange(-3, -1), ["", ""])
+        A(source.getRange(4, 6), ["", ""])
+
+    def test_prefetchingLineSource(self):
+        lines = ["l%d" % i for i in range(10)]
+        fetches = []
+        def fetchRange(start, end):
+            fetches.append((start, end))
+            return lines[start:end]
+
+        source = linesource.PrefetchingLineSource(fetchRange, chunkSize=4)
+        A = self.assertEqual
+
+        A(source(5), "l5")
+        A(source(4), "l4")
+        A(source(7), "l7")
+        A(fetches, [(4, 8)])
+
+        A(source.getRange(2, 6), ["l2", "l3", "l4", "l5"])
+        A(fetches, [(4, 8), (0, 4)])
+
+        A(source(9), "l9")
+        A(source(11), "")
+        A(source(12), "")
+        A(source(-1), "")
+        A(fetches, [(4, 8), (0, 4), (8, 12), (12, 16)])
+
+        # Rows at or after 'numRows' are not read
+        del fetches[:]
+        source = linesource.PrefetchingLineSource(fetchRange, 10, 4)
+        A(source(9), "l9")
+        A(source(10), "")
+        A(fetches, [(8, 10)])
+
+        A(source.getRange(-1, 11), [""] + lines + [""])
+        A(fetches, [(8, 10), (0, 4), (4, 8)])
+
+    def test_formatBde(self):
+        lines = SOURCE.split("\n")
+        fetches = []
+        def fetchRange(start, end):
+            fetches.append((start, end))
+            return lines[start:end]
+
+        for source in (linesource.ListLineSource(lines),
+                       linesource.PrefetchingLineSource(fetchRange,
+                                                        len(lines))):
+            A = self.assertEqual
+            A(bdeformatutil.formatBde(source, DATA_START, 4),
+              ((DATA_START, DATA_END), FORMATTED_DATA_LINES))
+            A(bdeformatutil.formatBde(source, CTOR_ROW, 10),
+              ((CTOR_ROW, CTOR_ROW), FORMATTED_CTOR_LINES))
+
+        # The whole source fits in one chunk
+        A(fetches, [(0, len(lines))])
+
+    def test_formatBdeGetRange(self):
+        class RecordingSource(linesource.ListLineSource):
+            def __init__(self, lines):
+                linesource.ListLineSource.__init__(self, lines)
+                self.calls = []
+
+            def __call__(self, row):
+                self.calls.append(row)
+                return linesource.ListLineSource.__call__(self, row)
+
+            def getRange(self, start, end):
+                self.calls.append((start, end))
+                return linesource.ListLineSource.getRange(self, start, end)
+
+        # The boundaries of blocks are found by reading chunks of rows
+        chunk = bdeformatutil.SCAN_CHUNK_ROWS
+        padding = [""] * (2 * chunk)
+        lines = padding + SOURCE.split("\n") + padding
+        row = len(padding) + CTOR_ROW
+        source = RecordingSource(lines)
+        self.assertEqual(bdeformatutil.formatBde(source, row, 10),
+                         ((row, row), FORMATTED_CTOR_LINES))
+        self.assertEqual(source.calls, [(row, row + chunk)])
+
+        row = len(padding) + DATA_START
+        source = RecordingSource(lines)
+        self.assertEqual(bdeformatutil.formatBde(source, row, 4),
+                         ((row, row + DATA_END - DATA_START),
+                          FORMATTED_DATA_LINES))
+        self.assertEqual(source.calls, [(row, row + chunk),
+                                        (row - chunk, row)])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -5,6 +5,8 @@ tradition of regex
 
 import re
 
+import cancellation
+import profiling
 from functools import reduce
 from sectiontype import SectionType
 
@@ -32,6 +34,37 @@ def findSkippingGroups(line, pos, chars, direction):
     in the specified 'line', skipping sections surrounded by (), <>, or [].
     Return its position, or -1 if not found
     """
+    ret = _findSkippingGroups(line, pos, chars, direction)
+    if profiling.s_numActive:
+        _countExamined(line, pos, direction, ret)
+
+    return ret
+
+def _countExamined(line, pos, direction, found):
+    """
+    Add to the active profile, if any, the number of characters examined by
+    'findSkippingGroups' searching the specified 'line' from the specified
+    'pos' in the specified 'direction', which returned the specified 'found'.
+    """
+    profile = profiling.active()
+    if profile is None:
+        return
+
+    # The characters up to the one found, or to the end of the line, were
+    # examined
+    if found != -1:
+        end = found
+    else:
+        end = len(line) - 1 if direction > 0 else 0
+
+    examined = (end - pos) * direction + 1
+    profile.addCount("charactersExamined", max(examined, 0))
+
+def _findSkippingGroups(line, pos, chars, direction):
+    """
+    Implement 'findSkippingGroups', without profiling the characters
+    examined by the recursive calls skipping the groups.
+    """
 
     toFind = ""
     groupMap = ""
@@ -54,24 +87,25 @@ def findSkippingGroups(line, pos, chars, direction):
         if pos > 0 and line[pos] == '>' and line[pos-1] == '-':
             # Skip this character.
             pos += direction
-        elif line[pos] in chars:
+            continue
+
+        if line[pos] in chars:
             # Found one of the characters we're looking for
             return pos
-        else:
-            break
 
-    # We found an opening or closing character for a group.  Recursively call
-    # this function to skip over the group, and look for our character again
-    groupChar = groupMap[line[pos]]
+        # We found an opening or closing character for a group.  Recursively
+        # call this function to skip over the group, and look for our
+        # character again after it
+        groupChar = groupMap[line[pos]]
 
-    pos += direction
+        pos += direction
 
-    pos = findSkippingGroups(line, pos, groupChar, direction)
-    if pos == -1:
-        # No corresponding group character
-        return -1
+        pos = _findSkippingGroups(line, pos, groupChar, direction)
+        if pos == -1:
+            # No corresponding group character
+            return -1
 
-    return findSkippingGroups(line, pos + direction, chars, direction)
+        pos += direction
 
 def findOpen(line, pos):
     """
@@ -149,6 +183,8 @@ def determineElements(line, openClose):
     elements = []
     startPos = openClose[0] + 1
     while startPos < openClose[1]:
+        cancellation.check()
+
         # 's' will be the position to start search on first non-comment line
         s = startPos
 
@@ -225,13 +261,13 @@ def parseElement(element):
         nameStart += 1
 
     starsStart = nameStart - 1;
-    while element[starsStart] == '*' or element[starsStart] == ' ':
+    while starsStart >= 0 and element[starsStart] in "* ":
         starsStart -= 1
 
     starsStart += 1
 
     typeStart = 0
-    while element[typeStart] in " *":
+    while typeStart < len(element) and element[typeStart] in " *":
         typeStart += 1
 
     if typeStart < starsStart and element[typeStart] != '(':
@@ -325,6 +361,86 @@ def parseMembers(decl):
 
     return filter(lambda l: l != None, [parseMem(m) for m in mems.split("\n")])
 
+MAX_MEMBER_MODELS = 128
+    # Number of DATA sections whose 'MemberModel' is kept by 'memberModel'.
+    # The models are all dropped when the limit is reached
+
+s_memberModels = {}
+    # Map from the text of a DATA section to its 'MemberModel'
+
+class Member(object):
+    """
+    A member variable parsed from a DATA section, along with the properties
+    of it that the snippets need.
+    """
+
+    __slots__ = ("type", "name", "cleanName", "isPointer", "isAllocator")
+
+    def __init__(self, typeName, name):
+        """
+        Create a member variable of the specified 'typeName' and 'name'.  Its
+        'cleanName' is its name without the 'd_' prefix and the '_p' suffix,
+        or 'None' if it doesn't follow the BDE naming conventions.
+        """
+        if not hasattr(Member, "cleanNamePattern"):
+            Member.cleanNamePattern = re.compile(r'd_([^_]*)_?p?')
+
+        self.type = typeName
+        self.name = name
+
+        match = Member.cleanNamePattern.match(name)
+        self.cleanName = match.group(1) if match else None
+        self.isPointer = typeName.endswith("*")
+        self.isAllocator = typeName.replace(" ", "") == "bslma::Allocator*"
+
+    def __repr__(self):
+        return "Member(%r, %r)" % (self.type, self.name)
+
+class MemberModel(object):
+    """
+    The member variables of a DATA section, parsed once so that every snippet
+    generated from the section can share them.  Iterating over a model yields
+    its 'Member's in order.
+    """
+
+    __slots__ = ("d_members",)
+
+    def __init__(self, members=()):
+        """
+        Create a model of the optionally specified 'members', which are
+        'Member's or '(type, name)' tuples.
+        """
+        self.d_members = tuple(m if isinstance(m, Member) else Member(*m)
+                               for m in members)
+
+    def __iter__(self):
+        return iter(self.d_members)
+
+    def __len__(self):
+        return len(self.d_members)
+
+    def pairs(self):
+        """
+        Return the list of '(type, name)' tuples of the members of this
+        model, as returned by 'parseMembers'.
+        """
+        return [(m.type, m.name) for m in self.d_members]
+
+def memberModel(decl):
+    """
+    Return the 'MemberModel' of the specified member variable declaration
+    section 'decl'.  Sections are only parsed the first time they are seen.
+    """
+    model = s_memberModels.get(decl)
+    if model is None:
+        if len(s_memberModels) >= MAX_MEMBER_MODELS:
+            s_memberModels.clear()
+
+        model = MemberModel(parseMembers(decl))
+        s_memberModels[decl] = model
+
+    return model
+
 def parseFuncDeclaration(decl):
     """
     Parse the specified function declaration 'decl', which is a C++ member
@@ -382,6 +498,128 @@ def parseFuncDeclarations(decl):
     # in.  If a declaration fails to be parsed, leave it in the result verbatim
     return [parseFuncDeclaration(func) or func for func in funcs]
 
+TYPE_WORDS = frozenset(["bool", "char", "double", "float", "int", "long",
+                        "short", "signed", "unsigned", "void", "wchar_t"])
+    # Words that can only be a part of a type, which tell unnamed parameters
+    # such as 'unsigned int' apart from named ones
+
+def normalizeType(typeName):
+    """
+    Return the specified 'typeName' with its whitespace normalized, so that
+    different spellings of the same type compare equal.
+    """
+    typeName = " ".join(typeName.split())
+    return re.sub(r' ?([*&<>,()\[\]]) ?', r'\1', typeName)
+
+def normalizedSignature(funcName, parameters, suffix):
+    """
+    Return a hashable signature of the function with the specified
+    'funcName', taking the specified 'parameters', which include the opening
+    and closing parentheses, and followed by the specified 'suffix'.  The
+    signature only contains what tells overloads apart: the name, the types
+    of the parameters and whether the function is 'const', so that a
+    declaration and the definition of the same function have the same
+    signature regardless of the names and default values of the parameters,
+    whitespace and comments.
+    """
+    parameters = re.sub(r'//.*', '', parameters)
+
+    argTypes = []
+    for element in determineElements(parameters, (0, len(parameters) - 1)):
+        argType, argStars, argName, _, _, _ = parseElement(element)
+
+        # References are parsed as a part of the name if there is a space
+        # before the '&'
+        ref = re.match(r'&*', argName).group(0)
+        argName = argName[len(ref):]
+
+        words = argName.split()
+        if not argType or not words or words[-1] in TYPE_WORDS:
+            # The parameter is unnamed
+            argTypes.append(normalizeType(" ".join([argType,
+                                                    argStars + ref,
+                                                    argName])))
+        else:
+            argTypes.append(normalizeType(argType + argStars + ref))
+
+    if argTypes == ["void"]:
+        argTypes = []
+
+    isConst = "const" in re.findall(r'\w+', suffix)
+    return (" ".join(funcName.split()), tuple(argTypes), isConst)
+
+EXPRESSION_KEYWORDS = frozenset(["case", "co_await", "co_return", "co_yield",
+                                 "delete", "do", "else", "if", "new",
+                                 "return", "throw", "while"])
+    # Keywords that can precede a call of a static member function in a
+    # statement, unlike the return type of a definition
+
+def _canStartDefinition(text, pos):
+    """
+    Return 'True' if the function name qualified by its class name at the
+    specified 'pos' in the specified 'text' is preceded by the start of the
+    text, the end of a statement or block, or what can end a return type,
+    so that it can be a definition rather than a call in an expression.
+    """
+    i = pos - 1
+    while i >= 0 and text[i].isspace():
+        i -= 1
+
+    if i < 0 or text[i] in ";{}>*":
+        return True
+
+    if text[i] == "&":
+        # A reference return type, but not a logical and
+        return i == 0 or text[i - 1] != "&"
+
+    if text[i] == ":":
+        # A namespace qualifying the class name
+        return i > 0 and text[i - 1] == ":"
+
+    end = i + 1
+    while i >= 0 and (text[i].isalnum() or text[i] == "_"):
+        i -= 1
+
+    return end > i + 1 and text[i + 1:end] not in EXPRESSION_KEYWORDS
+
+def parseFuncDefinitions(text, className):
+    """
+    Return a list of '(name, parameters, suffix)' tuples of the definitions
+    of the member functions of the specified 'className' in the specified
+    'text', which is the source of a whole file, in order.  'parameters'
+    includes the opening and closing parenthesis, and 'suffix' is the text
+    between the closing parenthesis and the body or the initializer list.
+    Comments and preprocessor directives are ignored, and so are calls of
+    static member functions, for example in the condition of an 'if'.
+    """
+    text = re.sub(r'//.*', '', text)
+    text = re.sub(r'(?m)^\s*#.*', '', text)
+    pattern = re.compile(r'\b%s::\s*(operator\s*(?:\(\s*\)|[^\s(]+)|~?\w+)'
+                         r'\s*\(' % re.escape(className))
+
+    ret = []
+    for match in pattern.finditer(text):
+        cancellation.check()
+
+        if not _canStartDefinition(text, match.start()):
+            continue
+
+        openParen = match.end() - 1
+        closeParen = findSkippingGroups(text, openParen + 1, ")", 1)
+        if closeParen == -1:
+            continue
+
+        end = findNextOccurrence(text, closeParen + 1, "{;:", 1)
+        if end == -1 or text[end] == ";":
+            # Not a definition, but a call or a declaration
+            continue
+
+        ret.append((" ".join(match.group(1).split()),
+                    text[openParen:closeParen + 1],
+                    text[closeParen + 1:end].strip()))
+
+    return ret
+
 def findClassHeader(lineGen, onlyClassDef = False, sections = []):
     """
     Keep getting lines from the specified 'lineGen' generator, looking for
@@ -52,6 +52,10 @@ class TestDriver(unittest.TestCase):
         T("#a->b@cd", "a", -1)
         T("@a<b->c>#c", "c", 1)
 
+        # Many groups don't exhaust the stack
+        T("@" + "(a)" * 5000 + "#b", "b", 1)
+        T("#b" + "(a)" * 5000 + "@c", "b", -1)
+
     def test_findOpenClose(self):
         # Use '@' to indicate the position of the start of the search, and '#'
         # to indicate the 'open' and 'close' positions.  If '#' aren't in the
@@ -223,6 +227,35 @@ class TestDriver(unittest.TestCase):
                 ("volatile A*",   "d_d"),
                 ("const char *",  "d_e")])
 
+    def test_memberModel(self):
+        section = """int               d_a;     // comment
+                     bslma::Allocator *d_allocator_p;
+                     const char*       d_name_p;
+                     int               value;
+                  """
+        model = parseutil.memberModel(section)
+        self.assertIs(parseutil.memberModel(section), model)
+        self.assertEqual(len(model), 4)
+        self.assertEqual(model.pairs(),
+                         [("int", "d_a"),
+                          ("bslma::Allocator *", "d_allocator_p"),
+                          ("const char*", "d_name_p"),
+                          ("int", "value")])
+        self.assertEqual([(m.cleanName, m.isPointer, m.isAllocator)
+                          for m in model],
+                         [("a", False, False),
+                          ("allocator", True, True),
+                          ("name", True, False),
+                          (None, False, False)])
+
+        # Members are slotted records
+        self.assertRaises(AttributeError, setattr, model.d_members[0], "x", 1)
+
+        # Models can be built from already parsed members
+        self.assertEqual(parseutil.MemberModel(model.pairs()).pairs(),
+                         model.pairs())
+        self.assertEqual(len(parseutil.MemberModel()), 0)
+
     def test_parseFuncDeclaration(self):
         def T(s, expected):
             ret = parseutil.parseFuncDeclaration(s)
@@ -263,6 +296,85 @@ class TestDriver(unittest.TestCase):
           ])
 
 
+    def test_normalizedSignature(self):
+        S = parseutil.normalizedSignature
+        A = self.assertEqual
+
+        A(S("foo", "()", ";"), ("foo", (), False))
+        A(S("foo", "(void)", "const;"), ("foo", (), True))
+        A(S("foo", "(int a, const char *b = 0)", "const = 0;"),
+          ("foo", ("int", "const char*"), True))
+
+        # Declarations and definitions of the same function match
+        for params in ["(const Foo& a, bsl::map<int, int> *b)",
+                       "(const Foo &a, bsl::map<int,int>* b)",
+                       "(const  Foo & a,   // first\n"
+                       " bsl::map<int, int> *b = 0)",
+                       "(const Foo&, bsl::map<int, int> *)"]:
+            A(S("bar", params, ""),
+              ("bar", ("const Foo&", "bsl::map<int,int>*"), False))
+
+        A(S("baz", "(unsigned int)", ""), S("baz", "(unsigned int x)", ""))
+        A(S("baz", "(int)", ""), S("baz", "(int x)", ""))
+        self.assertNotEqual(S("baz", "(int x)", ""),
+                            S("baz", "(double x)", ""))
+        self.assertNotEqual(S("baz", "(int x)", "const"),
+                            S("baz", "(int x)", ""))
+
+    def test_parseFuncDefinitions(self):
+        text = """
+Foo::Foo(int a, double b)
+: d_a(a)
+{
+    Foo::helper(a);
+}
+
+Foo::~Foo()
+{
+}
+
+// ACCESSORS
+int Foo::get(const bsl::vector<int>& v,  // the values
+             int                     i) const
+{
+    return OtherFoo::get(v);
+}
+
+bool Foo::operator()(int x) const { return x; }
+
+int OtherFoo::get(int a)
+{
+    if (Foo::isValid(a)) {
+    }
+    else if (!Foo::isValid(a) && Foo::isValid(a + 1)) {
+    }
+    while (Foo::isValid(a)) {
+    }
+    bool b = Foo::isValid(a) ? Foo::isValid(1) : Foo::isValid(2);
+    return Foo::isValid(a)
+         ? Foo::make(a) : Foo::make(0);
+}
+
+#include "foo.h"
+const Foo& Foo::self() const
+{
+}
+
+bsl::vector<int> *ns::Foo::values()
+{
+}
+"""
+        self.assertEqual(parseutil.parseFuncDefinitions(text, "Foo"),
+          [("Foo", "(int a, double b)", ""),
+           ("~Foo", "()", ""),
+           ("get",
+            "(const bsl::vector<int>& v,  \n             int"
+            "                     i)",
+            "const"),
+           ("operator()", "(int x)", "const"),
+           ("self", "()", "const"),
+           ("values", "()", "")])
+
     def test_findClassHeader(self):
         def T(s, onlyClassDef, sections, expected):
             def gen():
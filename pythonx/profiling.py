@@ -0,0 +1,132 @@
+"""
+profiling.py: Phase timings and work counters of formatting
+
+This module defines 'Profile', which receives the time spent in each phase of
+formatting a block and counters of the work done in them.  The formatting
+entry points in 'bdeformatutil' take an optional 'Profile', which they make
+the active profile of the calling thread with 'activate' while they run, as
+'cancellation.activate' does for deadlines.  Each phase looks up the active
+profile once with 'active', and only reads the clock and counts when there is
+one.  'active' and the counting of the characters examined by
+'findSkippingGroups' first check 's_numActive', so that formatting while no
+profile is active on any thread only costs a read of a global per call.
+
+The phases are:
+
+    scan       finding the boundaries of the block around a position
+    parse      splitting the block into elements and parsing them
+    align      aligning the parsed elements
+    comments   searching for the comment width giving the fewest lines
+
+and the counters:
+
+    rowsScanned          rows looked at to find the boundaries of blocks
+    elementsParsed       elements parsed
+    commentWidthsTried   comment widths laid out by the width search
+    charactersExamined   characters examined by 'findSkippingGroups'
+
+Subclasses of 'Profile' can override 'addTime' and 'addCount' to receive each
+measurement as it is made instead.
+"""
+
+import contextlib
+import threading
+
+PHASES = ("scan", "parse", "align", "comments")
+    # The phases of formatting, in the order they run
+
+COUNTERS = ("rowsScanned",
+            "elementsParsed",
+            "commentWidthsTried",
+            "charactersExamined")
+    # The counters of the work done by formatting
+
+s_active = threading.local()
+    # The 'profile' attribute is the profile active on the thread, if any
+
+s_numActive = 0
+    # Number of 'activate' contexts entered with a profile on all threads
+
+s_numActiveLock = threading.Lock()
+    # Lock protecting 's_numActive'
+
+class Profile(object):
+    """
+    The total time spent in each phase of formatting and the totals of the
+    counters, over all the formatting done while it was active.
+    """
+
+    def __init__(self):
+        self.d_seconds = dict((phase, 0.0) for phase in PHASES)
+        self.d_counts = dict((counter, 0) for counter in COUNTERS)
+
+    def addTime(self, phase, seconds):
+        """
+        Add the specified 'seconds' to the time spent in the specified
+        'phase'.
+        """
+        self.d_seconds[phase] += seconds
+
+    def addCount(self, counter, count):
+        """
+        Add the specified 'count' to the specified 'counter'.
+        """
+        self.d_counts[counter] += count
+
+    def seconds(self, phase):
+        """
+        Return the number of seconds spent in the specified 'phase'.
+        """
+        return self.d_seconds[phase]
+
+    def count(self, counter):
+        """
+        Return the value of the specified 'counter'.
+        """
+        return self.d_counts[counter]
+
+    def report(self):
+        """
+        Return the lines of a report of the time spent in each phase and of
+        the counters.
+        """
+        ret = ["%-20s %10.3f ms" % (phase, self.d_seconds[phase] * 1000)
+               for phase in PHASES]
+        ret += ["%-20s %10d" % (counter, self.d_counts[counter])
+                for counter in COUNTERS]
+        return ret
+
+@contextlib.contextmanager
+def activate(profile):
+    """
+    Return a context manager making the specified 'profile' the active
+    profile of the calling thread while it's entered.  If 'profile' is
+    'None', the active profile is left as it is.
+    """
+    if profile is None:
+        yield
+        return
+
+    global s_numActive
+
+    with s_numActiveLock:
+        s_numActive += 1
+
+    previous = getattr(s_active, "profile", None)
+    s_active.profile = profile
+    try:
+        yield
+    finally:
+        s_active.profile = previous
+        with s_numActiveLock:
+            s_numActive -= 1
+
+def active():
+    """
+    Return the active profile of the calling thread, or 'None' if there is
+    none.
+    """
+    if not s_numActive:
+        return None
+
+    return getattr(s_active, "profile", None)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+
+import bdeformatcache
+import bdeformatutil
+import linesource
+import parseutil
+import profiling
+from profiling import Profile
+from testsources import LINES
+
+class RecordingProfile(Profile):
+    def __init__(self):
+        Profile.__init__(self)
+        self.events = []
+
+    def addTime(self, phase, seconds):
+        Profile.addTime(self, phase, seconds)
+        self.events.append(phase)
+
+class TestDriver(unittest.TestCase):
+
+    def test_profile(self):
+        profile = Profile()
+        profile.addTime("scan", 0.5)
+        profile.addTime("scan", 0.25)
+        profile.addCount("rowsScanned", 3)
+
+        self.assertEqual(profile.seconds("scan"), 0.75)
+        self.assertEqual(profile.seconds("align"), 0.0)
+        self.assertEqual(profile.count("rowsScanned"), 3)
+        self.assertEqual(profile.count("elementsParsed"), 0)
+
+        report = profile.report()
+        self.assertEqual(len(report),
+                         len(profiling.PHASES) + len(profiling.COUNTERS))
+        self.assertEqual(report[0].split(), ["scan", "750.000", "ms"])
+
+    def test_activate(self):
+        outer = Profile()
+        inner = Profile()
+
+        self.assertIs(profiling.active(), None)
+        self.assertEqual(profiling.s_numActive, 0)
+        with profiling.activate(outer):
+            self.assertIs(profiling.active(), outer)
+            with profiling.activate(None):
+                self.assertIs(profiling.active(), outer)
+                self.assertEqual(profiling.s_numActive, 1)
+
+            with profiling.activate(inner):
+                self.assertIs(profiling.active(), inner)
+                self.assertEqual(profiling.s_numActive, 2)
+
+            self.assertIs(profiling.active(), outer)
+
+        self.assertIs(profiling.active(), None)
+        self.assertEqual(profiling.s_numActive, 0)
+
+        # The profile is only active on the thread that activated it
+        seen = []
+        with profiling.activate(outer):
+            thread = threading.Thread(
+                              target=lambda: seen.append(profiling.active()))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(seen, [None])
+
+    def test_findSkippingGroups(self):
+        profile = Profile()
+        line = "f(a, g(b, c), d); e"
+        with profiling.activate(profile):
+            self.assertEqual(parseutil.findSkippingGroups(line, 2, ";", 1),
+                             16)
+            self.assertEqual(profile.count("charactersExamined"), 15)
+
+            # Not found: the rest of the line is examined
+            self.assertEqual(parseutil.findSkippingGroups(line, 17, "x", 1),
+                             -1)
+            self.assertEqual(profile.count("charactersExamined"), 17)
+
+            self.assertEqual(parseutil.findSkippingGroups(line, 11, "(", -1),
+                             1)
+            self.assertEqual(profile.count("charactersExamined"), 28)
+
+    def test_formatBde(self):
+        source = linesource.ListLineSource(LINES)
+
+        # Block
+        profile = RecordingProfile()
+        result = bdeformatutil.formatBde(source, 6, 10, profile=profile)
+        self.assertEqual(result,
+                         bdeformatutil.formatBde(source, 6, 10))
+        self.assertEqual(profile.events, ["scan", "parse", "align",
+                                          "comments"])
+        self.assertEqual(profile.count("rowsScanned"), 1)
+        self.assertEqual(profile.count("elementsParsed"), 4)
+        self.assertTrue(profile.count("commentWidthsTried") > 0)
+        self.assertTrue(profile.count("charactersExamined") > len(LINES[6]))
+        self.assertIs(profiling.active(), None)
+
+        # Section
+        profile = RecordingProfile()
+        bdeformatutil.formatBde(source, 2, 4, profile=profile)
+        self.assertEqual(profile.events, ["scan", "parse", "align",
+                                          "comments"])
+        self.assertEqual(profile.count("rowsScanned"), 5)
+        self.assertEqual(profile.count("elementsParsed"), 2)
+
+        # The scan is profiled even when it fails
+        profile = RecordingProfile()
+        self.assertRaises(ValueError,
+                          bdeformatutil.formatBde,
+                          linesource.ListLineSource(["int a;"] * 400),
+                          200,
+                          0,
+                          profile=profile)
+        self.assertEqual(profile.events, ["scan"])
+        self.assertEqual(profile.count("rowsScanned"),
+                         bdeformatutil.MAX_SECTION_ROWS + 1)
+
+        # Cached blocks aren't laid out again
+        cache = bdeformatcache.MemoryCache()
+        bdeformatutil.formatBde(source, 6, 10, cache)
+        profile = RecordingProfile()
+        bdeformatutil.formatBde(source, 6, 10, cache, profile=profile)
+        self.assertEqual(profile.events, ["scan"])
+
+    def test_formatBdeLines(self):
+        profile = RecordingProfile()
+        lines = list(bdeformatutil.formatBdeLines(LINES, profile=profile))
+        self.assertEqual(lines, list(bdeformatutil.formatBdeLines(LINES)))
+        self.assertEqual(profile.events, ["parse", "align", "comments"])
+        self.assertEqual(profile.count("elementsParsed"), 2)
+
+        profile = RecordingProfile()
+        bdeformatutil.formatBdeRanges(LINES, [(2, 2)], profile=profile)
+        self.assertEqual(profile.events, ["scan", "parse", "align",
+                                          "comments"])
+
+if __name__ == "__main__":
+    unittest.main();
@@ -5,36 +5,231 @@ This module defines functions that are used to generate UltiSnip snippets for
 various BDE-style portions of C++.
 """
 
+import ast
 import bdeformatutil
 import parseutil
 import re
 import textwrap
 
+MAX_RENDER_PASSES = 8
+    # Maximum number of times 'renderSnippet' evaluates a snippet waiting for
+    # the values of its tabstops to settle
+
+TRANSFORMATION_SPECIAL_CHARS = re.compile(r'[\\/$(){}`]')
+    # Characters that have a meaning in the replacement of an UltiSnips
+    # transformation, or end it
+
 s_commentTextwrap = textwrap.TextWrapper()
 s_commentTextwrap.width = 79
 s_commentTextwrap.initial_indent = "        // "
 s_commentTextwrap.subsequent_indent = s_commentTextwrap.initial_indent
 
+def parsedMembers(memberDefs):
+    """
+    Return the 'parseutil.MemberModel' of the member variables in the
+    specified 'memberDefs', which is either the text of a member variable
+    definition section, a model of its already parsed members, for example
+    from 'classstructure.ClassStructure.dataMembers', or a list of their
+    '(type, name)' tuples.
+    """
+    if memberDefs is None:
+        return parseutil.MemberModel()
+
+    if isinstance(memberDefs, parseutil.MemberModel):
+        return memberDefs
+
+    if isinstance(memberDefs, list):
+        return parseutil.MemberModel(memberDefs)
+
+    return parseutil.memberModel(memberDefs)
+
+def snipCondition(snipNum, whenNotEmpty=True):
+    """
+    Return the Python expression, for use in a snippet interpolation, that is
+    true when the content of each of the specified 'snipNum' tabstops, which
+    is either a tabstop number or a list of them, isn't empty, or if the
+    optionally specified 'whenNotEmpty' is 'False', when all of them are
+    empty.  The expression only tests the tabstops, so that it stays cheap to
+    evaluate on every keystroke.
+    """
+
+    if not isinstance(snipNum, list):
+        snipNum = [snipNum]
+
+    tabStops = ["t[%d]" % num for num in snipNum]
+    if whenNotEmpty:
+        return " and ".join(tabStops)
+
+    return "not (%s)" % " or ".join(tabStops)
+
+def _pythonLiteral(text):
+    """
+    Return the Python string literal of the specified 'text' for use in a
+    snippet interpolation, which has no backtick, as a backtick would end the
+    interpolation.
+    """
+    return repr(text).replace("`", "\\x60")
+
 def snipOptional(snipNum, text, expandWhenNotEmpty = True):
     """
     Return a snippet string that will have the specified 'text' depending on
     whether the content of the specified 'snipNum' snippet tabstop isn't
-    empty, as determined by the specified 'expandWhenNotEmpty'.
+    empty, as determined by the specified 'expandWhenNotEmpty'.  The text
+    shown when a single tabstop isn't empty is a transformation of that
+    tabstop, which, unlike a Python interpolation, costs no Python code to
+    run on every keystroke.
     """
 
     if not text or len(text) == 0:
         return "";
 
-    if not isinstance(snipNum, list):
-        snipNum = [snipNum]
+    if not isinstance(snipNum, list) and expandWhenNotEmpty and \
+                              not TRANSFORMATION_SPECIAL_CHARS.search(text):
+        # Replace the whole content of the tabstop, if any, with 'text'
+        return "${%d/.+/%s/}" % (snipNum, text)
+
+    return snipChoice(snipNum, text, "", expandWhenNotEmpty)
+
+def snipChoice(snipNum, textWhenNotEmpty, textWhenEmpty, whenNotEmpty=True):
+    """
+    Return a snippet string that will have the specified 'textWhenNotEmpty'
+    if the content of the specified 'snipNum' snippet tabstop isn't empty, and
+    the specified 'textWhenEmpty' otherwise.  This is equivalent to, but
+    cheaper than, the two corresponding 'snipOptional' strings.  If the
+    optionally specified 'whenNotEmpty' is 'False', the condition is
+    reversed as in 'snipCondition'.  The texts can contain any character.
+    """
+
+    return "`!p snip.rv = %s if %s else %s`" % (
+                                       _pythonLiteral(textWhenNotEmpty),
+                                       snipCondition(snipNum, whenNotEmpty),
+                                       _pythonLiteral(textWhenEmpty))
+
+def _evaluateChoice(code, values):
+    """
+    Return the value the specified 'code' of an interpolation generated by
+    'snipChoice' assigns to 'snip.rv' given the specified 'values' of the
+    tabstops, without running it.  Throw a 'ValueError' if 'code' wasn't
+    generated by 'snipChoice'.
+    """
+    if not hasattr(_evaluateChoice, "pattern"):
+        literal = r"""(u?(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"))"""
+        _evaluateChoice.pattern = re.compile(
+                          r'snip\.rv = %s if (not \()?([t\[\]\d andor]+)\)?'
+                          r' else %s$' % (literal, literal),
+                          re.DOTALL)
+
+    match = _evaluateChoice.pattern.match(code)
+    if match is None:
+        raise ValueError("Unsupported interpolation: %s" % code)
+
+    whenNotEmpty, negated, condition, whenEmpty = match.groups()
+    tabStops = [values.get(int(number), "")
+                for number in re.findall(r'\d+', condition)]
+    isTrue = not any(tabStops) if negated else all(tabStops)
+    return ast.literal_eval(whenNotEmpty if isTrue else whenEmpty)
+
+def _parseSnippet(snippet, pos=0, inTabStop=False):
+    """
+    Return a '(nodes, pos)' tuple of the list of nodes parsed from the
+    specified UltiSnips 'snippet' starting at the optionally specified 'pos',
+    up to the end of the tabstop the text is in if the optionally specified
+    'inTabStop' is 'True', and the position after them.  Each node is either
+    a string of text, a '("tabstop", number, nodes)', '("mirror", number)',
+    '("transformation", number, regex, replacement, options)' or
+    '("python", code)' tuple.
+    """
+    if not hasattr(_parseSnippet, "pattern"):
+        _parseSnippet.pattern = re.compile(
+                         r'\$\{(\d+):|\$\{(\d+)\}|\$(\d+)|`!p (.*?)`|'
+                         r'\$\{(\d+)/((?:\\.|[^\\/])*)/([^/]*)/(\w*)\}|(\})',
+                         re.DOTALL)
+
+    nodes = []
+    while pos < len(snippet):
+        match = _parseSnippet.pattern.search(snippet, pos)
+        if match is None:
+            nodes.append(snippet[pos:])
+            pos = len(snippet)
+            break
 
-    op = ">" if not expandWhenNotEmpty else "=="
-    innerCondition = "filter(lambda x: x %s 0, [len(t[num]) for num in %s])" \
-            % (">" if not expandWhenNotEmpty else "==",
-               str(snipNum))
+        if match.start() > pos:
+            nodes.append(snippet[pos:match.start()])
+
+        pos = match.end()
+        (tabStop, emptyTabStop, mirror, code,
+         transformed, regex, replacement, options, close) = match.groups()
+        if tabStop is not None:
+            children, pos = _parseSnippet(snippet, pos, True)
+            nodes.append(("tabstop", int(tabStop), children))
+        elif emptyTabStop is not None:
+            nodes.append(("tabstop", int(emptyTabStop), []))
+        elif mirror is not None:
+            nodes.append(("mirror", int(mirror)))
+        elif code is not None:
+            nodes.append(("python", code))
+        elif transformed is not None:
+            nodes.append(("transformation",
+                          int(transformed),
+                          regex,
+                          replacement,
+                          options))
+        elif inTabStop:
+            break
+        else:
+            nodes.append(close)
 
-    return "`!p snip.rv = \"\"\"%s\"\"\" if len(list(%s)) == 0 else ''`" \
-                                                       % (text, innerCondition)
+    return (nodes, pos)
+
+def renderSnippet(snippet):
+    """
+    Return the plain text the specified UltiSnips 'snippet' expands to if the
+    default values of all its tabstops are kept: tabstops are replaced by
+    their default value, mirrors by the value of the tabstop they mirror,
+    and transformations and Python interpolations, such as the ones generated
+    by 'snipOptional', are evaluated with these values.  Only the
+    transformations with a literal replacement and the interpolations
+    generated by this module are supported, and the interpolations are
+    interpreted rather than run, so that the text of a header can't inject
+    code.  Throw a 'ValueError' for other interpolations.
+    """
+
+    def render(nodes, values, newValues):
+        ret = []
+        for node in nodes:
+            if not isinstance(node, tuple):
+                ret.append(node)
+            elif node[0] == "tabstop":
+                text = render(node[2], values, newValues)
+                newValues[node[1]] = text
+                ret.append(text)
+            elif node[0] == "mirror":
+                ret.append(values.get(node[1], ""))
+            elif node[0] == "transformation":
+                _, number, regex, replacement, options = node
+                ret.append(re.sub(regex,
+                                  lambda match: replacement,
+                                  values.get(number, ""),
+                                  count=0 if "g" in options else 1,
+                                  flags=re.DOTALL))
+            else:
+                ret.append(_evaluateChoice(node[1], values))
+
+        return "".join(ret)
+
+    # Interpolations and mirrors can refer to tabstops that come after them,
+    # so render until the values of the tabstops don't change
+    nodes = _parseSnippet(snippet)[0]
+    values = {}
+    for i in range(MAX_RENDER_PASSES):
+        newValues = {}
+        text = render(nodes, values, newValues)
+        if newValues == values:
+            break
+
+        values = newValues
+
+    return text
 
 def genTabStop(tabStopNum, defaultVal=None, pre=None, post=None):
     """
@@ -70,9 +265,9 @@ def genCctorSnippet(classname, memberDefs):
 
     snipNum = 3
     separator = ": "
-    for typeName, mem in parseutil.parseMembers(memberDefs):
+    for member in parsedMembers(memberDefs):
         snipLine = separator
-        snipLine += mem + "(other." + mem
+        snipLine += member.name + "(other." + member.name
         snipLine += genTabStop(snipNum, "$2", pre=", ")
         snipLine += ")"
         lines.append(snipLine)
@@ -94,9 +289,9 @@ def genCtorMemSnippet(memberDefs, separator):
 
     lines = []
     snipNum = 1
-    for typeName, mem in parseutil.parseMembers(memberDefs):
+    for member in parsedMembers(memberDefs):
         snipLine = separator
-        snipLine += mem + ("($%d" % snipNum)
+        snipLine += member.name + ("($%d" % snipNum)
         snipLine += ")"
         lines.append(snipLine)
 
@@ -133,26 +328,24 @@ def genCtorInitializerList(className, argTypes, memberDefs, snipNum):
     lines = []
 
     separator = ": "
-    for typeName, mem in parseutil.parseMembers(memberDefs):
+    for member in parsedMembers(memberDefs):
         snipLine = separator
         separator = ", "
-        snipLine += mem + "("
+        snipLine += member.name + "("
 
         # Figure out what the default arg should be
         defArg = None
 
         genAllocTabStop = True
-        if allocName and typeName  == "bslma::Allocator *":
+        if allocName and member.isAllocator:
             defArg = "bslma::Default::allocator(%s)" % allocName
             genAllocTabStop = False
 
         if not defArg and cctorOtherArg:
-            defArg = "%s.%s" % (cctorOtherArg, mem)
+            defArg = "%s.%s" % (cctorOtherArg, member.name)
 
-        if not defArg:
-            cleanNameMatch = re.match(r'd_([^_]*)_?p?', mem)
-            if cleanNameMatch and cleanNameMatch.group(1) in argTypes:
-                defArg = cleanNameMatch.group(1)
+        if not defArg and member.cleanName in argTypes:
+            defArg = member.cleanName
 
         argSnip = snipNum
         snipNum += 1
@@ -173,61 +366,61 @@ def genDefSnippet(classname, decls, inHeader, memberDefs="", snipNum=1):
     """
     Generate a snippet for the definitions of the specified 'decls' of the
     specified 'classname' with the specified 'memberDefs' member variable
-    declarations.  If the specified 'inHeader' is 'True', prepend
-    each definition with an 'inline'.
+    declarations.  'decls' is either the text of a function declaration
+    section or a list of its already parsed declarations, as returned by
+    'parseutil.parseFuncDeclarations'.  If the specified 'inHeader' is
+    'True', prepend each definition with an 'inline'.
     """
 
-    parsedMembers = parseutil.parseFuncDeclarations(decls)
+    parsedMembers = decls if isinstance(decls, list) \
+                    else parseutil.parseFuncDeclarations(decls)
 
-    # Generate the snippet, with a tab stop inside of each function
-    snipLines = []
+    # Parse out the args of every declaration, so that they're all laid out
+    # in one call
+    declarations = []
+    argTypesList = []
     for mem in parsedMembers:
-        if inHeader:
-            snipLines.append("inline")
-
         if not isinstance(mem, tuple):
-            snipLines.append(mem)
             continue
 
-        # Parse out the args
         (funcRetType, funcName, argsStr, funcSuffix) = mem
         declArgsList = parseutil.determineElements(
                                                   argsStr, (0, len(argsStr)-1))
 
         parsedArgs = parseutil.fixParsedElements(
                              [parseutil.parseElement(e) for e in declArgsList])
-        argTypes = {argName: argType + argStars \
-                       for (argType, argStars, argName, _, _, _) in parsedArgs}
+        argTypesList.append({argName: argType + argStars \
+                    for (argType, argStars, argName, _, _, _) in parsedArgs})
 
         # Clean up the suffix
         funcSuffix = re.sub(r';', '', funcSuffix)
         funcSuffix = re.sub(r'=\s*0', '', funcSuffix)
         funcSuffix = funcSuffix.strip()
 
-        # Gen the snippet
-        declText = funcRetType
-        if len(funcRetType) > 0 and funcRetType[-1] != "*":
-            declText += " "
+        # Without the default values of the arguments
+        declArgs = [(argType, argStars, argName, "", "", "")
+                    for (argType, argStars, argName, _, _, _) in parsedArgs]
+        declarations.append((funcRetType,
+                             classname + "::" + funcName,
+                             declArgs,
+                             funcSuffix))
 
-        declText += classname + "::" + funcName + "("
-        insideParenPos = len(declText)
-        for (argType, argStars, argName, _, _, _) in parsedArgs:
-            declText += argType + " " + argStars + " " + argName + ","
-        if len(parsedArgs) > 0:
-            declText = declText[:-1] # Remove trailing ,
+    declLines = iter(bdeformatutil.formatDeclarations(declarations))
+    argTypesList = iter(argTypesList)
 
-        declText += ")"
-        if len(funcSuffix) > 0:
-            declText += " " + funcSuffix
+    # Generate the snippet, with a tab stop inside of each function
+    snipLines = []
+    for mem in parsedMembers:
+        if inHeader:
+            snipLines.append("inline")
 
-        if argsStr != "()":
-            def lineSource(lineNum):
-                return declText if lineNum == 1 else "// CREATORS"
+        if not isinstance(mem, tuple):
+            snipLines.append(mem)
+            continue
 
-            snipLines.append("\n".join(
-                    bdeformatutil.formatBde(lineSource, 1, insideParenPos)[1]))
-        else:
-            snipLines.append(declText)
+        funcName = mem[1]
+        argTypes = next(argTypesList)
+        snipLines.append("\n".join(next(declLines)))
 
         if classname == funcName:
             # Constructor, so gen initializer list
@@ -245,6 +438,41 @@ def genDefSnippet(classname, decls, inHeader, memberDefs="", snipNum=1):
 
     return ("\n".join(snipLines), snipNum)
 
+def definedSignatures(classname, text):
+    """
+    Return the set of the 'parseutil.normalizedSignature's of the member
+    functions of the specified 'classname' defined in the specified 'text',
+    which is the source of a whole file.
+    """
+    return set(parseutil.normalizedSignature(name, parameters, suffix)
+               for name, parameters, suffix
+                          in parseutil.parseFuncDefinitions(text, classname))
+
+def missingDeclarations(decls, signatures):
+    """
+    Return the list of the declarations in the specified 'decls' function
+    declaration section, parsed by 'parseutil.parseFuncDeclarations', whose
+    signatures aren't in the specified 'signatures', which is a set returned
+    by 'definedSignatures'.  Pure virtual, deleted and defaulted functions,
+    which aren't defined, and declarations that can't be parsed are left out.
+    """
+    ret = []
+    for decl in parseutil.parseFuncDeclarations(decls):
+        if not isinstance(decl, tuple):
+            continue
+
+        _, funcName, argsStr, funcSuffix = decl
+        if re.search(r'=\s*(0|delete|default)\b', funcSuffix):
+            continue
+
+        signature = parseutil.normalizedSignature(funcName,
+                                                  argsStr,
+                                                  funcSuffix)
+        if signature not in signatures:
+            ret.append(decl)
+
+    return ret
+
 def genAccessorDeclSnippet(typeName, cleanName, snipNum):
     """
     Generate a snippet for a accessor function definition, i.e. a const
@@ -269,8 +497,7 @@ def genAccessorDeclSnippet(typeName, cleanName, snipNum):
     noRefComment = s_commentTextwrap.fill(
         "Return the '%s' property of this object." % cleanName)
 
-    line += snipOptional(snipNum, refComment, True) + \
-            snipOptional(snipNum, noRefComment, False)
+    line += snipChoice(snipNum, refComment, noRefComment)
 
     return line
 
@@ -314,17 +541,30 @@ def genSetterDeclSnippet(typeName, cleanName, snipNum):
 
     return line
 
-def genDeclSnippet(memberDefs, funcSnipGen):
+def genDeclSnippet(memberDefs, funcSnipGen, flat=False):
     """
     Generate a snippet for the declarations of functions for the member
     variables defined in the specified 'memberDefs' using the specified
     'funcSnipGen' to generate the snippet for each parsed variable definition.
+    Each declaration is nested in a tabstop of its own so that it can be
+    removed with a single keystroke, unless the optionally specified 'flat' is
+    'True', in which case the declarations only have the tabstops generated by
+    'funcSnipGen', which keeps the snippet responsive for classes with many
+    members.
     """
 
+    members = parsedMembers(memberDefs)
     snipLines = []
-    snipNum = 2
-    for typeName, mem in parseutil.parseMembers(memberDefs):
-        cleanName = re.match(r'd_([^_]*)_?p?', mem).group(1)
+    snipNum = 1 if flat else 2
+    for member in members:
+        typeName = member.type
+        cleanName = member.cleanName or member.name
+
+        if flat:
+            snipLines.append(funcSnipGen(typeName, cleanName, snipNum))
+            snipLines.append("")
+            snipNum += 1
+            continue
 
         line = ""
         if snipNum > 2:
@@ -337,6 +577,7 @@ def genDeclSnippet(memberDefs, funcSnipGen):
 
         snipNum += 2
 
-    snipLines.append("}")
+    if not flat:
+        snipLines.append("}")
 
     return "\n".join(snipLines)
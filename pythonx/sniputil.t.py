@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import unittest
+import parseutil
 import sniputil
 
 def printStrDiff(a, b):
@@ -28,18 +29,15 @@ def printStrDiff(a, b):
 class TestDriver(unittest.TestCase):
 
     def test_snipOptional(self):
-        class Snip:
-            def __init__(self):
-                self.rv = "Def"
-
         def T(snipNum, text, expandWhenNotEmpty, ts, res):
 
             code = sniputil.snipOptional(snipNum, text, expandWhenNotEmpty)
 
-            ctx = {"snip": Snip(), "t": ts}
-            # Strip out the `!p and `
-            exec code[4:-1] in ctx
-            self.assertEqual(ctx["snip"].rv, res)
+            # Follow the code with the tabstops it tests
+            tabStops = "".join("${%d:%s}" % (i, t)
+                               for i, t in enumerate(ts) if i > 0)
+            self.assertEqual(sniputil.renderSnippet(code + tabStops),
+                             res + "".join(ts[1:]))
 
         T(1, "a", True, [0, "b"], "a")
         T(1, "a", True, [0, ""], "")
@@ -54,6 +52,29 @@ class TestDriver(unittest.TestCase):
         T([1, 2], "a", False, [0, "a", ""], "")
         T([1, 2], "a", False, [0, "", ""], "a")
 
+        # A single tabstop is transformed instead of tested in Python
+        self.assertEqual(sniputil.snipOptional(1, "const "), "${1/.+/const /}")
+        T(1, "a\n b", True, [0, "b\nc"], "a\n b")
+        T(1, "a/b", True, [0, "b"], "a/b")
+        self.assertTrue(sniputil.snipOptional(1, "a/b").startswith("`!p"))
+
+    def test_snipChoice(self):
+        class Snip:
+            def __init__(self):
+                self.rv = "Def"
+
+        def T(snipNum, ts, res):
+            code = sniputil.snipChoice(snipNum, "a", "b")
+
+            ctx = {"snip": Snip(), "t": ts}
+            exec code[4:-1] in ctx
+            self.assertEqual(ctx["snip"].rv, res)
+
+        T(1, [0, "x"], "a")
+        T(1, [0, ""], "b")
+        T([1, 2], [0, "x", "y"], "a")
+        T([1, 2], [0, "x", ""], "b")
+
     def test_genTabStop(self):
         F = sniputil.genTabStop
         A = lambda a, b: self.assertEqual(a, b, printStrDiff(a, b))
@@ -131,6 +152,16 @@ $1::$1(const $1& other%s)
 , d_d($4)
 """)
 
+        # Already parsed members
+        T([("int", "d_a"), ("void *", "d_b_p")],
+          ", ",
+          """
+, d_a($1)
+, d_b_p($2)
+""")
+        T(parseutil.MemberModel([("int", "d_a")]), ": ", "\n: d_a($1)\n")
+        T(None, ": ", "\n\n")
+
     def test_genDefSnippet(self):
         F = sniputil.genDefSnippet
         A = lambda a, b: self.assertEqual(a, b, printStrDiff(a, b))
@@ -259,38 +290,119 @@ ClassName::ClassName(const ClassName& orig, bslma::Allocator *basicAllocator)
        GT(7, "bslma::Default::allocator(basicAllocator)"),
        GT(8, "// TODO", pre="\n    ")), 9)
 
+    def test_missingDeclarations(self):
+        decls = """
+    Foo(int a);
+        // Create a foo.
+
+    ~Foo();
+
+    int get(int i) const;
+    int get(double d) const;
+    void set(const bsl::string& value, int x = 0);
+    virtual void pure() = 0;
+    Foo& operator=(const Foo&) = delete;
+"""
+        definitions = """
+Foo::Foo(int a)
+: d_a(a)
+{
+}
+
+int Foo::get(int index) const
+{
+}
+
+void Foo::set(const bsl::string &v, int)
+{
+}
+"""
+        signatures = sniputil.definedSignatures("Foo", definitions)
+        self.assertEqual(sniputil.missingDeclarations(decls, signatures),
+                         [("", "~Foo", "()", ";"),
+                          ("int", "get", "(double d)", "const;")])
+
+        # Already parsed declarations can be given to 'genDefSnippet'
+        missing = sniputil.missingDeclarations(decls, signatures)
+        self.assertEqual(
+            sniputil.genDefSnippet("Foo", missing, False),
+            sniputil.genDefSnippet("Foo",
+                                   "~Foo();\nint get(double d) const;",
+                                   False))
+
+        # Matching is linear in the number of functions
+        decls = "".join("int f%d(int a, double b) const;\n" % i
+                        for i in range(2000))
+        definitions = "".join("int Foo::f%d(int a, double b) const\n{\n}\n" % i
+                              for i in range(0, 2000, 2))
+        signatures = sniputil.definedSignatures("Foo", definitions)
+        self.assertEqual(len(signatures), 1000)
+        missing = sniputil.missingDeclarations(decls, signatures)
+        self.assertEqual([decl[1] for decl in missing],
+                         ["f%d" % i for i in range(1, 2000, 2)])
+
+    def test_renderSnippet(self):
+        R = sniputil.renderSnippet
+        A = lambda a, b: self.assertEqual(a, b, printStrDiff(a, b))
+
+        A(R("plain {text}"), "plain {text}")
+        A(R("${1:a}${2}b$1"), "aba")
+        A(R("${1:a${2:b}c}:$2"), "abc:b")
+        A(R(sniputil.genTabStop(1, "x", pre="<", post=">")), "<x>")
+        A(R(sniputil.genTabStop(1, None, pre="<", post=">")), "")
+
+        # Interpolations refer to tabstops after them
+        A(R(sniputil.snipOptional([1, 2], "both ") + "${1:a}${2:b}"),
+          "both ab")
+        A(R(sniputil.snipChoice(1, "yes", "no") + "${1}"), "no")
+
+        # Text from headers can't end the interpolation or inject code
+        text = "a\"\"\"b`c\\n'd\n"
+        A(R(sniputil.snipOptional([1, 2], text) + "${1:x}${2:y}"),
+          text + "xy")
+        A(R(sniputil.snipChoice(1, "yes", text) + "${1}"), text)
+        self.assertFalse("`" in sniputil.snipChoice(1, text, text)[1:-1])
+        self.assertRaises(ValueError,
+                          R,
+                          "`!p import os; snip.rv = os.getcwd()`")
+
+        A(R(sniputil.genCctorSnippet("Foo", "int d_a;")),
+          "Foo::Foo(const Foo& other, bslma::Allocator *basicAllocator = 0)\n"
+          ": d_a(other.d_a, basicAllocator)\n"
+          "{\n"
+          "}")
+
     def test_genAccessorDeclSnippet(self):
         F = sniputil.genAccessorDeclSnippet
         A = lambda a, b: self.assertEqual(a, b, printStrDiff(a, b))
         SO = sniputil.snipOptional
+        SC = sniputil.snipChoice
         def T(typeName, cleanName, snipNum, expected):
             A(F(typeName, cleanName, snipNum), expected[1:-1])
 
         T("void *", "myVar", 2,
           """
     %svoid *${2:&}%smyVar() const;
-%s%s
+%s
 """ % (SO(2, "const "),
        SO(2, " "),
-       SO(2, """
+       SC(2, """
         // Return a reference providing const access to the 'myVar' property of
-        // this object."""[1:]),
-       SO(2, """
-        // Return the 'myVar' property of this object."""[1:],
-         False)
+        // this object."""[1:],
+             """
+        // Return the 'myVar' property of this object."""[1:])
       ))
 
         T("ClassType", "myVar", 2,
           """
     %sClassType${2:&} myVar() const;
-%s%s
+%s
 """ % (SO(2, "const "),
-       SO(2, """
+       SC(2, """
         // Return a reference providing const access to the 'myVar' property of
-        // this object."""[1:]),
-       SO(2, """
-        // Return the 'myVar' property of this object."""[1:],
-         False)
+        // this object."""[1:],
+             """
+        // Return the 'myVar' property of this object."""[1:])
       ))
 
     def test_genManipulatorDeclSnippet(self):
@@ -358,5 +470,33 @@ ${1:(int, a, 2)
 }
 """)
 
+        # Flat
+        A(F("int d_a;\nvoid *d_b_p;", funcSnipGen, flat=True),
+          "(int, a, 1)\n\n(void *, b, 2)\n")
+
+        # Declarations are nested in tabstops however many members there are
+        members = "".join("int d_m%d;\n" % i for i in range(32))
+        self.assertTrue(F(members, funcSnipGen).startswith(
+                                          "${1:(int, m0, 2)\n\n}${3:"))
+
+    def test_declInterpolations(self):
+        # Each declaration has at most one Python interpolation, which is
+        # evaluated on every keystroke
+        F = sniputil.genDeclSnippet
+        members = "int d_a;\nvoid *d_b_p;\nbsl::string d_c;"
+        for funcSnipGen, count in [(sniputil.genAccessorDeclSnippet, 3),
+                                   (sniputil.genSetterDeclSnippet, 0),
+                                   (sniputil.genManipulatorDeclSnippet, 0)]:
+            self.assertEqual(F(members, funcSnipGen).count("`!p"), count)
+            self.assertEqual(F(members, funcSnipGen, flat=True).count("`!p"),
+                             count)
+
+        self.assertEqual(sniputil.renderSnippet(
+                   F("void *d_b_p;", sniputil.genAccessorDeclSnippet)),
+                   "    const void *& b() const;\n"
+                   "        // Return a reference providing const access to "
+                   "the 'b' property of\n"
+                   "        // this object.\n\n")
+
 if __name__ == "__main__":
     unittest.main();
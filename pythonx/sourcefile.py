@@ -0,0 +1,83 @@
+"""
+sourcefile.py: Reading, writing and finding C++ source files
+
+This module defines the helpers shared by the tools and caches that work on
+source files on disk: the conversion of file content to and from native
+strings without altering any byte, streaming of lines, the modification times
+used to detect changed files, and the search of directories for sources.
+"""
+
+import os
+
+SOURCE_EXTENSIONS = (".h", ".cpp")
+    # Extensions of the files that are formatted when searching directories
+
+RACY_INTERVAL_NS = 2 * 10 ** 9
+    # Files modified less than this long before being verified might be
+    # modified again without their modification time changing, so their
+    # content must be checked again on the next run
+
+def decodeSource(data):
+    """
+    Return the specified file content 'data' as a native string, mapping each
+    byte to one character so that the content is written back unchanged.
+    """
+    return data if isinstance(data, str) else data.decode("latin-1")
+
+def encodeSource(text):
+    """
+    Return the specified native string 'text' as the bytes it was read from.
+    """
+    return text if isinstance(text, bytes) else text.encode("latin-1")
+
+def readLines(stream):
+    """
+    Generate the lines read from the specified binary 'stream' without their
+    line terminators.  As with 'str.split("\\n")', a final newline results in
+    a final empty line.
+    """
+    line = b""
+    for line in stream:
+        if line.endswith(b"\n"):
+            yield decodeSource(line[:-1])
+        else:
+            yield decodeSource(line)
+
+    if line == b"" or line.endswith(b"\n"):
+        yield ""
+
+def writeLines(lines, stream):
+    """
+    Write the specified iterable of 'lines' to the specified binary 'stream',
+    separated by newlines.  This is the inverse of 'readLines'.
+    """
+    first = True
+    for line in lines:
+        if not first:
+            stream.write(b"\n")
+        stream.write(encodeSource(line))
+        first = False
+
+def mtimeNs(st):
+    """
+    Return the modification time of the specified 'os.stat' result 'st' in
+    nanoseconds.
+    """
+    return getattr(st, "st_mtime_ns", None) or int(st.st_mtime * 1e9)
+
+def findSourceFiles(paths):
+    """
+    Generate the absolute paths of the files in the specified 'paths', and of
+    the files with one of the 'SOURCE_EXTENSIONS' under the directories in
+    'paths'.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield os.path.abspath(path)
+            continue
+
+        for dirPath, dirNames, fileNames in os.walk(path):
+            dirNames.sort()
+            for fileName in sorted(fileNames):
+                if fileName.endswith(SOURCE_EXTENSIONS):
+                    yield os.path.abspath(os.path.join(dirPath, fileName))
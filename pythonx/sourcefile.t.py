@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import sourcefile
+
+class TestDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_decodeEncodeSource(self):
+        data = b"int d_a;  // \xe9\xff"
+        text = sourcefile.decodeSource(data)
+        self.assertEqual(len(text), len(data))
+        self.assertEqual(sourcefile.encodeSource(text), data)
+
+    def test_readWriteLines(self):
+        def T(s):
+            data = s.encode("ascii")
+            lines = list(sourcefile.readLines(io.BytesIO(data)))
+            self.assertEqual(lines, s.split("\n"))
+
+            out = io.BytesIO()
+            sourcefile.writeLines(lines, out)
+            self.assertEqual(out.getvalue(), data)
+
+        T("")
+        T("\n")
+        T("a")
+        T("a\n")
+        T("a\nb")
+        T("a\n\nb\n")
+
+    def test_findSourceFiles(self):
+        os.mkdir(os.path.join(self.dir, "sub"))
+        for name in ("b.cpp", "a.h", "sub/c.h", "d.txt"):
+            with open(os.path.join(self.dir, name), "w"):
+                pass
+
+        self.assertEqual(
+           list(sourcefile.findSourceFiles([self.dir])),
+           [os.path.join(self.dir, f) for f in ["a.h", "b.cpp", "sub/c.h"]])
+
+if __name__ == "__main__":
+    unittest.main();
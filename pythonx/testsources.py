@@ -0,0 +1,54 @@
+"""
+testsources.py: C++ source shared by the test drivers
+
+This module defines the lines of a small class with an unformatted DATA
+section and an unformatted constructor declaration, along with the results of
+formatting each of them, for the test drivers of the formatting entry points.
+"""
+
+LINES = ["class Foo {",
+         "    // DATA",
+         "    int d_a; // first",
+         "    double d_b;",
+         "",
+         "    // CREATORS",
+         "    Foo(int a, const char *name, double value, "
+                                    "bslma::Allocator *basicAllocator = 0);",
+         "};"]
+    # The lines of the class, without line terminators
+
+DATA_START, DATA_END = 2, 4
+    # Inclusive range of the rows of the contents of the DATA section
+
+FORMATTED_DATA_LINES = ["    int    d_a;  // first",
+                        "    double d_b;",
+                        ""]
+    # The contents of the DATA section once formatted
+
+CTOR_ROW = 6
+    # Row of the constructor declaration
+
+FORMATTED_CTOR_LINES = ["    Foo(int               a,",
+                        "        const char       *name,",
+                        "        double            value,",
+                        "        bslma::Allocator *basicAllocator = 0);"]
+    # The constructor declaration once formatted
+
+def _source(lines):
+    """
+    Return the text of a file made of the specified 'lines'.
+    """
+    return "\n".join(lines) + "\n"
+
+SOURCE = _source(LINES)
+    # The text of a file holding the class
+
+FORMATTED_DATA = _source(LINES[:DATA_START] +
+                         FORMATTED_DATA_LINES +
+                         LINES[DATA_END + 1:])
+    # 'SOURCE' with the DATA section formatted
+
+FORMATTED_CTOR = _source(LINES[:CTOR_ROW] +
+                         FORMATTED_CTOR_LINES +
+                         LINES[CTOR_ROW + 1:])
+    # 'SOURCE' with the constructor declaration formatted